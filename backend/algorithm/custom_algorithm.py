@@ -2,8 +2,11 @@
 Custom algorithms implemented manually without using built-in libraries.
 These are the algorithms that Sonia will implement for the project.
 """
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, Callable, Iterable
+import heapq
 import math
+import numpy as np
+from algorithm.trip_batch import TripBatch, TripRow
 
 def pickup_hour_frequency(trips: List[Dict[str, Any]], timestamp_key: str = "pickup_datetime") -> Dict[int, int]:
     """
@@ -13,6 +16,10 @@ def pickup_hour_frequency(trips: List[Dict[str, Any]], timestamp_key: str = "pic
     Time Complexity: O(n)
     Space Complexity: O(24) = O(1) since hours are fixed 0-23
     """
+    # columnar batches already carry the integer hour, no string parsing needed
+    if isinstance(trips, TripBatch) and "pickup_hour" in trips:
+        return hour_histogram(trips["pickup_hour"])
+    
     frequency = {}
     
     for trip in trips:
@@ -26,7 +33,7 @@ def pickup_hour_frequency(trips: List[Dict[str, Any]], timestamp_key: str = "pic
             # fallback: try to parse other formats
             try:
                 hour = int(dt_str[11:13])  # extract from YYYY-MM-DD HH:MM:SS
-            except:
+            except ValueError:
                 hour = 0
         
         # manual frequency counting
@@ -42,6 +49,32 @@ def pickup_hour_frequency(trips: List[Dict[str, Any]], timestamp_key: str = "pic
     
     return frequency
 
+def hour_histogram(hours: np.ndarray, weights: Optional[np.ndarray] = None) -> Dict[int, int]:
+    """
+    Pickups per hour from an integer array of pickup hours (e.g. the
+    pickup_hour column), same contract as pickup_hour_frequency: every hour
+    0-23 is present. Optional weights count each trip with its weight.
+    
+    Time Complexity: O(n), single bincount pass
+    Space Complexity: O(24) = O(1)
+    """
+    hours = np.asarray(hours, dtype=np.int64)
+    counts = np.bincount(hours, weights=weights, minlength=24)
+    return {hour: int(counts[hour]) for hour in range(24)}
+
+def hour_histogram_from_counts(hour_counts: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """
+    Pickups per hour from pre-aggregated (hour, count) pairs, e.g. the rows of
+    SELECT pickup_hour, COUNT(*) ... GROUP BY pickup_hour.
+    
+    Time Complexity: O(24) = O(1)
+    Space Complexity: O(1)
+    """
+    frequency = {hour: 0 for hour in range(24)}
+    for hour, count in hour_counts:
+        frequency[int(hour)] += int(count)
+    return frequency
+
 def rank_clusters_by_total_duration(cluster_map: Dict[Any, List[Dict[str, Any]]]) -> List[Tuple[Any, float]]:
     """
     Custom ranking of clusters by total trip duration.
@@ -74,9 +107,40 @@ def rank_clusters_by_total_duration(cluster_map: Dict[Any, List[Dict[str, Any]]]
     
     return cluster_totals
 
-def manual_kmeans_clustering(trips: List[Dict[str, Any]], k: int, cluster_type: str = "pickup") -> Dict[int, Dict[str, Any]]:
+def aggregate_cluster_durations(labels: np.ndarray, durations: np.ndarray, k: int) -> np.ndarray:
+    """
+    Total duration per cluster from parallel arrays of cluster labels and
+    trip durations, in a single bincount pass.
+    
+    Time Complexity: O(n + k)
+    Space Complexity: O(k)
+    """
+    return np.bincount(np.asarray(labels, dtype=np.int64),
+                       weights=np.asarray(durations, dtype=np.float64), minlength=k)
+
+def rank_cluster_totals(cluster_totals) -> List[Tuple[Any, float]]:
+    """
+    Rank clusters by pre-aggregated total duration, largest first.
+    Accepts a mapping {cluster_id: total} or a sequence/array of totals
+    indexed by cluster id (e.g. from aggregate_cluster_durations). Returns
+    the same [(cluster_id, total), ...] shape as rank_clusters_by_total_duration;
+    equal totals keep their input order.
+    
+    Time Complexity: O(k log k)
+    Space Complexity: O(k)
+    """
+    if isinstance(cluster_totals, dict):
+        items = [(cluster_id, float(total)) for cluster_id, total in cluster_totals.items()]
+    else:
+        items = [(cluster_id, float(total)) for cluster_id, total in enumerate(cluster_totals)]
+    
+    return sorted(items, key=lambda item: item[1], reverse=True)
+
+def manual_kmeans_clustering(trips: List[Dict[str, Any]], k: int, cluster_type: str = "pickup",
+                             stats: Optional[Dict[str, Any]] = None) -> Dict[int, Dict[str, Any]]:
     """
     Manual implementation of K-means clustering without using sklearn.
+    If a stats dict is given, the number of iterations run is stored in it.
     
     Time Complexity: O(n * k * iterations)
     Space Complexity: O(n + k)
@@ -166,6 +230,9 @@ def manual_kmeans_clustering(trips: List[Dict[str, Any]], k: int, cluster_type:
         if converged:
             break
     
+    if stats is not None:
+        stats["iterations"] = iteration + 1
+    
     # build result structure
     result = {}
     for cluster_id in range(len(centroids)):
@@ -182,6 +249,415 @@ def manual_kmeans_clustering(trips: List[Dict[str, Any]], k: int, cluster_type:
     
     return result
 
+def _coordinate_keys(cluster_type: str) -> Tuple[str, str]:
+    """Trip dictionary keys holding the coordinates for a cluster type."""
+    if cluster_type == "pickup":
+        return "pickup_latitude", "pickup_longitude"
+    return "dropoff_latitude", "dropoff_longitude"
+
+def _squared_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Squared euclidean distances between every point and every center, shape (n, k)."""
+    diff = points[:, None, :] - centers[None, :, :]
+    return np.einsum("nkd,nkd->nk", diff, diff)
+
+def _center_distances(points_t: np.ndarray, centers: np.ndarray, out: Optional[np.ndarray] = None,
+                      scratch: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Squared euclidean distances (k, n) between centers and the columns of
+    points_t (d, n), accumulated one dimension at a time.
+    Every entry goes through the same elementwise operations whatever the
+    other points, so kmeans_fit and hamerly_kmeans_fit see bit-identical
+    distances (a matrix product may round differently for different row
+    counts). Center-major, so the inner loops run over points, not k.
+    """
+    shape = (len(centers), points_t.shape[1])
+    out = np.empty(shape, dtype=np.float64) if out is None else out
+    scratch = np.empty(shape, dtype=np.float64) if scratch is None else scratch
+    np.subtract(points_t[0, None, :], centers[:, 0, None], out=out)
+    out *= out
+    for dim in range(1, len(points_t)):
+        np.subtract(points_t[dim, None, :], centers[:, dim, None], out=scratch)
+        scratch *= scratch
+        out += scratch
+    return out
+
+def _assign_to_nearest(points: np.ndarray, centers: np.ndarray, chunk_size: int = 4096) -> np.ndarray:
+    """
+    Index of the nearest center for every point, the lowest index on ties.
+    Distances are computed into two reused cache-sized buffers per chunk, so
+    memory stays O(chunk_size * k).
+    """
+    points_t = np.ascontiguousarray(points.T)
+    n = points_t.shape[1]
+    labels = np.empty(n, dtype=np.int64)
+    distances = np.empty((len(centers), min(chunk_size, n)), dtype=np.float64)
+    scratch = np.empty_like(distances)
+    for start in range(0, n, chunk_size):
+        chunk = points_t[:, start:start + chunk_size]
+        columns = chunk.shape[1]
+        _center_distances(chunk, centers, distances[:, :columns], scratch[:, :columns])
+        labels[start:start + columns] = np.argmin(distances[:, :columns], axis=0)
+    return labels
+
+def kmeans_plus_plus_init(coords: np.ndarray, k: int, seed: int = 42) -> np.ndarray:
+    """
+    K-means++ seeding: each new center is drawn with probability proportional
+    to its squared distance from the closest center chosen so far.
+    
+    Time Complexity: O(n * k)
+    Space Complexity: O(n + k)
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    n = len(coords)
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+    
+    centers = np.empty((k, coords.shape[1]), dtype=np.float64)
+    centers[0] = coords[rng.integers(n)]
+    closest = _squared_distances(coords, centers[:1])[:, 0]
+    
+    for i in range(1, k):
+        total = closest.sum()
+        if total <= 0:
+            # every point coincides with a chosen center, fall back to uniform picks
+            index = rng.integers(n)
+        else:
+            index = min(int(np.searchsorted(np.cumsum(closest), rng.random() * total, side="right")), n - 1)
+        centers[i] = coords[index]
+        closest = np.minimum(closest, _squared_distances(coords, centers[i:i + 1])[:, 0])
+    
+    return centers
+
+def kmeans_fit(coords: np.ndarray, k: int, max_iterations: int = 100, tolerance: float = 1e-4,
+               seed: int = 42, init: Optional[np.ndarray] = None,
+               stats: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Array-backed Lloyd's K-means with batched distance computation.
+    Returns (centers, labels). Empty clusters keep their previous center,
+    like manual_kmeans_clustering.
+    
+    Time Complexity: O(n * k * iterations), vectorized
+    Space Complexity: O(n + k)
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords) == 0:
+        return np.empty((0, coords.shape[1] if coords.ndim == 2 else 2)), np.empty(0, dtype=np.int64)
+    
+    centers = kmeans_plus_plus_init(coords, k, seed) if init is None else np.array(init, dtype=np.float64)
+    k = len(centers)
+    
+    # work relative to the data mean: k-means is translation invariant and the
+    # dot-product distances lose precision far from the origin (lat ~40, lon ~-74)
+    origin = coords.mean(axis=0)
+    coords = coords - origin
+    centers = centers - origin
+    
+    for iteration in range(max_iterations):
+        labels = _assign_to_nearest(coords, centers)
+        
+        # per-cluster sums in one pass with bincount
+        counts = np.bincount(labels, minlength=k)
+        new_centers = centers.copy()
+        non_empty = counts > 0
+        for dim in range(coords.shape[1]):
+            sums = np.bincount(labels, weights=coords[:, dim], minlength=k)
+            new_centers[non_empty, dim] = sums[non_empty] / counts[non_empty]
+        
+        shift = np.sqrt(((new_centers - centers) ** 2).sum(axis=1)).max()
+        centers = new_centers
+        if shift <= tolerance:
+            break
+    
+    # final assignment against the converged centers
+    labels = _assign_to_nearest(coords, centers)
+    
+    if stats is not None:
+        stats["iterations"] = iteration + 1
+    
+    return centers + origin, labels
+
+def _exact_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Euclidean distances (n, k), the square roots of the distances _assign_to_nearest compares."""
+    return np.sqrt(_center_distances(np.ascontiguousarray(points.T), centers)).T
+
+def _nearest_two(squared: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Nearest center index (the lowest on ties), its distance and the distance
+    to the second nearest, from (k, n) squared distances. The argmin is taken
+    before the square root, which could round two different distances
+    together. squared is overwritten.
+    """
+    labels = np.argmin(squared, axis=0)
+    columns = np.arange(squared.shape[1])
+    upper = np.sqrt(squared[labels, columns])
+    if len(squared) < 2:
+        return labels, upper, np.full(squared.shape[1], np.inf)
+    squared[labels, columns] = np.inf
+    return labels, upper, np.sqrt(squared.min(axis=0))
+
+# relative margin by which hamerly_kmeans_fit's bounds must rule a point out,
+# far above the rounding error the bounds pick up over many iterations
+BOUND_SLACK = 1e-9
+
+def hamerly_kmeans_fit(coords: np.ndarray, k: int, max_iterations: int = 100, tolerance: float = 1e-4,
+                       seed: int = 42, init: Optional[np.ndarray] = None,
+                       stats: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lloyd's K-means with Hamerly's triangle-inequality bounds.
+    
+    Every point keeps an upper bound on the distance to its assigned center
+    and a lower bound on the distance to any other center. After the centers
+    move the bounds are loosened by the center shifts; a point is only
+    re-examined when its upper bound reaches its lower bound or half the
+    distance from its center to the nearest other center. Points that may be
+    tied between two centers are always re-examined, with the same distances
+    and lowest-index tie break as kmeans_fit, so both produce the same
+    centers and labels for the same seed/init. If a stats dict
+    is given it receives 'iterations', 'distance_computations' and
+    'distance_computations_saved' (versus computing all n * k every time).
+    
+    Time Complexity: O(n * k * iterations) worst case, close to O(n) per late iteration
+    Space Complexity: O(n + k^2)
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords) == 0:
+        return np.empty((0, coords.shape[1] if coords.ndim == 2 else 2)), np.empty(0, dtype=np.int64)
+    
+    centers = kmeans_plus_plus_init(coords, k, seed) if init is None else np.array(init, dtype=np.float64)
+    k = len(centers)
+    n = len(coords)
+    
+    origin = coords.mean(axis=0)
+    coords = coords - origin
+    centers = centers - origin
+    coords_t = np.ascontiguousarray(coords.T)
+    
+    # initial bounds from one full distance computation
+    labels, upper, lower = _nearest_two(_center_distances(coords_t, centers))
+    computed = n * k
+    assignments = 1
+    
+    def reassign():
+        """Re-examine only the points whose bounds can't rule out a change."""
+        nonlocal computed
+        center_gaps = _exact_distances(centers, centers)
+        np.fill_diagonal(center_gaps, np.inf)
+        half_gap = 0.5 * center_gaps.min(axis=1) if k > 1 else np.full(1, np.inf)
+        
+        # non-strict and with slack for the rounding of the loosened bounds:
+        # a point is skipped only when its center is certainly strictly nearest
+        bound = np.maximum(half_gap[labels], lower) * (1 - BOUND_SLACK)
+        candidates = np.flatnonzero(upper >= bound)
+        if len(candidates) == 0:
+            return
+        
+        # tighten the upper bound with the exact distance to the assigned center
+        diff = coords[candidates] - centers[labels[candidates]]
+        upper[candidates] = np.sqrt((diff * diff).sum(axis=1))
+        computed += len(candidates)
+        
+        candidates = candidates[upper[candidates] >= bound[candidates]]
+        if len(candidates) == 0:
+            return
+        
+        new_labels, new_upper, new_lower = _nearest_two(_center_distances(coords_t[:, candidates], centers))
+        labels[candidates] = new_labels
+        upper[candidates] = new_upper
+        lower[candidates] = new_lower
+        computed += len(candidates) * k
+    
+    for iteration in range(max_iterations):
+        if iteration > 0:
+            reassign()
+            assignments += 1
+        
+        counts = np.bincount(labels, minlength=k)
+        new_centers = centers.copy()
+        non_empty = counts > 0
+        for dim in range(coords.shape[1]):
+            sums = np.bincount(labels, weights=coords[:, dim], minlength=k)
+            new_centers[non_empty, dim] = sums[non_empty] / counts[non_empty]
+        
+        moved = np.sqrt(((new_centers - centers) ** 2).sum(axis=1))
+        centers = new_centers
+        
+        # loosen the bounds by how far the centers moved
+        upper += moved[labels]
+        if k > 1:
+            order = np.argsort(moved)
+            largest, second_largest = moved[order[-1]], moved[order[-2]]
+            lower -= np.where(labels == order[-1], second_largest, largest)
+        
+        if moved.max() <= tolerance:
+            break
+    
+    # final assignment against the converged centers
+    reassign()
+    assignments += 1
+    
+    if stats is not None:
+        stats["iterations"] = iteration + 1
+        stats["distance_computations"] = int(computed)
+        stats["distance_computations_saved"] = int(assignments * n * k - computed)
+    
+    return centers + origin, labels
+
+def group_indices_by_label(labels: np.ndarray, k: int) -> List[np.ndarray]:
+    """
+    Indices of the points in each cluster, O(n) via a stable counting sort
+    instead of scanning all assignments once per cluster.
+    """
+    order = np.argsort(labels, kind="stable")
+    bounds = np.cumsum(np.bincount(labels, minlength=k))[:-1]
+    return np.split(order, bounds)
+
+def kmeans_cluster_summary(coords: np.ndarray, durations: np.ndarray, k: int, seed: int = 42,
+                           accelerated: bool = False,
+                           stats: Optional[Dict[str, Any]] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Cluster coordinates and return only per-cluster center, size and
+    total duration, without building per-trip lists. accelerated=True uses
+    hamerly_kmeans_fit, which gives the same clusters with fewer distance
+    computations.
+    
+    Time Complexity: O(n * k * iterations)
+    Space Complexity: O(n + k)
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords) == 0:
+        return {}
+    
+    fit = hamerly_kmeans_fit if accelerated else kmeans_fit
+    centers, labels = fit(coords, k, seed=seed, stats=stats)
+    sizes = np.bincount(labels, minlength=len(centers))
+    totals = aggregate_cluster_durations(labels, durations, len(centers))
+    
+    return {
+        cluster_id: {
+            "center": [float(centers[cluster_id][0]), float(centers[cluster_id][1])],
+            "size": int(sizes[cluster_id]),
+            "total_duration": float(totals[cluster_id])
+        }
+        for cluster_id in range(len(centers))
+    }
+
+def minibatch_kmeans(batch_source: Callable[[], Iterable[Tuple[np.ndarray, np.ndarray]]], k: int,
+                     max_passes: int = 5, tolerance: float = 1e-4, seed: int = 42,
+                     stats: Optional[Dict[str, Any]] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Streaming mini-batch K-means (Sculley, 2010) over batches of
+    (coords, durations) arrays.
+    
+    batch_source() must return a fresh iterator over the data on every call,
+    e.g. a DB cursor read with fetchmany. Centers are seeded with k-means++ on
+    the first batch and moved towards each batch mean with a per-center
+    learning rate of 1 / points seen. Training stops once a full pass moves no
+    center more than `tolerance`. A final pass computes the per-cluster counts
+    and duration totals, returned in the kmeans_cluster_summary format.
+    
+    Time Complexity: O(n * k * passes)
+    Space Complexity: O(k + batch_size)
+    """
+    centers = None
+    seen = None
+    passes = 0
+    
+    for passes in range(1, max_passes + 1):
+        pass_start = None if centers is None else centers.copy()
+        
+        for coords, _ in batch_source():
+            coords = np.asarray(coords, dtype=np.float64)
+            if len(coords) == 0:
+                continue
+            
+            if centers is None:
+                centers = kmeans_plus_plus_init(coords, k, seed)
+                seen = np.zeros(len(centers), dtype=np.float64)
+            
+            labels = _assign_to_nearest(coords, centers)
+            counts = np.bincount(labels, minlength=len(centers))
+            touched = counts > 0
+            seen[touched] += counts[touched]
+            
+            # move each touched center towards its batch mean, weighted by how
+            # much of everything it has seen came from this batch
+            rate = counts[touched] / seen[touched]
+            for dim in range(coords.shape[1]):
+                sums = np.bincount(labels, weights=coords[:, dim], minlength=len(centers))
+                batch_mean = sums[touched] / counts[touched]
+                centers[touched, dim] += rate * (batch_mean - centers[touched, dim])
+        
+        if centers is None:
+            return {}
+        
+        if pass_start is not None and np.sqrt(((centers - pass_start) ** 2).sum(axis=1)).max() <= tolerance:
+            break
+    
+    # final streaming pass: per-cluster counts and duration totals
+    sizes = np.zeros(len(centers), dtype=np.int64)
+    totals = np.zeros(len(centers), dtype=np.float64)
+    for coords, durations in batch_source():
+        if len(coords) == 0:
+            continue
+        labels = _assign_to_nearest(np.asarray(coords, dtype=np.float64), centers)
+        sizes += np.bincount(labels, minlength=len(centers))
+        totals += aggregate_cluster_durations(labels, durations, len(centers))
+    
+    if stats is not None:
+        stats["iterations"] = passes
+    
+    return {
+        cluster_id: {
+            "center": [float(centers[cluster_id][0]), float(centers[cluster_id][1])],
+            "size": int(sizes[cluster_id]),
+            "total_duration": float(totals[cluster_id])
+        }
+        for cluster_id in range(len(centers))
+    }
+
+def vectorized_kmeans_clustering(trips: List[Dict[str, Any]], k: int, cluster_type: str = "pickup",
+                                 summary_only: bool = False, seed: int = 42,
+                                 stats: Optional[Dict[str, Any]] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    NumPy version of manual_kmeans_clustering with k-means++ seeding.
+    Returns the same {cluster_id: {"center", "trips", "size"}} shape, or with
+    summary_only=True {cluster_id: {"center", "size", "total_duration"}}.
+    Also accepts a TripBatch, in which case "trips" are TripBatch subsets.
+    
+    Time Complexity: O(n * k * iterations), vectorized
+    Space Complexity: O(n + k)
+    """
+    if len(trips) == 0:
+        return {}
+    
+    is_batch = isinstance(trips, TripBatch)
+    if is_batch:
+        # columnar input: coordinates are already arrays
+        coords = trips.coordinates(cluster_type)
+    else:
+        lat_key, lon_key = _coordinate_keys(cluster_type)
+        coords = np.array([(trip.get(lat_key, 0), trip.get(lon_key, 0)) for trip in trips], dtype=np.float64)
+    
+    if summary_only:
+        if is_batch:
+            durations = trips["trip_duration"]
+        else:
+            durations = np.array([trip.get('trip_duration', 0) for trip in trips], dtype=np.float64)
+        return kmeans_cluster_summary(coords, durations, k, seed=seed, stats=stats)
+    
+    centers, labels = kmeans_fit(coords, k, seed=seed, stats=stats)
+    
+    result = {}
+    for cluster_id, indices in enumerate(group_indices_by_label(labels, len(centers))):
+        cluster_trips = trips.take(indices) if is_batch else [trips[i] for i in indices]
+        result[cluster_id] = {
+            "center": [float(centers[cluster_id][0]), float(centers[cluster_id][1])],
+            "trips": cluster_trips,
+            "size": len(cluster_trips)
+        }
+    
+    return result
+
 def custom_trip_sorter(trips: List[Dict[str, Any]], sort_by: str = "duration", order: str = "desc") -> List[Dict[str, Any]]:
     """
     Custom sorting algorithm for trips using manual implementation.
@@ -238,6 +714,142 @@ def custom_trip_sorter(trips: List[Dict[str, Any]], sort_by: str = "duration", o
     
     return sorted_trips
 
+def selection_sort_trips(trips: List[Dict[str, Any]], key: str = "trip_duration",
+                         order: str = "asc") -> List[Dict[str, Any]]:
+    """
+    Manual selection sort of trip dictionaries by a numeric field.
+    Missing values count as 0; the input list is not modified.
+    
+    Time Complexity: O(n²)
+    Space Complexity: O(n)
+    """
+    sorted_trips = list(trips)
+    n = len(sorted_trips)
+    values = [trip.get(key, 0) for trip in sorted_trips]
+    
+    for i in range(n - 1):
+        best = i
+        for j in range(i + 1, n):
+            if (values[j] < values[best]) if order == "asc" else (values[j] > values[best]):
+                best = j
+        if best != i:
+            sorted_trips[i], sorted_trips[best] = sorted_trips[best], sorted_trips[i]
+            values[i], values[best] = values[best], values[i]
+    
+    return sorted_trips
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in kilometers between points given in decimal degrees.
+    Works on scalars or on NumPy arrays of coordinates (one distance per pair).
+    
+    Time Complexity: O(1) per pair
+    Space Complexity: O(1) per pair
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+# trip field used for each sort_by option (unknown options fall back to duration)
+TRIP_SORT_KEYS = {
+    "duration": "trip_duration",
+    "distance": "trip_distance_km",
+    "speed": "trip_speed_km_h",
+}
+
+def top_k_indices(values: np.ndarray, k: int, order: str = "desc") -> np.ndarray:
+    """
+    Indices of the k best values of a column, sorted, with ties broken by
+    original position (stable). Uses a linear-time partition around the k-th
+    value, then sorts only the k survivors. NaN values (NULLs) are never
+    selected.
+    
+    Time Complexity: O(n + k log k)
+    Space Complexity: O(n)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if not valid.all():
+        # a NaN k-th value would compare false against everything
+        positions = np.flatnonzero(valid)
+        return positions[top_k_indices(values[positions], k, order)]
+    keys = -values if order == "desc" else values
+    n = len(keys)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(keys, kind="stable")
+    
+    kth = np.partition(keys, k - 1)[k - 1]
+    better = np.flatnonzero(keys < kth)
+    # among values equal to the k-th one keep the earliest positions
+    ties = np.flatnonzero(keys == kth)[:k - len(better)]
+    selected = np.concatenate([better, ties])
+    return selected[np.argsort(keys[selected], kind="stable")]
+
+def top_k_trips(trips: Iterable[Dict[str, Any]], k: int, sort_by: str = "duration",
+                order: str = "desc") -> List[Dict[str, Any]]:
+    """
+    Streaming replacement for custom_trip_sorter(...)[:k].
+    
+    Accepts any iterable of trip dictionaries (consumed once, e.g. straight
+    from a cursor), a TripBatch or a columnar mapping {column: array}. The sort key is
+    looked up once per trip and a bounded heap of size k keeps the best trips
+    seen so far; ties keep their input order, like the stable insertion sort.
+    
+    Time Complexity: O(n log k)
+    Space Complexity: O(k)
+    """
+    key_name = TRIP_SORT_KEYS.get(sort_by, "trip_duration")
+    
+    if isinstance(trips, TripBatch):
+        # columnar batch: partition the key column, return TripRow views
+        return [trips[int(i)] for i in top_k_indices(trips[key_name], k, order)]
+    
+    if isinstance(trips, dict):
+        # columnar input: partition the key column, then materialize k rows
+        indices = top_k_indices(trips[key_name], k, order)
+        return [{column: values[i] for column, values in trips.items()} for i in indices]
+    
+    if k <= 0:
+        return []
+    
+    descending = order == "desc"
+    heap = []  # min-heap of (key, -position, trip); the root is the worst kept trip
+    for position, trip in enumerate(trips):
+        value = trip.get(key_name, 0)
+        key = value if descending else -value
+        if len(heap) < k:
+            heapq.heappush(heap, (key, -position, trip))
+        elif key > heap[0][0]:
+            # equal keys never replace: the earlier trip wins the tie
+            heapq.heapreplace(heap, (key, -position, trip))
+    
+    heap.sort(reverse=True)
+    return [entry[2] for entry in heap]
+
+def top_k_trip_batches(batches: Iterable[TripBatch], k: int, sort_by: str = "duration",
+                       order: str = "desc") -> List[TripRow]:
+    """
+    top_k_trips over a stream of TripBatch chunks (e.g. TripBatch.iter_cursor).
+    
+    Only the k best rows seen so far are kept: each chunk is merged with them
+    and partitioned again, so the whole table is ranked without ever being
+    held. Ties keep their input order, earlier chunks first.
+    
+    Time Complexity: O(n + (n / b) * k log k) for chunks of b rows
+    Space Complexity: O(b + k)
+    """
+    key_name = TRIP_SORT_KEYS.get(sort_by, "trip_duration")
+    best = None
+    for batch in batches:
+        if best is not None:
+            batch = TripBatch({
+                name: np.concatenate([best.columns[name], values]) for name, values in batch.columns.items()
+            })
+        best = batch.take(top_k_indices(batch[key_name], k, order))
+    return [] if best is None else list(best)
+
 def calculate_complexity_metrics():
     """
     Helper function to document time/space complexity of algorithms.
@@ -248,19 +860,64 @@ def calculate_complexity_metrics():
             "space": "O(1) - fixed 24 hours",
             "description": "Linear scan with fixed output size"
         },
+        "hour_histogram": {
+            "time": "O(n)",
+            "space": "O(1) - fixed 24 hours",
+            "description": "Bincount over integer hours (or O(1) from GROUP BY counts)"
+        },
         "rank_clusters_by_total_duration": {
             "time": "O(n + k log k)",
             "space": "O(k)",
             "description": "Selection sort on cluster totals"
         },
+        "rank_cluster_totals": {
+            "time": "O(n + k log k)",
+            "space": "O(k)",
+            "description": "Bincount aggregation of labels/durations, then one O(k log k) sort"
+        },
         "manual_kmeans_clustering": {
             "time": "O(n * k * iterations)", 
             "space": "O(n + k)",
             "description": "Standard K-means complexity"
         },
+        "vectorized_kmeans_clustering": {
+            "time": "O(n * k * iterations)",
+            "space": "O(n + k)",
+            "description": "Batched NumPy distances, k-means++ seeding, O(n) grouping"
+        },
+        "hamerly_kmeans_fit": {
+            "time": "O(n * k * iterations) worst case, ~O(n) per converged iteration",
+            "space": "O(n + k^2)",
+            "description": "Triangle-inequality bounds skip provably unchanged assignments"
+        },
+        "minibatch_kmeans": {
+            "time": "O(n * k * passes)",
+            "space": "O(k + batch_size)",
+            "description": "Streaming mini-batch updates plus one counting pass"
+        },
         "custom_trip_sorter": {
             "time": "O(n²)",
             "space": "O(n)",
             "description": "Insertion sort implementation"
+        },
+        "selection_sort_trips": {
+            "time": "O(n²)",
+            "space": "O(n)",
+            "description": "Selection sort on one numeric field"
+        },
+        "haversine_distance": {
+            "time": "O(1) per pair",
+            "space": "O(1) per pair",
+            "description": "Great-circle distance, vectorized over coordinate arrays"
+        },
+        "top_k_trips": {
+            "time": "O(n log k)",
+            "space": "O(k)",
+            "description": "Bounded heap over a single pass, key extracted once per trip"
+        },
+        "top_k_trip_batches": {
+            "time": "O(n + (n / b) * k log k)",
+            "space": "O(b + k)",
+            "description": "Streaming top-k over b-row chunks, partitioning each chunk with the k best so far"
         }
     }
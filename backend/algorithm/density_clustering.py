@@ -0,0 +1,335 @@
+"""
+Grid-accelerated density clustering (DBSCAN) for pickup hotspots.
+Distances are in meters under a local equirectangular projection and the
+neighbour search only looks at adjacent grid cells.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import math
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+# label given to points that belong to no cluster (same convention as sklearn)
+NOISE = -1
+
+# cell offsets that can hold points within eps when the cell side is eps/sqrt(2):
+# the 5x5 block around a cell minus its four corners (those are at least eps away)
+_NEIGHBOUR_OFFSETS = np.array(
+    [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if abs(dx) + abs(dy) < 4],
+    dtype=np.int64,
+)
+
+
+def project_to_meters(coords: np.ndarray, origin: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """
+    Project (lat, lon) degrees onto a local plane in meters.
+    Equirectangular around the origin (defaults to the mean latitude/longitude),
+    accurate to well under 1% across a city-sized area.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if origin is None:
+        origin = (float(coords[:, 0].mean()), float(coords[:, 1].mean())) if len(coords) else (0.0, 0.0)
+    lat0, lon0 = origin
+    scale = math.pi / 180.0 * EARTH_RADIUS_M
+    projected = np.empty_like(coords)
+    projected[:, 0] = (coords[:, 1] - lon0) * (scale * math.cos(math.radians(lat0)))
+    projected[:, 1] = (coords[:, 0] - lat0) * scale
+    return projected
+
+
+def prebin_points(points: np.ndarray, bin_m: float,
+                  weights: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Collapse projected points onto a bin_m grid.
+    Returns (bin centroids, bin weights, inverse) where inverse maps every input
+    point to its bin, so labels computed for the bins can be broadcast back.
+    """
+    cells = np.floor(points / bin_m).astype(np.int64)
+    _, inverse = np.unique(cells, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    count = int(inverse.max()) + 1 if len(inverse) else 0
+    if weights is None:
+        weights = np.ones(len(points), dtype=np.float64)
+    bin_weights = np.bincount(inverse, weights=weights, minlength=count)
+    centroids = np.empty((count, 2), dtype=np.float64)
+    for axis in range(2):
+        centroids[:, axis] = np.bincount(inverse, weights=points[:, axis] * weights, minlength=count) / bin_weights
+    return centroids, bin_weights, inverse
+
+
+class _UnionFind:
+    """Disjoint sets over grid cells, with path halving."""
+
+    def __init__(self, parent: np.ndarray):
+        self.parent = parent
+
+    def find(self, item: int) -> int:
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: int, b: int) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def _connected_components(size: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """
+    Smallest member of each node's component, for an undirected edge list.
+    Vectorized hooking plus pointer jumping, so it converges in a few passes.
+    """
+    label = np.arange(size)
+    while True:
+        lu, lv = label[u], label[v]
+        hooked = label.copy()
+        np.minimum.at(hooked, lu, lv)
+        np.minimum.at(hooked, lv, lu)
+        # pointer jumping until every node points at a root
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, label):
+            return label
+        label = hooked
+
+
+def _block_pairs(rows_start: np.ndarray, rows_count: np.ndarray, cols_start: np.ndarray, cols_count: np.ndarray,
+                 max_pairs: int = 1 << 22):
+    """
+    Enumerate every (row, col) position pair of a list of block products.
+
+    Block p pairs positions rows_start[p] + [0, rows_count[p]) with
+    cols_start[p] + [0, cols_count[p]). Yields (block, row, col) arrays in
+    chunks of about max_pairs pairs so memory stays bounded.
+    """
+    sizes = rows_count * cols_count
+    ends = np.cumsum(sizes)
+    first = 0
+    while first < len(sizes):
+        last = max(int(np.searchsorted(ends, ends[first] - sizes[first] + max_pairs, side="right")), first + 1)
+        chunk = sizes[first:last]
+        total = int(chunk.sum())
+        if total:
+            block = np.repeat(np.arange(first, last), chunk)
+            offset = np.arange(total) - np.repeat(np.cumsum(chunk) - chunk, chunk)
+            row, col = np.divmod(offset, cols_count[block])
+            row += rows_start[block]
+            col += cols_start[block]
+            yield block, row, col
+        first = last
+
+
+def _squared_gap(x: np.ndarray, y: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    dx = x[rows] - x[cols]
+    dy = y[rows] - y[cols]
+    dx *= dx
+    dy *= dy
+    dx += dy
+    return dx
+
+
+def _any_within(a: np.ndarray, b: np.ndarray, eps2: float, chunk_size: int = 4096) -> bool:
+    """True if any point of a is within eps of any point of b (stops at the first hit)."""
+    for start in range(0, len(a), chunk_size):
+        diff = a[start:start + chunk_size, None, :] - b[None, :, :]
+        if (np.einsum("ijk,ijk->ij", diff, diff) <= eps2).any():
+            return True
+    return False
+
+
+def _near_box(points: np.ndarray, low: np.ndarray, high: np.ndarray, eps: float) -> np.ndarray:
+    """Points within eps of the axis-aligned box [low, high]."""
+    gap = np.maximum(np.maximum(low - points, points - high), 0.0)
+    return np.einsum("ij,ij->i", gap, gap) <= eps * eps
+
+
+def _neighbour_pairs(neighbours: np.ndarray, source: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(cell, neighbour) pairs where cell is in source and the neighbour in target."""
+    cells = np.repeat(np.arange(len(neighbours)), neighbours.shape[1])
+    others = neighbours.reshape(-1)
+    keep = others >= 0
+    cells, others = cells[keep], others[keep]
+    keep = source[cells] & target[others]
+    return cells[keep], others[keep]
+
+
+def grid_dbscan(points: np.ndarray, eps: float, min_samples: float,
+                weights: Optional[np.ndarray] = None, stats: Optional[Dict[str, Any]] = None,
+                max_link_pairs: int = 1024) -> np.ndarray:
+    """
+    DBSCAN over projected points (meters) using a uniform grid.
+
+    The cell side is eps/sqrt(2), so every pair of points inside one cell is
+    within eps: a cell holding min_samples weight is entirely core without any
+    distance computation, and neighbours only live in the 21 surrounding cells.
+    weights count towards min_samples (a pre-binned point of weight 30 counts as
+    30 trips). Border points join the cluster of their nearest core point.
+
+    Returns one label per point, clusters numbered by total weight (0 = heaviest)
+    and NOISE (-1) for the rest.
+
+    Time Complexity: O(n log n) for the grid sort plus local distance checks
+    Space Complexity: O(n) plus bounded distance chunks
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    labels = np.full(n, NOISE, dtype=np.int64)
+    if n == 0:
+        return labels
+    weights = np.ones(n, dtype=np.float64) if weights is None else np.asarray(weights, dtype=np.float64)
+    eps2 = eps * eps
+    side = eps / math.sqrt(2.0)
+
+    # sort points by cell so every cell is a contiguous slice
+    cells = np.floor(points / side).astype(np.int64)
+    shift = cells.min(axis=0) - 2
+    cells -= shift
+    width = int(cells[:, 1].max()) + 3
+    keys = cells[:, 0] * width + cells[:, 1]
+    order = np.argsort(keys, kind="stable")
+    keys, points, weights = keys[order], points[order], weights[order]
+    x, y = np.ascontiguousarray(points[:, 0]), np.ascontiguousarray(points[:, 1])
+    cell_keys, starts, cell_counts = np.unique(keys, return_index=True, return_counts=True)
+    n_cells = len(cell_keys)
+    point_cell = np.repeat(np.arange(n_cells), cell_counts)
+
+    # neighbour cell indices, -1 where the cell is empty
+    neighbour_keys = cell_keys[:, None] + (_NEIGHBOUR_OFFSETS[:, 0] * width + _NEIGHBOUR_OFFSETS[:, 1])[None, :]
+    neighbours = np.searchsorted(cell_keys, neighbour_keys)
+    neighbours[neighbours >= n_cells] = 0
+    neighbours = np.where(cell_keys[neighbours] == neighbour_keys, neighbours, -1)
+    distance_checks = 0
+
+    # core points: whole dense cells, otherwise weighted neighbour counts
+    dense = np.add.reduceat(weights, starts) >= min_samples
+    core = dense[point_cell]
+    reach = np.zeros(n, dtype=np.float64)
+    sparse_cells, others = _neighbour_pairs(neighbours, ~dense, np.ones(n_cells, dtype=bool))
+    for _, rows, cols in _block_pairs(starts[sparse_cells], cell_counts[sparse_cells],
+                                      starts[others], cell_counts[others]):
+        within = _squared_gap(x, y, rows, cols) <= eps2
+        reach += np.bincount(rows[within], weights=weights[cols[within]], minlength=n)
+        distance_checks += len(rows)
+    core |= reach >= min_samples
+
+    # core points grouped by cell (still contiguous since points are sorted by cell)
+    core_index = np.flatnonzero(core)
+    core_count = np.bincount(point_cell[core_index], minlength=n_cells)
+    core_start = np.searchsorted(core_index, starts)
+    has_core = core_count > 0
+
+    # link neighbouring core cells; cores sharing a cell are always connected
+    cells_a, cells_b = _neighbour_pairs(neighbours, has_core, has_core)
+    upper = cells_a < cells_b
+    cells_a, cells_b = cells_a[upper], cells_b[upper]
+    small = core_count[cells_a] * core_count[cells_b] <= max_link_pairs
+    linked = np.zeros(len(cells_a), dtype=bool)
+    small_pairs = np.flatnonzero(small)
+    for block, rows, cols in _block_pairs(core_start[cells_a[small]], core_count[cells_a[small]],
+                                          core_start[cells_b[small]], core_count[cells_b[small]]):
+        within = _squared_gap(x, y, core_index[rows], core_index[cols]) <= eps2
+        linked[small_pairs[block[within]]] = True
+        distance_checks += len(rows)
+    union_find = _UnionFind(_connected_components(n_cells, cells_a[linked], cells_b[linked]))
+
+    # large cell pairs: early-exit checks restricted to points near the other cell
+    cell_low = (np.column_stack([cell_keys // width, cell_keys % width]) + shift) * side
+    for cell, other in zip(cells_a[~small], cells_b[~small]):
+        if union_find.find(cell) == union_find.find(other):
+            continue
+        mine = points[core_index[core_start[cell]:core_start[cell] + core_count[cell]]]
+        mine = mine[_near_box(mine, cell_low[other], cell_low[other] + side, eps)]
+        theirs = points[core_index[core_start[other]:core_start[other] + core_count[other]]]
+        theirs = theirs[_near_box(theirs, cell_low[cell], cell_low[cell] + side, eps)]
+        if len(mine) and len(theirs):
+            distance_checks += len(mine) * len(theirs)
+            if _any_within(mine, theirs, eps2):
+                union_find.union(cell, other)
+
+    cell_root = np.array([union_find.find(cell) for cell in range(n_cells)])
+    sorted_labels = np.where(core, cell_root[point_cell], NOISE)
+
+    # border points: nearest core point within eps in the surrounding cells
+    border_index = np.flatnonzero(~core)
+    border_count = np.bincount(point_cell[border_index], minlength=n_cells)
+    border_start = np.searchsorted(border_index, starts)
+    cells_a, cells_b = _neighbour_pairs(neighbours, border_count > 0, has_core)
+    best = np.full(n, np.inf)
+    best_core = np.zeros(n, dtype=np.int64)
+    for _, rows, cols in _block_pairs(border_start[cells_a], border_count[cells_a],
+                                      core_start[cells_b], core_count[cells_b]):
+        rows, cols = border_index[rows], core_index[cols]
+        gaps = _squared_gap(x, y, rows, cols)
+        distance_checks += len(rows)
+        within = gaps <= eps2
+        rows, cols, gaps = rows[within], cols[within], gaps[within]
+        # closest candidate per border point in this chunk, then keep it if it beats earlier chunks
+        by_point = np.lexsort((gaps, rows))
+        rows, cols, gaps = rows[by_point], cols[by_point], gaps[by_point]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        rows, cols, gaps = rows[first], cols[first], gaps[first]
+        better = gaps < best[rows]
+        best[rows[better]] = gaps[better]
+        best_core[rows[better]] = cols[better]
+    assigned = np.isfinite(best)
+    sorted_labels[assigned] = sorted_labels[best_core[assigned]]
+
+    # renumber clusters by total weight, heaviest first
+    clustered = sorted_labels >= 0
+    if clustered.any():
+        roots, compact = np.unique(sorted_labels[clustered], return_inverse=True)
+        totals = np.bincount(compact, weights=weights[clustered], minlength=len(roots))
+        rank = np.empty(len(roots), dtype=np.int64)
+        rank[np.argsort(-totals, kind="stable")] = np.arange(len(roots))
+        sorted_labels[clustered] = rank[compact]
+
+    labels[order] = sorted_labels
+    if stats is not None:
+        stats["cells"] = n_cells
+        stats["distance_computations"] = distance_checks
+    return labels
+
+
+def density_hotspots(coords: np.ndarray, eps_m: float = 150.0, min_samples: int = 50,
+                     prebin_m: Optional[float] = None, stats: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Cluster (lat, lon) pickups and summarize every cluster.
+
+    With prebin_m the points are first collapsed onto a prebin_m grid and the
+    weighted bins are clustered instead, which bounds the work by the number of
+    occupied bins (results shift by at most one bin diagonal).
+
+    Returns [{"cluster", "pickup_latitude", "pickup_longitude", "num_trips"}]
+    sorted by cluster id, noise (-1) first.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords) == 0:
+        return []
+    points = project_to_meters(coords)
+
+    if prebin_m:
+        bins, bin_weights, inverse = prebin_points(points, prebin_m)
+        labels = grid_dbscan(bins, eps_m, min_samples, weights=bin_weights, stats=stats)[inverse]
+    else:
+        labels = grid_dbscan(points, eps_m, min_samples, stats=stats)
+
+    # per-cluster mean position and size, noise shifted to slot 0
+    slots = labels + 1
+    size = np.bincount(slots)
+    lat = np.bincount(slots, weights=coords[:, 0])
+    lon = np.bincount(slots, weights=coords[:, 1])
+    summary = []
+    for slot in np.flatnonzero(size):
+        summary.append({
+            "cluster": int(slot) - 1,
+            "pickup_latitude": float(lat[slot] / size[slot]),
+            "pickup_longitude": float(lon[slot] / size[slot]),
+            "num_trips": int(size[slot]),
+        })
+    return summary
@@ -0,0 +1,101 @@
+"""
+Density rasters of trip endpoints, cut into quadtree tiles.
+Tile (z, x, y) covers the same area as pickup pyramid cell (z, x, y) over the
+bounds (x grows eastwards, y northwards) and holds tile_size x tile_size
+point counts. Pixel rows run north to south, so a decoded tile maps straight
+onto an image. Tiles are encoded as gzip-compressed little-endian uint32.
+"""
+from typing import Dict, Tuple
+import gzip
+import numpy as np
+from algorithm.spatial_pyramid import Bounds, cell_index
+
+TILE_DTYPE = np.dtype("<u4")
+
+
+def tile_bits(tile_size: int) -> int:
+    """log2 of the tile size, which must be a power of two."""
+    if tile_size < 1 or tile_size & (tile_size - 1):
+        raise ValueError("tile_size must be a power of two")
+    return tile_size.bit_length() - 1
+
+
+def _pixels(lat: np.ndarray, lon: np.ndarray, bounds: Bounds, zoom: int, bits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Global pixel of every point inside bounds at a zoom level.
+    The pixels of zoom z are exactly the pyramid cells of zoom z + bits, so a
+    tile's pixels and its child tiles' pixels line up.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    min_lat, min_lon, max_lat, max_lon = bounds
+    inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+    return cell_index(lat[inside], lon[inside], zoom + bits, bounds)
+
+
+def _rasterize(px: np.ndarray, py: np.ndarray, counts: np.ndarray, tile_size: int) -> np.ndarray:
+    """Place counts of pixels (all inside one tile) into a north-up raster."""
+    raster = np.zeros((tile_size, tile_size), dtype=np.uint32)
+    mask = tile_size - 1
+    np.add.at(raster, (mask - (py & mask), px & mask), counts)
+    return raster
+
+
+def build_heatmap_tiles(lat: np.ndarray, lon: np.ndarray, bounds: Bounds, max_zoom: int,
+                        tile_size: int = 128, min_zoom: int = 0) -> Dict[Tuple[int, int, int], np.ndarray]:
+    """
+    Every non-empty tile from max_zoom down to min_zoom.
+
+    Returns {(zoom, tile_x, tile_y): (tile_size, tile_size) uint32 raster}.
+    Points outside bounds are ignored.
+
+    Pixels are aggregated once at max_zoom; each coarser level merges the
+    finer level's occupied pixels 2x2, never the raw points again.
+
+    Time Complexity: O(n log n) for the finest level, then O(pixels log pixels) per level
+    Space Complexity: O(n) while building, O(occupied pixels) for the result
+    """
+    bits = tile_bits(tile_size)
+    px, py = _pixels(lat, lon, bounds, max_zoom, bits)
+    counts = np.ones(len(px), dtype=np.int64)
+
+    tiles = {}
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        if zoom < max_zoom:
+            px, py = px >> 1, py >> 1
+        side = np.int64(1) << (zoom + bits)
+        keys, group = np.unique(px * side + py, return_inverse=True)
+        counts = np.bincount(group.reshape(-1), weights=counts, minlength=len(keys)).astype(np.int64)
+        px, py = keys // side, keys % side
+
+        # group occupied pixels by tile (keys are sorted by px, so sort by tile explicitly)
+        tile_keys = (px >> bits) * (np.int64(1) << zoom) + (py >> bits)
+        order = np.argsort(tile_keys, kind="stable")
+        tile_ids, starts = np.unique(tile_keys[order], return_index=True)
+        ends = np.r_[starts[1:], len(order)]
+        for tile_id, start, end in zip(tile_ids, starts, ends):
+            members = order[start:end]
+            tile_x, tile_y = divmod(int(tile_id), 1 << zoom)
+            tiles[(zoom, tile_x, tile_y)] = _rasterize(px[members], py[members], counts[members], tile_size)
+    return tiles
+
+
+def tile_raster(lat: np.ndarray, lon: np.ndarray, bounds: Bounds, zoom: int, tile_x: int, tile_y: int,
+                tile_size: int = 128) -> np.ndarray:
+    """
+    One tile computed directly from points, identical to the matching
+    build_heatmap_tiles entry (all zeros for an empty tile).
+    """
+    bits = tile_bits(tile_size)
+    px, py = _pixels(lat, lon, bounds, zoom, bits)
+    in_tile = ((px >> bits) == tile_x) & ((py >> bits) == tile_y)
+    return _rasterize(px[in_tile], py[in_tile], np.ones(int(in_tile.sum()), dtype=np.int64), tile_size)
+
+
+def encode_tile(raster: np.ndarray) -> bytes:
+    """gzip of the little-endian uint32 counts (mtime fixed so equal tiles give equal bytes)."""
+    return gzip.compress(np.ascontiguousarray(raster, dtype=TILE_DTYPE).tobytes(), compresslevel=6, mtime=0)
+
+
+def decode_tile(data: bytes, tile_size: int) -> np.ndarray:
+    return np.frombuffer(gzip.decompress(data), dtype=TILE_DTYPE).reshape(tile_size, tile_size)
@@ -0,0 +1,156 @@
+"""
+Sparse origin-destination matrix over pyramid cells, per pickup hour.
+Rows are (pickup hour, origin cell) and columns destination cells; only
+occupied pairs are stored, in compressed sparse row (CSR) order and once
+more transposed, so the busiest destinations of an origin (or origins of a
+destination) only touch that cell's non-zeros instead of every trip.
+"""
+from typing import Iterable, Optional, Tuple
+import numpy as np
+from algorithm.spatial_pyramid import Bounds, cell_index
+
+HOUR_BUCKETS = 24
+
+# (partner cells ascending, trip counts, summed durations, summed distances)
+Row = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, end) for every pair, without a Python loop."""
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+    return offsets + np.arange(lengths.sum(), dtype=np.int64)
+
+
+def _indptr(rows: np.ndarray, row_count: int) -> np.ndarray:
+    indptr = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=row_count), out=indptr[1:])
+    return indptr
+
+
+class ODMatrix:
+    """
+    Trip counts, summed durations and summed distances per (hour, origin, destination).
+
+    Cells are numbered cell_x * side + cell_y at one zoom, like the pyramid.
+    Pairs are stored sorted by (hour, origin, destination) with indptr
+    delimiting every (hour, origin) row; reverse_indptr / reverse_indices
+    delimit the same pairs by (hour, destination, origin), reverse_order
+    mapping back to the stored pairs.
+    """
+    __slots__ = ("zoom", "side", "indptr", "indices", "counts", "durations", "distances",
+                 "reverse_indptr", "reverse_indices", "reverse_order")
+
+    def __init__(self, zoom: int, indptr: np.ndarray, indices: np.ndarray, counts: np.ndarray,
+                 durations: np.ndarray, distances: np.ndarray, reverse_indptr: np.ndarray,
+                 reverse_indices: np.ndarray, reverse_order: np.ndarray):
+        self.zoom = zoom
+        self.side = 1 << zoom
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.durations = durations
+        self.distances = distances
+        self.reverse_indptr = reverse_indptr
+        self.reverse_indices = reverse_indices
+        self.reverse_order = reverse_order
+
+    @property
+    def cells(self) -> int:
+        return self.side * self.side
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def row(self, cell: int, hours: Optional[Iterable[int]] = None, reverse: bool = False) -> Row:
+        """
+        Destinations of an origin cell (origins of a destination cell when
+        reverse), summed over the given hours (all when None).
+
+        Time Complexity: O(m) for a single hour, O(m log m) to merge several (m = non-zeros read)
+        Space Complexity: O(m)
+        """
+        hours = range(HOUR_BUCKETS) if hours is None else hours
+        rows = np.array([hour * self.cells + cell for hour in hours], dtype=np.int64)
+        indptr = self.reverse_indptr if reverse else self.indptr
+        positions = _ranges(indptr[rows], indptr[rows + 1])
+        if reverse:
+            partners, positions = self.reverse_indices[positions], self.reverse_order[positions]
+        else:
+            partners = self.indices[positions]
+        counts, durations, distances = self.counts[positions], self.durations[positions], self.distances[positions]
+        if len(rows) == 1:
+            # one row is already sorted by partner cell
+            return partners, counts, durations, distances
+
+        # the same partner can appear once per hour
+        cells, group = np.unique(partners, return_inverse=True)
+        group = group.reshape(-1)
+        return (cells, np.bincount(group, weights=counts, minlength=len(cells)).astype(np.int64),
+                np.bincount(group, weights=durations, minlength=len(cells)),
+                np.bincount(group, weights=distances, minlength=len(cells)))
+
+
+def top_k(counts: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k largest counts, largest first; ties go to the lower position.
+
+    Time Complexity: O(n + k log k)
+    Space Complexity: O(n)
+    """
+    n = len(counts)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        threshold = np.partition(counts, n - k)[n - k]
+        above = np.flatnonzero(counts > threshold)
+        tied = np.flatnonzero(counts == threshold)[:k - len(above)]
+        positions = np.concatenate([above, tied])
+    else:
+        positions = np.arange(n)
+    return positions[np.lexsort((positions, -counts[positions]))]
+
+
+def build_od_matrix(pickup_lat: np.ndarray, pickup_lon: np.ndarray, dropoff_lat: np.ndarray,
+                    dropoff_lon: np.ndarray, hours: np.ndarray, durations: np.ndarray,
+                    distances: np.ndarray, bounds: Bounds, zoom: int) -> ODMatrix:
+    """
+    Aggregate trips into an ODMatrix at one zoom level.
+    Trips starting or ending outside bounds, or without a valid hour, are ignored.
+
+    Time Complexity: O(n log n)
+    Space Complexity: O(n) while building, O(occupied pairs + 24 * 4^zoom) for the result
+    """
+    pickup_lat, pickup_lon = np.asarray(pickup_lat, dtype=np.float64), np.asarray(pickup_lon, dtype=np.float64)
+    dropoff_lat, dropoff_lon = np.asarray(dropoff_lat, dtype=np.float64), np.asarray(dropoff_lon, dtype=np.float64)
+    hours = np.asarray(hours)
+    min_lat, min_lon, max_lat, max_lon = bounds
+    inside = (
+        (pickup_lat >= min_lat) & (pickup_lat <= max_lat) & (pickup_lon >= min_lon) & (pickup_lon <= max_lon) &
+        (dropoff_lat >= min_lat) & (dropoff_lat <= max_lat) & (dropoff_lon >= min_lon) & (dropoff_lon <= max_lon) &
+        (hours >= 0) & (hours < HOUR_BUCKETS)
+    )
+
+    side = np.int64(1) << zoom
+    cells = side * side
+    origin_x, origin_y = cell_index(pickup_lat[inside], pickup_lon[inside], zoom, bounds)
+    destination_x, destination_y = cell_index(dropoff_lat[inside], dropoff_lon[inside], zoom, bounds)
+    rows = hours[inside].astype(np.int64) * cells + origin_x * side + origin_y
+    pairs, group = np.unique(rows * cells + destination_x * side + destination_y, return_inverse=True)
+    group = group.reshape(-1)
+
+    counts = np.bincount(group, minlength=len(pairs))
+    pair_durations = np.bincount(group, weights=np.asarray(durations, dtype=np.float64)[inside], minlength=len(pairs))
+    pair_distances = np.bincount(group, weights=np.asarray(distances, dtype=np.float64)[inside], minlength=len(pairs))
+    rows, indices = pairs // cells, pairs % cells
+
+    # transposed: the same pairs by (hour, destination, origin)
+    origins = rows % cells
+    reverse_rows = rows - origins + indices
+    reverse_order = np.lexsort((origins, reverse_rows))
+    row_count = int(HOUR_BUCKETS * cells)
+    return ODMatrix(
+        zoom, _indptr(rows, row_count), indices, counts, pair_durations, pair_distances,
+        _indptr(reverse_rows, row_count), origins[reverse_order], reverse_order
+    )
@@ -0,0 +1,146 @@
+"""
+Mergeable quantile sketch (t-digest) for trip metrics.
+A digest summarizes any number of values in about compression/2 weighted
+centroids, keeps the tails (p1, p99) precise and merges with other digests,
+so percentiles for any combination of (hour, day_of_week) groups come from
+merging a handful of small sketches instead of sorting the trips.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+import math
+import numpy as np
+
+# metrics sketched per (pickup_hour, day_of_week) group
+SKETCH_METRICS = ("trip_duration", "trip_distance_km", "trip_speed_km_h")
+
+_HEADER_SIZE = 3  # min, max, compression
+
+
+class TDigest:
+    """
+    Merging t-digest with the arcsine scale function.
+
+    Centroids are (mean, weight) pairs sorted by mean; a centroid may only
+    cover one unit of k(q) = compression / (2 pi) * asin(2q - 1), which makes
+    centroids tiny near q = 0 and q = 1 and large around the median.
+    """
+    __slots__ = ("compression", "means", "weights", "min", "max", "_buffer")
+
+    def __init__(self, compression: float = 200.0):
+        self.compression = float(compression)
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[np.ndarray] = []
+
+    @property
+    def count(self) -> float:
+        self._flush()
+        return float(self.weights.sum())
+
+    def add(self, values: Iterable[float]) -> "TDigest":
+        """Add raw values (buffered, compressed in bulk)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self._buffer.append(values)
+            if sum(len(chunk) for chunk in self._buffer) > 20 * self.compression:
+                self._flush()
+        return self
+
+    def _flush(self) -> None:
+        if self._buffer:
+            values = np.concatenate(self._buffer)
+            self._buffer = []
+            self._compress(np.concatenate([self.means, values]),
+                           np.concatenate([self.weights, np.ones(len(values))]))
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        """Merge sorted centroids that fall into the same unit of the scale function."""
+        if len(means) == 0:
+            self.means, self.weights = means, weights
+            return
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        k = np.floor(self.compression / (2 * math.pi) * np.arcsin(np.clip(2 * q_left - 1, -1, 1)))
+        # k is non-decreasing, so equal values are contiguous runs
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated value at quantile q (0..1), None for an empty digest."""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """Estimated values at several quantiles, interpolating between centroid centers."""
+        self._flush()
+        if len(self.weights) == 0:
+            return [None] * len(qs)
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        xs = np.concatenate([[0.0], centers, [total]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return [float(v) for v in np.interp(np.clip(np.asarray(qs, dtype=np.float64), 0, 1) * total, xs, ys)]
+
+    @classmethod
+    def merge_all(cls, digests: Iterable["TDigest"], compression: Optional[float] = None) -> "TDigest":
+        """Single digest summarizing every input digest (inputs are not modified)."""
+        digests = list(digests)
+        for digest in digests:
+            digest._flush()
+        if compression is None:
+            compression = max((digest.compression for digest in digests), default=200.0)
+        merged = cls(compression)
+        if digests:
+            merged.min = min(digest.min for digest in digests)
+            merged.max = max(digest.max for digest in digests)
+            merged._compress(np.concatenate([digest.means for digest in digests]),
+                             np.concatenate([digest.weights for digest in digests]))
+        return merged
+
+    def to_bytes(self) -> bytes:
+        """Compact float64 encoding for storage in a BLOB column."""
+        self._flush()
+        header = np.array([self.min, self.max, self.compression], dtype=np.float64)
+        return np.concatenate([header, self.means, self.weights]).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TDigest":
+        values = np.frombuffer(data, dtype=np.float64)
+        digest = cls(values[2])
+        digest.min, digest.max = float(values[0]), float(values[1])
+        size = (len(values) - _HEADER_SIZE) // 2
+        digest.means = values[_HEADER_SIZE:_HEADER_SIZE + size].copy()
+        digest.weights = values[_HEADER_SIZE + size:].copy()
+        return digest
+
+
+def build_group_sketches(hours: np.ndarray, days: np.ndarray, metrics: Dict[str, np.ndarray],
+                         compression: float = 200.0) -> Dict[tuple, TDigest]:
+    """
+    One digest per (pickup_hour, day_of_week, metric) group present in the data.
+
+    Time Complexity: O(n log n) for the grouping sort
+    Space Complexity: O(n) while building, O(groups * compression) after
+    """
+    hours = np.asarray(hours, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    group = hours * 7 + days
+    order = np.argsort(group, kind="stable")
+    group = group[order]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]]) if len(group) else np.empty(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(group)]
+
+    sketches = {}
+    for name, values in metrics.items():
+        values = np.asarray(values, dtype=np.float64)[order]
+        for start, end in zip(starts, ends):
+            hour, day = divmod(int(group[start]), 7)
+            sketches[(hour, day, name)] = TDigest(compression).add(values[start:end])
+    return sketches
@@ -0,0 +1,133 @@
+"""
+Multi-resolution (quadtree) aggregation of pickup points.
+Zoom z splits a fixed bounding box into 2^z x 2^z cells; every level stores
+the point count, centroid and a uniform reservoir sample per occupied cell.
+"""
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+# (min_lat, min_lon, max_lat, max_lon)
+Bounds = Tuple[float, float, float, float]
+
+
+def cell_index(lat: np.ndarray, lon: np.ndarray, zoom: int, bounds: Bounds) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quadtree cell (cell_x, cell_y) of every point at a zoom level.
+    cell_x grows eastwards, cell_y northwards; points on the max edge fall in
+    the last cell.
+    """
+    min_lat, min_lon, max_lat, max_lon = bounds
+    side = 1 << zoom
+    cell_x = np.floor((np.asarray(lon, dtype=np.float64) - min_lon) / (max_lon - min_lon) * side).astype(np.int64)
+    cell_y = np.floor((np.asarray(lat, dtype=np.float64) - min_lat) / (max_lat - min_lat) * side).astype(np.int64)
+    return np.clip(cell_x, 0, side - 1), np.clip(cell_y, 0, side - 1)
+
+
+def cell_range(bbox: Bounds, zoom: int, bounds: Bounds) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Inclusive (x0, y0, x1, y1) cell range covering a (min_lat, min_lon, max_lat, max_lon) box,
+    or None when the box lies entirely outside bounds.
+    """
+    min_lat, min_lon = max(bbox[0], bounds[0]), max(bbox[1], bounds[1])
+    max_lat, max_lon = min(bbox[2], bounds[2]), min(bbox[3], bounds[3])
+    if min_lat > max_lat or min_lon > max_lon:
+        return None
+    x, y = cell_index(np.array([min_lat, max_lat]), np.array([min_lon, max_lon]), zoom, bounds)
+    return int(x[0]), int(y[0]), int(x[1]), int(y[1])
+
+
+def cell_bounds(zoom: int, cell_x: int, cell_y: int, bounds: Bounds) -> Bounds:
+    """(min_lat, min_lon, max_lat, max_lon) covered by one cell."""
+    min_lat, min_lon, max_lat, max_lon = bounds
+    lat_step = (max_lat - min_lat) / (1 << zoom)
+    lon_step = (max_lon - min_lon) / (1 << zoom)
+    return (min_lat + cell_y * lat_step, min_lon + cell_x * lon_step,
+            min_lat + (cell_y + 1) * lat_step, min_lon + (cell_x + 1) * lon_step)
+
+
+def _bottom_k(keys: np.ndarray, priority: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k smallest priorities within every key group."""
+    order = np.lexsort((priority, keys))
+    sorted_keys = keys[order]
+    group_start = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    rank = np.arange(len(order)) - np.repeat(group_start, np.diff(np.r_[group_start, len(order)]))
+    return order[rank < k]
+
+
+def build_pickup_pyramid(lat: np.ndarray, lon: np.ndarray, bounds: Bounds, max_zoom: int,
+                         min_zoom: int = 0, samples_per_cell: int = 10,
+                         seed: int = 42) -> Dict[int, Dict[str, np.ndarray]]:
+    """
+    Aggregate points into every zoom level from max_zoom down to min_zoom.
+
+    Returns {zoom: {"cell_x", "cell_y", "point_count", "center_lat",
+    "center_lon", "sample_cell", "sample_lat", "sample_lon"}} where sample_cell
+    indexes the cell arrays. Points outside bounds are ignored.
+
+    Each point gets one random priority and every cell keeps the points with
+    the samples_per_cell smallest priorities (a bottom-k reservoir, i.e. a
+    uniform sample without replacement). A parent's bottom-k is always among
+    its children's, so coarser levels are built from the finer level's cells
+    and samples rather than from the raw points.
+
+    Time Complexity: O(n log n) for the finest level, then O(cells log cells) per level
+    Space Complexity: O(n)
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    min_lat, min_lon, max_lat, max_lon = bounds
+    inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+    lat, lon = lat[inside], lon[inside]
+    priority = np.random.default_rng(seed).random(len(lat))
+
+    # finest level straight from the points
+    cell_x, cell_y = cell_index(lat, lon, max_zoom, bounds)
+    count = np.ones(len(lat), dtype=np.int64)
+    sum_lat, sum_lon = lat, lon
+    sample_x, sample_y, sample_lat, sample_lon, sample_priority = cell_x, cell_y, lat, lon, priority
+
+    pyramid = {}
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        if zoom < max_zoom:
+            # parent cells of the finer level
+            cell_x, cell_y = cell_x >> 1, cell_y >> 1
+            sample_x, sample_y = sample_x >> 1, sample_y >> 1
+        side = np.int64(1) << zoom
+        keys = cell_x * side + cell_y
+        unique_keys, group = np.unique(keys, return_inverse=True)
+        group = group.reshape(-1)
+        cells = len(unique_keys)
+        count = np.bincount(group, weights=count, minlength=cells).astype(np.int64)
+        sum_lat = np.bincount(group, weights=sum_lat, minlength=cells)
+        sum_lon = np.bincount(group, weights=sum_lon, minlength=cells)
+        cell_x, cell_y = unique_keys // side, unique_keys % side
+
+        sample_keys = sample_x * side + sample_y
+        keep = _bottom_k(sample_keys, sample_priority, samples_per_cell)
+        sample_x, sample_y = sample_x[keep], sample_y[keep]
+        sample_lat, sample_lon, sample_priority = sample_lat[keep], sample_lon[keep], sample_priority[keep]
+
+        pyramid[zoom] = {
+            "cell_x": cell_x,
+            "cell_y": cell_y,
+            "point_count": count,
+            "center_lat": sum_lat / np.maximum(count, 1),
+            "center_lon": sum_lon / np.maximum(count, 1),
+            "sample_cell": np.searchsorted(unique_keys, sample_keys[keep]),
+            "sample_lat": sample_lat,
+            "sample_lon": sample_lon,
+        }
+    return pyramid
+
+
+def densest_cells(level: Dict[str, np.ndarray], limit: int,
+                  cells: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+    """Indices of the `limit` most populated cells of one level, optionally inside an (x0, y0, x1, y1) range."""
+    candidates = np.arange(len(level["point_count"]))
+    if cells is not None:
+        x0, y0, x1, y1 = cells
+        mask = (level["cell_x"] >= x0) & (level["cell_x"] <= x1) & (level["cell_y"] >= y0) & (level["cell_y"] <= y1)
+        candidates = candidates[mask]
+    # busiest first, ties broken by cell position
+    order = np.lexsort((level["cell_y"][candidates], level["cell_x"][candidates], -level["point_count"][candidates]))
+    return candidates[order[:limit]]
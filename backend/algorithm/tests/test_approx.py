@@ -0,0 +1,58 @@
+import numpy as np
+from core.approx import stratified_sample, estimate_groups, sample_table_name
+
+
+def _stratum_rows(group, strata, values, chosen, sizes, samples):
+    """Per (group, stratum) aggregates as approximate_groups selects them."""
+    rows = {}
+    for i, size, count in zip(chosen, sizes, samples):
+        key = (int(group[i]), int(strata[i]))
+        row = rows.setdefault(key, {"g": key[0], "stratum_size": int(size), "stratum_samples": int(count),
+                                    "sample_count": 0, "sum_v": 0.0, "sumsq_v": 0.0})
+        row["sample_count"] += 1
+        row["sum_v"] += values[i]
+        row["sumsq_v"] += values[i] ** 2
+    return list(rows.values())
+
+
+def test_stratified_sample_quotas():
+    strata = np.repeat([0, 1, 2], [1000, 50, 1])
+    chosen, sizes, samples = stratified_sample(strata, 0.01, min_per_stratum=2, seed=1)
+    assert np.all(np.diff(chosen) > 0)
+    assert np.bincount(strata[chosen]).tolist() == [10, 2, 1]
+    assert np.array_equal(sizes, np.bincount(strata)[strata[chosen]])
+    assert np.array_equal(samples, np.bincount(strata[chosen])[strata[chosen]])
+    # deterministic for a seed
+    assert np.array_equal(chosen, stratified_sample(strata, 0.01, min_per_stratum=2, seed=1)[0])
+    assert sample_table_name(0.001) == "trips_sample_1000"
+
+
+def test_full_sample_is_exact():
+    rng = np.random.default_rng(2)
+    strata = rng.integers(0, 5, 500)
+    group = rng.integers(0, 3, 500)
+    values = rng.normal(10, 3, 500)
+    chosen, sizes, samples = stratified_sample(strata, 1.0)
+    estimates = estimate_groups(_stratum_rows(group, strata, values, chosen, sizes, samples), ["g"], ["v"])
+    for g in range(3):
+        estimate = estimates[(g,)]
+        assert np.isclose(estimate["count"]["value"], np.sum(group == g))
+        assert np.isclose(estimate["count"]["ci_low"], estimate["count"]["ci_high"])
+        assert np.isclose(estimate["v"]["value"], values[group == g].mean())
+
+
+def test_estimates_cover_truth():
+    rng = np.random.default_rng(3)
+    n = 200000
+    strata = rng.integers(0, 24, n)
+    group = (rng.random(n) < 0.3).astype(np.int64)
+    values = rng.lognormal(6.5, 0.6, n) * (1 + strata / 24)
+    chosen, sizes, samples = stratified_sample(strata, 0.01, seed=4)
+    assert abs(len(chosen) - 0.01 * n) <= 24
+
+    estimates = estimate_groups(_stratum_rows(group, strata, values, chosen, sizes, samples), ["g"], ["v"])
+    for g in (0, 1):
+        count, mean = estimates[(g,)]["count"], estimates[(g,)]["v"]
+        assert count["ci_low"] <= np.sum(group == g) <= count["ci_high"]
+        assert mean["ci_low"] <= values[group == g].mean() <= mean["ci_high"]
+        assert (mean["ci_high"] - mean["ci_low"]) / mean["value"] < 0.2
@@ -0,0 +1,49 @@
+import io
+import pandas as pd
+from data.cleaning import RAW_COLUMNS, TaxiDataCleaner, validate_trips
+from data.generate_trips import iter_csv_chunks
+
+TRIP = {
+    "id": "id1", "vendor_id": 2, "pickup_datetime": "2016-03-14 17:24:55",
+    "dropoff_datetime": "2016-03-14 17:32:30", "passenger_count": 1,
+    "pickup_longitude": -73.982155, "pickup_latitude": 40.767937,
+    "dropoff_longitude": -73.964630, "dropoff_latitude": 40.765602,
+    "store_and_fwd_flag": "N", "trip_duration": 455,
+}
+
+
+def test_rejection_reasons():
+    trips = [
+        TRIP,
+        {**TRIP, "id": "id2", "pickup_latitude": None},
+        {**TRIP, "id": "id3", "pickup_datetime": "not a date"},
+        {**TRIP, "id": "id4", "pickup_datetime": "2016-03-14T17:24:55Z"},
+        {**TRIP, "id": "id1", "trip_duration": 456},
+        {**TRIP, "id": "id6", "dropoff_longitude": -75.0},
+        {**TRIP, "id": "id7", "trip_duration": 20000},
+        {**TRIP, "id": "id8", "passenger_count": 0},
+        {**TRIP, "id": "id9", "trip_duration": "455", "pickup_datetime": "2016-03-14T17:24:55"},
+    ]
+    valid, rejected = validate_trips(pd.DataFrame.from_records(trips, columns=list(RAW_COLUMNS)))
+    assert rejected == {
+        1: "missing or invalid pickup_latitude",
+        2: "missing or invalid pickup_datetime",
+        3: "missing or invalid pickup_datetime",
+        4: "duplicate id",
+        5: "coordinates outside NYC bounds",
+        6: "trip_duration out of range",
+        7: "impossible speed, distance or passenger count",
+    }
+    # indexed by input position, with the derived columns
+    assert list(valid.index) == [0, 8]
+    assert valid["pickup_hour"].tolist() == [17, 17]
+    assert valid["day_of_week"].tolist() == [0, 0]
+    assert abs(valid["trip_distance_km"].iloc[0] - 1.49) < 0.01
+
+
+def test_same_trips_as_cleaner():
+    raw = pd.read_csv(io.BytesIO(b"".join(iter_csv_chunks(5000, seed=11, dirty_fraction=0.1))))
+    cleaned = TaxiDataCleaner().clean_data(raw.copy())
+    valid, rejected = validate_trips(raw)
+    assert sorted(valid["id"]) == sorted(cleaned["id"])
+    assert len(valid) + len(rejected) == len(raw)
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import numpy as np
+from core.config import settings
+from core.column_store import ColumnStore, write_column_store, get_column_store
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "..", "..", "db", "schema.sql")
+
+
+def _trips_db(path, n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(open(SCHEMA).read())
+    rows = []
+    for i in range(n):
+        epoch = 1451606400 + int(rng.integers(0, 86400 * 180))
+        rows.append((
+            i + 1, 1, epoch, epoch + 600, None if i % 7 == 0 else int(rng.integers(1, 6)),
+            float(rng.uniform(-74.0, -73.9)), float(rng.uniform(40.7, 40.8)),
+            float(rng.uniform(-74.0, -73.9)), float(rng.uniform(40.7, 40.8)),
+            int(rng.integers(60, 3600)), float(rng.uniform(0.5, 20)), float(rng.uniform(5, 40)),
+            int(rng.integers(0, 24)), int(rng.integers(0, 7)), epoch, epoch + 600
+        ))
+    conn.executemany("""
+        INSERT INTO trips (id, vendor_id, pickup_datetime, dropoff_datetime, passenger_count,
+                           pickup_longitude, pickup_latitude, dropoff_longitude, dropoff_latitude,
+                           trip_duration, trip_distance_km, trip_speed_km_h, pickup_hour, day_of_week,
+                           is_weekend, pickup_month, pickup_year, pickup_epoch, dropoff_epoch)
+        VALUES (?, ?, datetime(?, 'unixepoch'), datetime(?, 'unixepoch'), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 1, 2016, ?, ?)
+    """, rows)
+    conn.commit()
+    return conn, rows
+
+
+def test_store_matches_trips_in_rowid_order(tmp_path):
+    conn, rows = _trips_db(str(tmp_path / "trips.db"))
+    manifest = write_column_store(conn, str(tmp_path / "columns"), "v1", batch_size=64)
+    assert manifest["row_count"] == len(rows)
+
+    store = ColumnStore.open(str(tmp_path / "columns"))
+    assert len(store) == len(rows) and store.data_version == "v1"
+    assert np.array_equal(store["pickup_epoch"], [row[2] for row in rows])
+    assert np.array_equal(store["passenger_count"], [-1 if row[4] is None else row[4] for row in rows])
+    assert np.array_equal(store["pickup_latitude"], [row[6] for row in rows])
+    assert np.allclose(store["trip_speed_km_h"], [row[11] for row in rows])
+    assert store["trip_duration"].dtype == np.int32
+
+    # columns are read-only views of the mapped files, batches do not copy them
+    batch = store.batch(["pickup_latitude", "trip_duration"])
+    assert isinstance(batch["pickup_latitude"], np.memmap) and not batch["pickup_latitude"].flags.writeable
+    assert np.shares_memory(batch["trip_duration"], store["trip_duration"])
+    assert batch[3]["trip_duration"] == rows[3][9]
+
+
+def test_rebuild_replaces_store_and_version_gates_readers(tmp_path, monkeypatch):
+    conn, rows = _trips_db(str(tmp_path / "trips.db"), n=50)
+    path = str(tmp_path / "columns")
+    write_column_store(conn, path, "v1")
+    monkeypatch.setattr(settings, "COLUMN_STORE_DIR", path)
+    assert get_column_store("v1") is not None
+    assert get_column_store("v2") is None
+
+    conn.execute("DELETE FROM trips WHERE id > 20")
+    conn.commit()
+    write_column_store(conn, path, "v2")
+    assert sorted(os.listdir(tmp_path)) == ["columns", "trips.db"]
+    store = get_column_store("v2")
+    assert store is not None and len(store) == 20
+
+    monkeypatch.setattr(settings, "COLUMN_STORE_ENABLED", False)
+    assert get_column_store("v2") is None
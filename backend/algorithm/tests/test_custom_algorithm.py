@@ -1,4 +1,6 @@
+import numpy as np
 from algorithm import custom_algorithm as ca
+from algorithm.trip_batch import TripBatch
 
 
 def test_selection_sort_trips():
@@ -36,3 +38,189 @@ def test_rank_clusters_by_total_duration():
 def test_haversine_distance():
     d = ca.haversine_distance(40.7128, -74.0060, 40.7128, -74.0060)
     assert abs(d) < 1e-6
+
+
+def _blob_trips():
+    trips = []
+    for i, (lat, lon) in enumerate([(40.70, -74.00), (40.80, -73.90), (40.60, -73.80)]):
+        for j in range(20):
+            trips.append({
+                "pickup_latitude": lat + 0.001 * (j % 5),
+                "pickup_longitude": lon - 0.001 * (j % 4),
+                "trip_duration": 100 * (i + 1),
+            })
+    return trips
+
+
+def test_vectorized_kmeans_keeps_return_shape():
+    trips = _blob_trips()
+    clusters = ca.vectorized_kmeans_clustering(trips, 3)
+    assert sorted(clusters.keys()) == [0, 1, 2]
+    assert sorted(c["size"] for c in clusters.values()) == [20, 20, 20]
+    for cluster in clusters.values():
+        assert len(cluster["trips"]) == cluster["size"]
+        assert len(cluster["center"]) == 2
+
+
+def test_vectorized_kmeans_summary_mode():
+    trips = _blob_trips()
+    summary = ca.vectorized_kmeans_clustering(trips, 3, summary_only=True, seed=7)
+    assert all("trips" not in c for c in summary.values())
+    assert sorted(c["total_duration"] for c in summary.values()) == [2000, 4000, 6000]
+
+
+def test_kmeans_plus_plus_is_deterministic():
+    coords = np.random.default_rng(0).normal(size=(500, 2))
+    first = ca.kmeans_plus_plus_init(coords, 5, seed=3)
+    second = ca.kmeans_plus_plus_init(coords, 5, seed=3)
+    assert np.array_equal(first, second)
+    assert len({tuple(c) for c in first}) == 5
+
+
+def test_minibatch_kmeans_streams_batches():
+    trips = _blob_trips()
+    coords = np.array([(t["pickup_latitude"], t["pickup_longitude"]) for t in trips])
+    durations = np.array([t["trip_duration"] for t in trips], dtype=float)
+
+    def batch_source():
+        for start in range(0, len(coords), 16):
+            yield coords[start:start + 16], durations[start:start + 16]
+
+    first = ca.minibatch_kmeans(batch_source, 3, seed=1)
+    second = ca.minibatch_kmeans(batch_source, 3, seed=1)
+    assert first == second
+    assert sum(c["size"] for c in first.values()) == len(trips)
+    assert sum(c["total_duration"] for c in first.values()) == durations.sum()
+
+
+def test_hamerly_kmeans_matches_plain_kmeans():
+    rng = np.random.default_rng(5)
+    centers = [(40.70, -74.00), (40.75, -73.95), (40.80, -73.90), (40.65, -73.80)]
+    coords = np.concatenate([rng.normal(loc=c, scale=0.01, size=(500, 2)) for c in centers])
+
+    plain_centers, plain_labels = ca.kmeans_fit(coords, 8, seed=2)
+    stats = {}
+    fast_centers, fast_labels = ca.hamerly_kmeans_fit(coords, 8, seed=2, stats=stats)
+
+    assert np.array_equal(plain_labels, fast_labels)
+    assert np.allclose(plain_centers, fast_centers)
+    assert stats["distance_computations_saved"] > 0
+
+
+def test_hamerly_kmeans_matches_plain_kmeans_on_ties():
+    # GPS rounded to 3 decimals: many duplicate points and points equally far from two centers
+    for seed, n, k in ((12, 5000, 43), (3, 5000, 43), (7, 4752, 17)):
+        rng = np.random.default_rng(seed)
+        coords = np.round(np.column_stack([rng.normal(40.75, 0.03, n), rng.normal(-73.98, 0.03, n)]), 3)
+
+        plain_centers, plain_labels = ca.kmeans_fit(coords, k, seed=seed)
+        fast_centers, fast_labels = ca.hamerly_kmeans_fit(coords, k, seed=seed)
+
+        assert np.array_equal(plain_labels, fast_labels)
+        assert np.array_equal(plain_centers, fast_centers)
+
+
+def test_top_k_trips_matches_insertion_sort():
+    rng = np.random.default_rng(3)
+    trips = [
+        {"id": i, "trip_duration": int(d), "trip_distance_km": float(d % 7), "trip_speed_km_h": 1.0}
+        for i, d in enumerate(rng.integers(0, 20, size=200))
+    ]
+    for sort_by in ("duration", "distance", "speed"):
+        for order in ("asc", "desc"):
+            expected = ca.custom_trip_sorter(trips, sort_by=sort_by, order=order)[:15]
+            assert [t["id"] for t in ca.top_k_trips(iter(trips), 15, sort_by, order)] == [t["id"] for t in expected]
+
+
+def test_top_k_trips_columnar_input():
+    columns = {"id": np.arange(6), "trip_duration": np.array([5, 9, 1, 9, 3, 7])}
+    top = ca.top_k_trips(columns, 3, sort_by="duration", order="desc")
+    assert [int(t["id"]) for t in top] == [1, 3, 5]
+    assert list(ca.top_k_indices(columns["trip_duration"], 2, order="asc")) == [2, 4]
+
+
+def test_top_k_skips_nan():
+    values = np.array([np.nan, 4.0, np.nan, 9.0, 1.0, np.nan, 4.0])
+    # the k-th smallest key would be NaN without filtering
+    assert list(ca.top_k_indices(values, 4, order="desc")) == [3, 1, 6, 4]
+    assert list(ca.top_k_indices(values, 3, order="asc")) == [4, 1, 6]
+    assert list(ca.top_k_indices(np.full(3, np.nan), 2)) == []
+
+
+def test_top_k_trip_batches_matches_insertion_sort():
+    rng = np.random.default_rng(4)
+    batch = TripBatch({
+        "id": np.arange(1000), "trip_duration": rng.integers(0, 50, 1000).astype(np.int32),
+        "trip_distance_km": rng.uniform(0, 10, 1000).astype(np.float32),
+        "trip_speed_km_h": rng.integers(0, 9, 1000).astype(np.float32),
+    })
+    trips = batch.to_dicts()
+    for sort_by in ("duration", "distance", "speed"):
+        for order in ("asc", "desc"):
+            expected = ca.custom_trip_sorter(trips, sort_by=sort_by, order=order)[:25]
+            chunks = (batch[start:start + 64] for start in range(0, len(batch), 64))
+            top = ca.top_k_trip_batches(chunks, 25, sort_by, order)
+            assert [t["id"] for t in top] == [t["id"] for t in expected]
+    assert ca.top_k_trip_batches(iter([]), 5) == []
+
+
+def test_rank_cluster_totals_from_labels():
+    labels = np.array([0, 2, 1, 2, 0, 2])
+    durations = np.array([10, 5, 50, 5, 20, 5])
+    totals = ca.aggregate_cluster_durations(labels, durations, 3)
+    assert list(totals) == [30, 50, 15]
+    assert ca.rank_cluster_totals(totals) == [(1, 50.0), (0, 30.0), (2, 15.0)]
+    assert ca.rank_cluster_totals({"x": 30, "y": 5, "z": 50})[0] == ("z", 50.0)
+
+
+def test_hour_histogram_matches_string_parsing():
+    trips = [
+        {"pickup_datetime": "2016-03-14 17:24:55"},
+        {"pickup_datetime": "2016-03-14 17:59:00"},
+        {"pickup_datetime": "2016-06-12 00:43:35"},
+    ]
+    expected = ca.pickup_hour_frequency(trips)
+    assert ca.hour_histogram(np.array([17, 17, 0])) == expected
+    assert ca.hour_histogram_from_counts([(17, 2), (0, 1)]) == expected
+
+
+def test_trip_batch_columns_and_views():
+    trips = [
+        {"id": "a", "trip_duration": 10, "pickup_hour": 17, "pickup_latitude": 40.7, "pickup_longitude": -73.9},
+        {"id": "b", "trip_duration": 5, "pickup_hour": 0, "pickup_latitude": 40.8, "pickup_longitude": -73.8},
+        {"id": "c", "trip_duration": 20, "pickup_hour": 17, "pickup_latitude": 40.6, "pickup_longitude": -73.7},
+    ]
+    batch = TripBatch.from_dicts(trips)
+    assert len(batch) == 3
+    assert batch["trip_duration"].dtype == np.int32
+    assert batch["id"].dtype == object
+    view = batch[1:]
+    assert np.shares_memory(view["trip_duration"], batch["trip_duration"])
+    assert view[0]["id"] == "b" and view[0].get("missing", 7) == 7
+    assert batch.coordinates("pickup").shape == (3, 2)
+    assert batch.to_dicts() == trips
+
+
+def test_trip_batch_with_custom_algorithms():
+    rng = np.random.default_rng(5)
+    trips = [
+        {"id": str(i), "trip_duration": int(d), "pickup_hour": int(d % 24),
+         "trip_distance_km": float(d) / 3, "trip_speed_km_h": 1.0}
+        for i, d in enumerate(rng.integers(0, 500, size=300))
+    ]
+    batch = TripBatch.from_dicts(trips)
+    expected = ca.top_k_trips(trips, 10, "duration", "desc")
+    assert [t["id"] for t in ca.top_k_trips(batch, 10, "duration", "desc")] == [t["id"] for t in expected]
+    assert ca.pickup_hour_frequency(batch) == ca.hour_histogram(np.array([t["pickup_hour"] for t in trips]))
+
+
+def test_trip_batch_from_cursor():
+    import sqlite3
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE trips (id TEXT, trip_duration INTEGER, passenger_count INTEGER)")
+    conn.executemany("INSERT INTO trips VALUES (?, ?, ?)", [(str(i), i * 10, None if i == 3 else 1) for i in range(10)])
+    batch = TripBatch.from_cursor(conn.execute("SELECT * FROM trips"), batch_size=4)
+    assert len(batch) == 10
+    assert batch["trip_duration"].dtype == np.int32
+    # NULLs fall back to an object column instead of failing
+    assert batch["passenger_count"].dtype == object and batch[3]["passenger_count"] is None
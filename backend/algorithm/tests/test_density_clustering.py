@@ -0,0 +1,71 @@
+import numpy as np
+from algorithm import density_clustering as dc
+
+
+def _naive_dbscan(points, eps, min_samples, weights):
+    """Brute-force reference: core flags and labels from an O(n^2) neighbour matrix."""
+    neighbours = ((points[:, None] - points[None]) ** 2).sum(-1) <= eps * eps
+    core = neighbours @ weights >= min_samples
+    labels = np.full(len(points), -1)
+    cluster = 0
+    for start in np.flatnonzero(core):
+        if labels[start] >= 0:
+            continue
+        labels[start] = cluster
+        stack = [start]
+        while stack:
+            for other in np.flatnonzero(neighbours[stack.pop()] & core):
+                if labels[other] < 0:
+                    labels[other] = cluster
+                    stack.append(other)
+        cluster += 1
+    return core, labels, neighbours
+
+
+def test_grid_dbscan_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for trial in range(10):
+        blobs = [rng.normal(0, rng.uniform(20, 150), (rng.integers(50, 300), 2)) + rng.uniform(-800, 800, 2)
+                 for _ in range(3)]
+        points = np.concatenate(blobs + [rng.uniform(-1200, 1200, (150, 2))])
+        weights = rng.integers(1, 4, len(points)).astype(float) if trial % 2 else np.ones(len(points))
+        eps, min_samples = rng.uniform(30, 100), int(rng.integers(4, 15))
+
+        core, expected, neighbours = _naive_dbscan(points, eps, min_samples, weights)
+        labels = dc.grid_dbscan(points, eps, min_samples, weights=weights)
+
+        # core points: same partition up to renumbering
+        mapping = {}
+        for a, b in zip(expected[core], labels[core]):
+            assert mapping.setdefault(a, b) == b
+        assert len(set(mapping.values())) == len(mapping)
+        # border points join a cluster of a core neighbour, isolated points are noise
+        for index in np.flatnonzero(~core):
+            near = neighbours[index] & core
+            if near.any():
+                assert labels[index] in set(labels[near])
+            else:
+                assert labels[index] == dc.NOISE
+
+
+def test_density_hotspots_meters_and_prebinning():
+    rng = np.random.default_rng(1)
+    # two tight pickup spots ~2 km apart plus scattered noise
+    spots = [rng.normal([40.758, -73.985], 0.0003, (400, 2)), rng.normal([40.741, -73.99], 0.0003, (250, 2))]
+    coords = np.concatenate(spots + [rng.uniform([40.6, -74.1], [40.9, -73.8], (100, 2))])
+
+    hotspots = dc.density_hotspots(coords, eps_m=100, min_samples=20)
+    clusters = [h for h in hotspots if h["cluster"] >= 0]
+    assert len(clusters) == 2
+    assert clusters[0]["num_trips"] >= 400 and clusters[1]["num_trips"] >= 250
+    assert abs(clusters[0]["pickup_latitude"] - 40.758) < 0.001
+    assert sum(h["num_trips"] for h in hotspots) == len(coords)
+
+    binned = dc.density_hotspots(coords, eps_m=100, min_samples=20, prebin_m=10)
+    assert [h["num_trips"] for h in binned if h["cluster"] >= 0] == [h["num_trips"] for h in clusters]
+
+
+def test_project_to_meters_scale():
+    points = dc.project_to_meters(np.array([[40.75, -73.98], [40.76, -73.98], [40.75, -73.97]]), origin=(40.75, -73.98))
+    assert abs(points[1, 1] - 1111.95) < 1
+    assert abs(points[2, 0] - 842.6) < 2
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from algorithm.density_raster import build_heatmap_tiles, tile_raster, encode_tile, decode_tile, tile_bits
+
+BOUNDS = (40.5, -74.3, 40.9, -73.7)
+
+
+def _points(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = np.r_[rng.normal(40.75, 0.03, n), 41.2, 40.9]  # one point outside, one on the max edge
+    lon = np.r_[rng.normal(-73.98, 0.03, n), -73.9, -73.7]
+    return lat, lon
+
+
+def test_tiles_conserve_counts_per_level():
+    lat, lon = _points()
+    tiles = build_heatmap_tiles(lat, lon, BOUNDS, max_zoom=3, tile_size=32)
+    inside = np.sum((lat >= 40.5) & (lat <= 40.9) & (lon >= -74.3) & (lon <= -73.7))
+    for zoom in range(4):
+        level = [raster for (z, _, _), raster in tiles.items() if z == zoom]
+        assert sum(int(raster.sum()) for raster in level) == inside
+        assert all(raster.any() for raster in level)
+    assert set(k for k in tiles if k[0] == 0) == {(0, 0, 0)}
+
+
+def test_parent_tile_is_2x2_sum_of_children():
+    lat, lon = _points()
+    tiles = build_heatmap_tiles(lat, lon, BOUNDS, max_zoom=2, tile_size=16)
+    parent = tiles[(1, 1, 1)]
+    empty = np.zeros((16, 16), dtype=np.uint32)
+    # children: (2, 2|3, 2|3); northern children (y = 3) form the top half
+    top = np.hstack([tiles.get((2, 2, 3), empty), tiles.get((2, 3, 3), empty)])
+    bottom = np.hstack([tiles.get((2, 2, 2), empty), tiles.get((2, 3, 2), empty)])
+    fine = np.vstack([top, bottom])
+    assert np.array_equal(parent, fine.reshape(16, 2, 16, 2).sum(axis=(1, 3)))
+
+
+def test_single_tile_matches_pyramid_and_round_trips():
+    lat, lon = _points()
+    tiles = build_heatmap_tiles(lat, lon, BOUNDS, max_zoom=4, tile_size=64)
+    for key in list(tiles)[::5]:
+        assert np.array_equal(tile_raster(lat, lon, BOUNDS, *key, tile_size=64), tiles[key])
+    assert not tile_raster(lat, lon, BOUNDS, 4, 0, 0, tile_size=64).any()
+
+    raster = tiles[(0, 0, 0)]
+    data = encode_tile(raster)
+    assert data == encode_tile(raster) and len(data) < raster.nbytes
+    assert np.array_equal(decode_tile(data, 64), raster)
+
+
+def test_tile_size_must_be_power_of_two():
+    assert tile_bits(128) == 7
+    with pytest.raises(ValueError):
+        tile_bits(100)
@@ -0,0 +1,69 @@
+import io
+import numpy as np
+import pandas as pd
+from core.config import settings
+from data.generate_trips import HEADER, trip_chunk, format_csv_chunk, iter_csv_chunks, write_trips_csv
+
+
+def _read(blocks):
+    return pd.read_csv(io.BytesIO(b"".join(blocks)))
+
+
+def test_rows_match_python_formatting():
+    chunk = trip_chunk(seed=3, chunk_index=0, rows=500, first_id=1, dirty_fraction=0.3)
+    expected = []
+    for i in range(500):
+        def value(name, text):
+            missing = chunk["missing"].get(name)
+            return "" if missing is not None and missing[i] else text
+        stamp = lambda epoch: str(np.datetime64(int(epoch), "s")).replace("T", " ")
+        expected.append(",".join([
+            f"id{chunk['id'][i]:07d}", str(chunk["vendor_id"][i]),
+            value("pickup_epoch", stamp(chunk["pickup_epoch"][i])),
+            value("dropoff_epoch", stamp(chunk["dropoff_epoch"][i])),
+            str(chunk["passenger_count"][i]),
+            *(value(name, f"{chunk[name][i]:.6f}".replace("-0.000000", "0.000000"))
+              for name in ("pickup_longitude", "pickup_latitude", "dropoff_longitude", "dropoff_latitude")),
+            "Y" if chunk["store_and_fwd_flag"][i] else "N",
+            value("trip_duration", str(chunk["trip_duration"][i])),
+        ]) + "\n")
+    assert format_csv_chunk(chunk).decode() == "".join(expected)
+
+
+def test_clean_output_is_deterministic_and_in_schema():
+    blocks = list(iter_csv_chunks(3000, seed=7))
+    assert blocks[0] == HEADER
+    assert b"".join(blocks) == b"".join(iter_csv_chunks(3000, seed=7))
+    assert b"".join(blocks) != b"".join(iter_csv_chunks(3000, seed=8))
+
+    df = _read(blocks)
+    assert list(df.columns) == HEADER.decode().strip().split(",")
+    assert len(df) == 3000 and df["id"].is_unique and not df.isnull().values.any()
+    assert df["pickup_latitude"].between(settings.NYC_MIN_LAT, settings.NYC_MAX_LAT).all()
+    assert df["dropoff_longitude"].between(settings.NYC_MIN_LON, settings.NYC_MAX_LON).all()
+    elapsed = pd.to_datetime(df["dropoff_datetime"]) - pd.to_datetime(df["pickup_datetime"])
+    assert (elapsed.dt.total_seconds() == df["trip_duration"]).all()
+
+    # evening rush is busier than the early morning
+    hours = pd.to_datetime(df["pickup_datetime"]).dt.hour
+    assert (hours == 19).sum() > 3 * (hours == 4).sum()
+
+
+def test_dirty_rows_carry_each_defect():
+    df = _read(iter_csv_chunks(4000, seed=1, dirty_fraction=0.2))
+    assert len(df) == 4000
+    assert df.isnull().any(axis=1).sum() > 100
+    assert df.duplicated().sum() > 100
+    outside = ~df["pickup_latitude"].between(settings.NYC_MIN_LAT, settings.NYC_MAX_LAT) | \
+              ~df["dropoff_longitude"].between(settings.NYC_MIN_LON, settings.NYC_MAX_LON)
+    assert outside.sum() > 100
+    assert (~df["trip_duration"].between(30, 10800)).sum() > 100
+
+
+def test_parallel_output_is_identical(tmp_path):
+    # more than one chunk, so the pool really splits the work
+    rows = 140000
+    serial = write_trips_csv(str(tmp_path / "serial.csv"), rows, seed=5, jobs=1)
+    parallel = write_trips_csv(str(tmp_path / "parallel.csv"), rows, seed=5, jobs=2)
+    assert serial == parallel
+    assert (tmp_path / "serial.csv").read_bytes() == (tmp_path / "parallel.csv").read_bytes()
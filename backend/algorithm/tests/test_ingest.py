@@ -0,0 +1,157 @@
+import io
+import math
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from core.config import settings
+from core.approx import STRATUM_COLUMNS, sample_table_name
+from core.database import format_data_version
+from core.ingest import HEATMAP_WATERMARK, TripWriter, catch_up_heatmap_tiles, commit_trips, connect
+from algorithm.density_raster import decode_tile
+from algorithm.quantile_sketch import TDigest
+from data.cleaning import validate_trips
+from data.generate_trips import iter_csv_chunks
+from db.db_setup import DatabaseSetup
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def small_derived_tables(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "HEATMAP_MAX_ZOOM", 2)
+    monkeypatch.setattr(settings, "HEATMAP_TILE_SIZE", 16)
+    monkeypatch.setattr(settings, "PYRAMID_MAX_ZOOM", 5)
+    monkeypatch.setattr(settings, "COLUMN_STORE_DIR", str(tmp_path / "columns"))
+
+
+def _raw_trips(rows, seed):
+    raw = pd.read_csv(io.BytesIO(b"".join(iter_csv_chunks(rows, seed=seed))))
+    # generated ids restart at 1 for every seed
+    raw["id"] = raw["id"] + f"-{seed}"
+    return raw
+
+
+def _build(tmp_path, name, raw):
+    """Database built from scratch by db_setup over the valid raw trips"""
+    clean, _ = validate_trips(raw)
+    csv_path = str(tmp_path / f"{name}.csv")
+    clean.to_csv(csv_path, index=False)
+    setup = DatabaseSetup()
+    setup.db_path = str(tmp_path / f"{name}.db")
+    setup.schema_path = os.path.join(BACKEND_DIR, "db", "schema.sql")
+    setup.cleaned_data_path = csv_path
+    for step in (setup.create_database, setup.load_cleaned_data, setup.build_pickup_pyramid,
+                 setup.build_minute_series, setup.build_quantile_sketches, setup.build_heatmap_tiles,
+                 setup.build_sample_tables):
+        assert step()
+    return setup.db_path
+
+
+def _rows(conn, query):
+    return conn.execute(query).fetchall()
+
+
+def test_incremental_aggregates_match_rebuild(tmp_path):
+    base, delta = _raw_trips(3000, seed=1), _raw_trips(1500, seed=2)
+    ingested = connect(_build(tmp_path, "ingested", base))
+    rebuilt = sqlite3.connect(_build(tmp_path, "rebuilt", pd.concat([base, delta], ignore_index=True)))
+
+    first, _ = validate_trips(delta.iloc[:1000])
+    second, _ = validate_trips(delta.iloc[1000:])
+    results = commit_trips(ingested, [first, second], rng=np.random.default_rng(0))
+    assert [result["accepted"] for result in results] == [len(first), len(second)]
+    assert catch_up_heatmap_tiles(ingested) == len(first) + len(second)
+    assert catch_up_heatmap_tiles(ingested) == 0
+
+    total = rebuilt.execute("SELECT COUNT(*) FROM trips").fetchone()[0]
+    assert ingested.execute("SELECT COUNT(*) FROM trips").fetchone()[0] == total
+    assert results[-1]["total_trips"] == total
+
+    query = "SELECT * FROM pickup_minute_series ORDER BY minute_of_week"
+    assert _rows(ingested, query) == _rows(rebuilt, query)
+
+    query = "SELECT zoom, cell_x, cell_y, point_count, center_lat, center_lon FROM pickup_pyramid ORDER BY 1, 2, 3"
+    expected = np.array(_rows(rebuilt, query))
+    actual = np.array(_rows(ingested, query))
+    assert np.array_equal(actual[:, :4], expected[:, :4])
+    assert np.allclose(actual[:, 4:], expected[:, 4:])
+    query = """
+        SELECT p.point_count, COUNT(s.zoom) FROM pickup_pyramid p LEFT JOIN pickup_pyramid_samples s
+        ON s.zoom = p.zoom AND s.cell_x = p.cell_x AND s.cell_y = p.cell_y GROUP BY p.zoom, p.cell_x, p.cell_y
+    """
+    for count, samples in _rows(ingested, query):
+        assert samples == min(count, settings.PYRAMID_SAMPLES_PER_CELL)
+
+    query = "SELECT pickup_hour, day_of_week, metric, trip_count, sketch FROM trip_quantile_sketches ORDER BY 1, 2, 3"
+    expected, actual = _rows(rebuilt, query), _rows(ingested, query)
+    assert [row[:4] for row in actual] == [row[:4] for row in expected]
+    for mine, theirs in zip(actual, expected):
+        assert TDigest.from_bytes(mine[4]).count == TDigest.from_bytes(theirs[4]).count
+
+    query = """
+        SELECT layer, hour, zoom, tile_x, tile_y, point_count, max_count, raster FROM heatmap_tiles ORDER BY 1, 2, 3, 4, 5
+    """
+    expected, actual = _rows(rebuilt, query), _rows(ingested, query)
+    assert [row[:7] for row in actual] == [row[:7] for row in expected]
+    for mine, theirs in zip(actual, expected):
+        assert np.array_equal(decode_tile(mine[7], 16), decode_tile(theirs[7], 16))
+
+    strata = ", ".join(STRATUM_COLUMNS)
+    true_sizes = dict(((hour, day, passengers), size) for hour, day, passengers, size in _rows(
+        rebuilt, f"SELECT {strata}, COUNT(*) FROM trips GROUP BY {strata}"
+    ))
+    for rate in settings.APPROX_SAMPLE_RATES:
+        table = sample_table_name(rate)
+        for hour, day, passengers, size, samples, rows in _rows(ingested, f"""
+            SELECT {strata}, MIN(stratum_size), MIN(stratum_samples), COUNT(*) FROM {table} GROUP BY {strata}
+        """):
+            assert size == true_sizes[(hour, day, passengers)]
+            assert samples == rows
+            assert rows == min(size, max(math.ceil(size * rate), settings.APPROX_MIN_PER_STRATUM))
+        # every sampled row is a stored trip
+        orphans = f"SELECT COUNT(*) FROM {table} s LEFT JOIN trips t ON t.id = s.id WHERE t.id IS NULL"
+        assert ingested.execute(orphans).fetchone()[0] == 0
+
+
+def test_duplicate_ids_are_rejected(tmp_path):
+    conn = connect(_build(tmp_path, "trips", _raw_trips(500, seed=1)))
+    stored, _ = validate_trips(_raw_trips(500, seed=1).iloc[:3])
+    fresh, _ = validate_trips(_raw_trips(20, seed=3))
+    version = format_data_version(dict(conn.execute("SELECT key, value FROM system_metadata").fetchall()))
+
+    results = commit_trips(conn, [stored, fresh, fresh.iloc[:5]])
+    assert results[0]["accepted"] == 0
+    assert results[0]["rejected"] == {0: "duplicate id", 1: "duplicate id", 2: "duplicate id"}
+    assert results[1]["accepted"] == len(fresh) and results[1]["rejected"] == {}
+    assert results[1]["data_version"] != version
+    # taken by the earlier batch of the same commit
+    assert results[2]["rejected"] == {i: "duplicate id" for i in range(5)}
+    assert conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0] == results[2]["total_trips"]
+
+    # nothing new, the data version stays
+    assert commit_trips(conn, [fresh])[0]["data_version"] == results[2]["data_version"]
+
+
+def test_writer_commits_queued_batches_and_catches_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_REFRESH_SECONDS", 0)
+    db_path = _build(tmp_path, "trips", _raw_trips(500, seed=1))
+    writer = TripWriter(db_path)
+    writer.check_database()
+
+    batches = [validate_trips(_raw_trips(300, seed=seed))[0] for seed in (4, 5, 6)]
+    futures = [writer.submit(batch) for batch in batches]
+    results = [future.result(timeout=30) for future in futures]
+    assert [result["accepted"] for result in results] == [len(batch) for batch in batches]
+    assert writer.trips_written == sum(len(batch) for batch in batches)
+    assert 1 <= writer.commits <= len(batches)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    last_rowid = conn.execute("SELECT MAX(rowid) FROM trips").fetchone()[0]
+    deadline = time.time() + 30
+    while int(conn.execute("SELECT value FROM system_metadata WHERE key = ?", (HEATMAP_WATERMARK,)).fetchone()[0]) < last_rowid:
+        assert time.time() < deadline
+        time.sleep(0.05)
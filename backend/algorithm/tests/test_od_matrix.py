@@ -0,0 +1,79 @@
+import collections
+import numpy as np
+from algorithm import od_matrix as od
+from algorithm.spatial_pyramid import cell_index
+
+BOUNDS = (40.5, -74.3, 40.9, -73.7)
+ZOOM = 4
+
+
+def _trips(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    trips = {
+        "pickup_lat": rng.normal(40.75, 0.04, n), "pickup_lon": rng.normal(-73.98, 0.04, n),
+        "dropoff_lat": rng.normal(40.74, 0.05, n), "dropoff_lon": rng.normal(-73.97, 0.05, n),
+        "hours": rng.integers(0, 24, n), "durations": rng.uniform(60, 3600, n), "distances": rng.uniform(0.5, 20, n),
+    }
+    # one trip leaving the bounds is ignored
+    trips["dropoff_lat"][0] = 41.5
+    return trips
+
+
+def _brute_force(trips, hours, origin=None, destination=None):
+    """{partner cell: [count, duration, distance]} by looping over the trips"""
+    side = 1 << ZOOM
+    ox, oy = cell_index(trips["pickup_lat"], trips["pickup_lon"], ZOOM, BOUNDS)
+    dx, dy = cell_index(trips["dropoff_lat"], trips["dropoff_lon"], ZOOM, BOUNDS)
+    totals = collections.defaultdict(lambda: [0, 0.0, 0.0])
+    for i in range(1, len(ox)):
+        o, d = int(ox[i] * side + oy[i]), int(dx[i] * side + dy[i])
+        if trips["hours"][i] not in hours:
+            continue
+        if (origin is not None and o != origin) or (destination is not None and d != destination):
+            continue
+        total = totals[d if origin is not None else o]
+        total[0] += 1
+        total[1] += trips["durations"][i]
+        total[2] += trips["distances"][i]
+    return totals
+
+
+def _as_dict(row):
+    cells, counts, durations, distances = row
+    assert (np.diff(cells) > 0).all()
+    return {int(c): [int(n), d, s] for c, n, d, s in zip(cells, counts, durations, distances)}
+
+
+def test_rows_match_brute_force():
+    trips = _trips()
+    matrix = od.build_od_matrix(*trips.values(), BOUNDS, ZOOM)
+    assert matrix.counts.sum() == len(trips["hours"]) - 1
+    # the busiest pickup cell
+    x, y = cell_index(trips["pickup_lat"], trips["pickup_lon"], ZOOM, BOUNDS)
+    cell = int(np.bincount(x * matrix.side + y).argmax())
+
+    for hours in ([8], [22, 23, 0, 1], list(range(24))):
+        for reverse in (False, True):
+            expected = _brute_force(trips, hours, **({"destination": cell} if reverse else {"origin": cell}))
+            actual = _as_dict(matrix.row(cell, None if len(hours) == 24 else hours, reverse))
+            assert actual.keys() == expected.keys()
+            for partner, (count, duration, distance) in expected.items():
+                assert actual[partner][0] == count
+                assert np.isclose(actual[partner][1], duration) and np.isclose(actual[partner][2], distance)
+
+
+def test_top_k_orders_by_count_then_position():
+    counts = np.array([3, 7, 1, 7, 3, 0, 3])
+    assert od.top_k(counts, 3).tolist() == [1, 3, 0]
+    assert od.top_k(counts, 4).tolist() == [1, 3, 0, 4]
+    assert od.top_k(counts, 10).tolist() == [1, 3, 0, 4, 6, 2, 5]
+    assert od.top_k(counts, 0).tolist() == []
+    assert od.top_k(np.array([], dtype=np.int64), 5).tolist() == []
+
+
+def test_empty_matrix():
+    empty = np.empty(0)
+    matrix = od.build_od_matrix(empty, empty, empty, empty, np.empty(0, dtype=np.int64), empty, empty, BOUNDS, 2)
+    assert matrix.nnz == 0
+    cells, counts, _, _ = matrix.row(5)
+    assert len(cells) == 0 and len(counts) == 0
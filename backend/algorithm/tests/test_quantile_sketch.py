@@ -0,0 +1,39 @@
+import numpy as np
+from algorithm.quantile_sketch import TDigest, build_group_sketches
+
+
+def test_tdigest_quantiles_close_to_exact():
+    values = np.random.default_rng(0).lognormal(6.5, 0.8, 100000)
+    digest = TDigest().add(values)
+    assert digest.count == len(values)
+    assert len(digest.means) < 200
+    for q in (0.01, 0.5, 0.9, 0.99):
+        exact = np.quantile(values, q)
+        assert abs(digest.quantile(q) - exact) / exact < 0.02
+    assert digest.quantile(0) == values.min() and digest.quantile(1) == values.max()
+    assert TDigest().quantile(0.5) is None
+
+
+def test_tdigest_merge_and_round_trip():
+    rng = np.random.default_rng(1)
+    parts = [rng.normal(loc, 10, 5000) for loc in (100, 200, 300)]
+    merged = TDigest.merge_all(TDigest().add(part) for part in parts)
+    combined = np.concatenate(parts)
+    assert merged.count == len(combined)
+    assert abs(merged.quantile(0.5) - np.median(combined)) < 3
+
+    restored = TDigest.from_bytes(merged.to_bytes())
+    assert restored.quantiles([0.1, 0.5, 0.9]) == merged.quantiles([0.1, 0.5, 0.9])
+
+
+def test_group_sketches_merge_across_filters():
+    rng = np.random.default_rng(2)
+    hours, days = rng.integers(0, 24, 20000), rng.integers(0, 7, 20000)
+    durations = hours * 60 + rng.normal(0, 5, 20000)
+    sketches = build_group_sketches(hours, days, {"trip_duration": durations})
+    assert len(sketches) == 24 * 7
+
+    selected = (hours >= 7) & (hours <= 9) & (days == 2)
+    merged = TDigest.merge_all(sketches[(h, 2, "trip_duration")] for h in (7, 8, 9))
+    assert merged.count == selected.sum()
+    assert abs(merged.quantile(0.5) - np.median(durations[selected])) < 5
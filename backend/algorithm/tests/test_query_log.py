@@ -0,0 +1,21 @@
+import json
+from core.query_log import SlowQueryLog
+
+
+def test_entries_are_written(tmp_path):
+    log = SlowQueryLog(str(tmp_path / "logs" / "slow.log"))
+    for i in range(50):
+        log.submit({"statement": "SELECT ?", "i": i})
+    assert log.flush(timeout=10)
+    with open(tmp_path / "logs" / "slow.log") as f:
+        assert [json.loads(line)["i"] for line in f] == list(range(50))
+
+
+def test_unwritable_path_does_not_block(tmp_path):
+    # a file where the log directory should be
+    (tmp_path / "logs").write_text("")
+    log = SlowQueryLog(str(tmp_path / "logs" / "slow.log"))
+    log.submit({"statement": "SELECT 1"})
+    log.submit({"statement": "SELECT 2"})
+    assert log.flush(timeout=10)
+    assert log.dropped == 2
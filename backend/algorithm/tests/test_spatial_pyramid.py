@@ -0,0 +1,59 @@
+import numpy as np
+from algorithm import spatial_pyramid as sp
+
+BOUNDS = (40.5, -74.3, 40.9, -73.7)
+
+
+def _points(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(40.75, 0.03, n), rng.normal(-73.98, 0.03, n)
+
+
+def test_pyramid_levels_are_consistent():
+    lat, lon = _points()
+    pyramid = sp.build_pickup_pyramid(lat, lon, BOUNDS, max_zoom=6, samples_per_cell=5)
+    assert sorted(pyramid) == list(range(7))
+    for zoom, level in pyramid.items():
+        assert level["point_count"].sum() == len(lat)
+        # counts match a direct per-level aggregation
+        x, y = sp.cell_index(lat, lon, zoom, BOUNDS)
+        direct = {}
+        for key in zip(x.tolist(), y.tolist()):
+            direct[key] = direct.get(key, 0) + 1
+        assert dict(zip(zip(level["cell_x"].tolist(), level["cell_y"].tolist()), level["point_count"].tolist())) == direct
+        # at most samples_per_cell samples per cell, each inside its cell
+        assert np.bincount(level["sample_cell"]).max() <= 5
+        sx, sy = sp.cell_index(level["sample_lat"], level["sample_lon"], zoom, BOUNDS)
+        assert (sx == level["cell_x"][level["sample_cell"]]).all() and (sy == level["cell_y"][level["sample_cell"]]).all()
+    assert np.isclose(pyramid[0]["center_lat"][0], np.mean(lat))
+
+
+def test_hierarchical_samples_match_single_level_build():
+    lat, lon = _points(seed=1)
+    full = sp.build_pickup_pyramid(lat, lon, BOUNDS, max_zoom=7)
+    single = sp.build_pickup_pyramid(lat, lon, BOUNDS, max_zoom=3, min_zoom=3)
+    assert list(single) == [3]
+    assert sorted(full[3]["sample_lat"]) == sorted(single[3]["sample_lat"])
+
+
+def test_densest_cells_and_ranges():
+    lat, lon = _points(seed=2)
+    level = sp.build_pickup_pyramid(lat, lon, BOUNDS, max_zoom=5, min_zoom=5)[5]
+    top = sp.densest_cells(level, 3)
+    counts = level["point_count"][top]
+    assert list(counts) == sorted(level["point_count"], reverse=True)[:3]
+
+    x0, y0, x1, y1 = sp.cell_range((40.74, -74.0, 40.76, -73.96), 5, BOUNDS)
+    inside = sp.densest_cells(level, 100, (x0, y0, x1, y1))
+    assert ((level["cell_x"][inside] >= x0) & (level["cell_x"][inside] <= x1)).all()
+    lat0, lon0, lat1, lon1 = sp.cell_bounds(5, x0, y0, BOUNDS)
+    assert lat0 <= 40.74 < lat1 and lon0 <= -74.0 < lon1
+
+
+def test_cell_range_outside_bounds():
+    # partly outside: only the overlapping cells
+    assert sp.cell_range((40.8, -74.0, 42.0, -73.96), 5, BOUNDS) == sp.cell_range((40.8, -74.0, 40.9, -73.96), 5, BOUNDS)
+    assert sp.cell_range((30.0, -80.0, 50.0, -70.0), 2, BOUNDS) == (0, 0, 3, 3)
+    # entirely outside: nothing, not the edge cells
+    assert sp.cell_range((41.5, -74.0, 42.0, -73.9), 6, BOUNDS) is None
+    assert sp.cell_range((40.6, -75.0, 40.7, -74.5), 6, BOUNDS) is None
@@ -0,0 +1,40 @@
+import sqlite3
+import pytest
+from fastapi import HTTPException
+from core.time_range import TimeRange, to_epoch
+
+
+def test_epoch_matches_sqlite():
+    conn = sqlite3.connect(":memory:")
+    for value in ("2016-03-14 17:24:55", "2016-01-01 00:00:00", "2016-06-30 23:59:59"):
+        expected = conn.execute("SELECT CAST(strftime('%s', ?) AS INTEGER)", (value,)).fetchone()[0]
+        assert to_epoch(value) == expected
+    # a bare end date covers the whole day
+    assert to_epoch("2016-03-14", end=True) - to_epoch("2016-03-14") == 86400
+    assert to_epoch("2016-03-14T10:00", end=True) == to_epoch("2016-03-14 10:00:00")
+
+
+def test_range_conditions():
+    period = TimeRange("2016-03-01", "2016-03-07")
+    assert period.active
+    assert period.conditions() == ["pickup_epoch >= :start_epoch", "pickup_epoch < :end_epoch"]
+    assert period.params == {"start_epoch": to_epoch("2016-03-01"), "end_epoch": to_epoch("2016-03-08")}
+    assert period.filters == {"start": "2016-03-01", "end": "2016-03-07"}
+
+    open_end = TimeRange(start="2016-03-01")
+    assert open_end.conditions("t.pickup_epoch") == ["t.pickup_epoch >= :start_epoch"]
+    assert open_end.key == (to_epoch("2016-03-01"), None)
+    assert not TimeRange().active
+    assert TimeRange().conditions() == [] and TimeRange().params == {}
+
+
+def test_invalid_ranges():
+    with pytest.raises(HTTPException) as error:
+        TimeRange("2016-02-30")
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException):
+        TimeRange("2016-03-07", "2016-03-01")
+    with pytest.raises(HTTPException):
+        TimeRange("2016-03-01T12:00", "2016-03-01T12:00")
+    # a single bare day is a valid range
+    assert TimeRange("2016-03-01", "2016-03-01").active
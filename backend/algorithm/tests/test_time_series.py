@@ -0,0 +1,40 @@
+import datetime
+import numpy as np
+from algorithm import time_series as ts
+
+
+def test_minute_series_matches_calendar():
+    times = [datetime.datetime(2016, 3, 14, 17, 24, 55), datetime.datetime(2016, 6, 12, 0, 43, 35),
+             datetime.datetime(2016, 6, 12, 0, 43, 1)]
+    epochs = np.array([int(t.replace(tzinfo=datetime.timezone.utc).timestamp()) for t in times])
+    counts, totals = ts.build_minute_series(epochs, np.array([100, 20, 30]))
+    assert counts.shape == (7, 1440) and counts.sum() == 3
+    # 2016-03-14 was a Monday, 2016-06-12 a Sunday
+    assert counts[0, 17 * 60 + 24] == 1
+    assert counts[6, 43] == 2 and totals[6, 43] == 50
+
+    minutes = np.flatnonzero(counts)
+    rows = zip(minutes, counts.ravel()[minutes], totals.ravel()[minutes])
+    rebuilt = ts.series_from_rows(rows)
+    assert (rebuilt[0] == counts).all() and (rebuilt[1] == totals).all()
+
+
+def test_daily_profile_buckets():
+    counts = np.zeros((7, 1440), dtype=np.int64)
+    counts[2, 61] = 3
+    counts[5, 119] = 4
+    assert list(ts.daily_profile(counts, 60)[:3]) == [0, 7, 0]
+    assert ts.daily_profile(counts, 60, day_of_week=2)[1] == 3
+    assert len(ts.daily_profile(counts, 15)) == 96
+
+
+def test_circular_peaks_wrap_around_midnight():
+    values = np.array([9, 2, 1, 1, 5, 1, 1, 1, 3, 8])
+    peaks = ts.circular_peaks(values)
+    # bucket 0 is compared with the last bucket, not skipped
+    assert [p["index"] for p in peaks] == [0, 4]
+    assert peaks[0]["prominence"] == 8
+    assert [p["index"] for p in ts.circular_peaks(values, window=3)] == [0, 4]
+    assert [p["index"] for p in ts.circular_peaks(values, min_prominence=4)] == [0, 4]
+    # a flat top reports its first bucket once
+    assert [p["index"] for p in ts.circular_peaks(np.array([1, 4, 4, 1, 0]))] == [1]
@@ -0,0 +1,98 @@
+"""
+Minute-of-week pickup series and circular peak detection.
+The series is built once from integer epoch seconds; every query afterwards
+works on at most 7 x 1440 buckets instead of the trips.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+MINUTES_PER_DAY = 1440
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# 1970-01-01 was a Thursday; shifting by 3 days makes Monday minute 0 (day_of_week 0 = Monday)
+_EPOCH_WEEKDAY_SHIFT = 3 * MINUTES_PER_DAY
+
+
+def minute_of_week(epoch_seconds: np.ndarray) -> np.ndarray:
+    """Minute of the week (0 = Monday 00:00) of every epoch timestamp."""
+    minutes = np.asarray(epoch_seconds, dtype=np.int64) // 60
+    return (minutes + _EPOCH_WEEKDAY_SHIFT) % MINUTES_PER_WEEK
+
+
+def build_minute_series(epoch_seconds: np.ndarray, durations: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Trip counts and summed durations per minute of the week.
+    Returns two (7, 1440) arrays indexed [day_of_week, minute_of_day].
+
+    Time Complexity: O(n)
+    Space Complexity: O(7 * 1440)
+    """
+    buckets = minute_of_week(epoch_seconds)
+    counts = np.bincount(buckets, minlength=MINUTES_PER_WEEK)
+    totals = np.bincount(buckets, weights=np.asarray(durations, dtype=np.float64), minlength=MINUTES_PER_WEEK)
+    return counts.reshape(7, MINUTES_PER_DAY), totals.reshape(7, MINUTES_PER_DAY)
+
+
+def series_from_rows(rows: Iterable[Tuple[int, int, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Rebuild the (7, 1440) arrays from stored (minute_of_week, trip_count, total_duration) rows."""
+    counts = np.zeros(MINUTES_PER_WEEK, dtype=np.int64)
+    totals = np.zeros(MINUTES_PER_WEEK, dtype=np.float64)
+    for minute, count, total in rows:
+        counts[minute] = count
+        totals[minute] = total
+    return counts.reshape(7, MINUTES_PER_DAY), totals.reshape(7, MINUTES_PER_DAY)
+
+
+def daily_profile(series: np.ndarray, bucket_minutes: int = 60, day_of_week: Optional[int] = None) -> np.ndarray:
+    """
+    One day's worth of buckets: a single weekday or all days summed, with
+    minutes grouped into bucket_minutes buckets (must divide 1440).
+    """
+    if MINUTES_PER_DAY % bucket_minutes:
+        raise ValueError("bucket_minutes must divide 1440")
+    day = series[day_of_week] if day_of_week is not None else series.sum(axis=0)
+    return day.reshape(-1, bucket_minutes).sum(axis=1)
+
+
+def circular_peaks(values: np.ndarray, window: int = 1, min_prominence: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    Peaks of a circular series (the last bucket neighbours the first).
+
+    A bucket is a peak when it is the highest within `window` buckets on both
+    sides (the first bucket of a flat top wins) and its prominence, the height
+    above the higher of the two lowest points separating it from any higher
+    bucket, is at least min_prominence (and above 0).
+
+    Returns [{"index", "value", "prominence"}] in index order.
+
+    Time Complexity: O(buckets * window) for the candidates, O(buckets) per candidate for prominence
+    Space Complexity: O(buckets * window)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return []
+    window = max(1, min(window, (n - 1) // 2 or 1))
+    offsets = np.arange(1, window + 1)
+    index = np.arange(n)
+    left = values[(index[:, None] - offsets[None, :]) % n]
+    right = values[(index[:, None] + offsets[None, :]) % n]
+    candidates = np.flatnonzero((values > left.max(axis=1)) & (values >= right.max(axis=1)))
+
+    peaks = []
+    for i in candidates:
+        # walk both ways around the circle until a higher bucket appears
+        forward = np.roll(values, -i)[1:]
+        backward = np.roll(values[::-1], i)[:-1]
+        higher_right = np.flatnonzero(forward > values[i])
+        higher_left = np.flatnonzero(backward > values[i])
+        if len(higher_right) == 0:
+            # highest bucket of the series: prominence is measured to the global minimum
+            prominence = values[i] - values.min()
+        else:
+            right_base = forward[:higher_right[0]].min() if higher_right[0] else values[i]
+            left_base = backward[:higher_left[0]].min() if higher_left[0] else values[i]
+            prominence = values[i] - max(left_base, right_base)
+        if prominence > 0 and prominence >= min_prominence:
+            peaks.append({"index": int(i), "value": float(values[i]), "prominence": float(prominence)})
+    return peaks
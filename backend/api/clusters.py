@@ -1,53 +1,229 @@
+from typing import Optional
 from fastapi import APIRouter, Query, HTTPException, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-import pandas as pd
-from core.database import get_db
+import numpy as np
+from core.config import settings
+from core.database import get_db, execute_query, fetch_array, table_exists, get_data_version
+from core.singleflight import coalescer
+from core.column_store import get_column_store
+from core.time_range import TimeRange, pickup_time_range
+from algorithm.spatial_pyramid import build_pickup_pyramid, cell_range, densest_cells
 
 router = APIRouter(prefix="/clusters", tags=["clusters"])
 
+def parse_bbox(bbox: Optional[str]):
+    """
+    Parse a "min_lon,min_lat,max_lon,max_lat" string into (min_lat, min_lon, max_lat, max_lon)
+    """
+    if bbox is None:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="bbox minimums must not exceed maximums")
+    return (min_lat, min_lon, max_lat, max_lon)
+
+def compute_pickup_clusters(n_clusters: int, period: Optional[TimeRange] = None):
+    """
+    Group pickup coordinates into clusters
+    """
+    # pandas is only needed here, importing it lazily keeps app startup fast
+    import pandas as pd
+    
+    # get pickup coordinates
+    period = period or TimeRange()
+    where = " AND ".join(["pickup_latitude IS NOT NULL"] + period.conditions())
+    results = execute_query(f"SELECT pickup_latitude, pickup_longitude FROM trips WHERE {where}", period.params)
+    
+    if len(results) == 0:
+        return {"clusters": [], "message": "No data available"}
+    
+    # convert to DataFrame
+    df = pd.DataFrame(results, columns=['pickup_latitude', 'pickup_longitude'])
+    
+    # simple clustering by rounding coordinates (temporary implementation)
+    df['cluster_lat'] = df['pickup_latitude'].round(2)
+    df['cluster_lon'] = df['pickup_longitude'].round(2)
+    
+    # busiest cells first, not the first cells in coordinate order
+    groups = df.groupby(['cluster_lat', 'cluster_lon'])
+    sizes = groups.size().sort_values(ascending=False, kind='stable').head(n_clusters)
+    
+    clusters = []
+    for (lat, lon), count in sizes.items():
+        group = groups.get_group((lat, lon))
+        clusters.append({
+            "cluster_id": len(clusters),
+            "center_lat": float(lat),
+            "center_lon": float(lon),
+            "point_count": int(count),
+            "points": group[['pickup_latitude', 'pickup_longitude']].head(10).to_dict('records')
+        })
+    
+    return {
+        "clusters": clusters,
+        "total_clusters": len(clusters),
+        "total_points": len(df)
+    }
+
+def _pyramid_response(cells, samples, zoom, total_points, source):
+    """Format pyramid cells (busiest first) and their sample points"""
+    clusters = []
+    for cell in cells:
+        clusters.append({
+            "cluster_id": len(clusters),
+            "center_lat": cell["center_lat"],
+            "center_lon": cell["center_lon"],
+            "point_count": cell["point_count"],
+            "cell": {"zoom": zoom, "x": cell["cell_x"], "y": cell["cell_y"]},
+            "points": samples.get((cell["cell_x"], cell["cell_y"]), [])
+        })
+    
+    return {
+        "clusters": clusters,
+        "total_clusters": len(clusters),
+        "total_points": total_points,
+        "zoom": zoom,
+        "source": source
+    }
+
+def compute_pyramid_clusters(n_clusters: int, zoom: int, bbox=None):
+    """
+    Densest pickup cells at a zoom level, read from the precomputed pyramid
+    
+    Falls back to aggregating the trips on the fly when the pyramid tables
+    have not been built.
+    """
+    if not table_exists("pickup_pyramid"):
+        return compute_live_pyramid_clusters(n_clusters, zoom, bbox)
+    
+    where = "zoom = :zoom"
+    params = {"zoom": zoom, "limit": n_clusters}
+    if bbox is not None:
+        cells_range = cell_range(bbox, zoom, settings.NYC_BOUNDS)
+        if cells_range is None:
+            return _pyramid_response([], {}, zoom, 0, "pyramid")
+        x0, y0, x1, y1 = cells_range
+        where += " AND cell_x BETWEEN :x0 AND :x1 AND cell_y BETWEEN :y0 AND :y1"
+        params.update({"x0": x0, "x1": x1, "y0": y0, "y1": y1})
+    
+    cells = execute_query(f"""
+        SELECT cell_x, cell_y, point_count, center_lat, center_lon
+        FROM pickup_pyramid
+        WHERE {where}
+        ORDER BY point_count DESC, cell_x, cell_y
+        LIMIT :limit
+    """, params)
+    total = execute_query(f"SELECT COALESCE(SUM(point_count), 0) AS total FROM pickup_pyramid WHERE {where}", params)
+    
+    samples = {}
+    if cells:
+        # one lookup for the sample points of every selected cell
+        placeholders = ", ".join(f"(:x{i}, :y{i})" for i in range(len(cells)))
+        sample_params = {"zoom": zoom}
+        for i, cell in enumerate(cells):
+            sample_params[f"x{i}"] = cell["cell_x"]
+            sample_params[f"y{i}"] = cell["cell_y"]
+        rows = execute_query(f"""
+            SELECT cell_x, cell_y, pickup_latitude, pickup_longitude
+            FROM pickup_pyramid_samples
+            WHERE zoom = :zoom AND (cell_x, cell_y) IN (VALUES {placeholders})
+        """, sample_params)
+        for row in rows:
+            samples.setdefault((row["cell_x"], row["cell_y"]), []).append({
+                "pickup_latitude": row["pickup_latitude"],
+                "pickup_longitude": row["pickup_longitude"]
+            })
+    
+    return _pyramid_response(cells, samples, zoom, total[0]["total"], "pyramid")
+
+def compute_live_pyramid_clusters(n_clusters: int, zoom: int, bbox=None, period: Optional[TimeRange] = None):
+    """
+    Same result as compute_pyramid_clusters, aggregated from the trips table
+    
+    With a date range only the trips picked up in it are aggregated.
+    """
+    period = period or TimeRange()
+    # same row order as db_setup so the reservoir samples match the stored pyramid
+    store = get_column_store(get_data_version()) if not period.active else None
+    if store is not None:
+        lat, lon = store["pickup_latitude"], store["pickup_longitude"]
+    else:
+        # a date range is read through the pickup_epoch index rather than a full column scan
+        where = " AND ".join(["pickup_latitude IS NOT NULL", "pickup_longitude IS NOT NULL"] + period.conditions())
+        coords = fetch_array(f"""
+            SELECT pickup_latitude, pickup_longitude FROM trips
+            WHERE {where}
+            ORDER BY rowid
+        """, period.params)
+        lat, lon = coords[:, 0], coords[:, 1]
+    if len(lat) == 0:
+        return _pyramid_response([], {}, zoom, 0, "live")
+    
+    level = build_pickup_pyramid(
+        lat, lon, settings.NYC_BOUNDS, zoom, min_zoom=zoom,
+        samples_per_cell=settings.PYRAMID_SAMPLES_PER_CELL
+    )[zoom]
+    cells_range = None
+    if bbox is not None:
+        cells_range = cell_range(bbox, zoom, settings.NYC_BOUNDS)
+        if cells_range is None:
+            return _pyramid_response([], {}, zoom, 0, "live")
+    selected = densest_cells(level, n_clusters, cells_range)
+    in_range = densest_cells(level, len(level["point_count"]), cells_range)
+    
+    cells = [{
+        "cell_x": int(level["cell_x"][i]),
+        "cell_y": int(level["cell_y"][i]),
+        "point_count": int(level["point_count"][i]),
+        "center_lat": float(level["center_lat"][i]),
+        "center_lon": float(level["center_lon"][i])
+    } for i in selected]
+    
+    samples = {}
+    wanted = {int(i) for i in selected}
+    for cell, lat, lon in zip(level["sample_cell"], level["sample_lat"], level["sample_lon"]):
+        if int(cell) in wanted:
+            key = (int(level["cell_x"][cell]), int(level["cell_y"][cell]))
+            samples.setdefault(key, []).append({"pickup_latitude": float(lat), "pickup_longitude": float(lon)})
+    
+    total = int(level["point_count"][in_range].sum())
+    return _pyramid_response(cells, samples, zoom, total, "live")
+
 @router.get("/pickup")
 async def get_pickup_clusters(
     n_clusters: int = Query(10, ge=2, le=50),
+    zoom: Optional[int] = Query(None, ge=0, le=settings.PYRAMID_MAX_ZOOM),
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    period: TimeRange = Depends(pickup_time_range),
     db: Session = Depends(get_db)
 ):
     """
     Get pickup location clusters
+    
+    With zoom and/or bbox the densest cells of the precomputed pickup pyramid
+    are returned; otherwise the legacy coordinate-rounding clusters. The
+    pyramid covers all trips, so with start/end the cells are aggregated from
+    the trips in that range.
     """
+    box = parse_bbox(bbox)
+    
     try:
-        # get pickup coordinates
-        query = text("SELECT pickup_latitude, pickup_longitude FROM trips WHERE pickup_latitude IS NOT NULL")
-        results = db.execute(query).fetchall()
-        
-        if len(results) == 0:
-            return {"clusters": [], "message": "No data available"}
-        
-        # convert to DataFrame
-        df = pd.DataFrame(results, columns=['pickup_latitude', 'pickup_longitude'])
-        
-        # simple clustering by rounding coordinates (temporary implementation)
-        df['cluster_lat'] = df['pickup_latitude'].round(2)
-        df['cluster_lon'] = df['pickup_longitude'].round(2)
-        
-        clusters = []
-        for (lat, lon), group in df.groupby(['cluster_lat', 'cluster_lon']):
-            if len(clusters) >= n_clusters:
-                break
-                
-            clusters.append({
-                "cluster_id": len(clusters),
-                "center_lat": float(lat),
-                "center_lon": float(lon),
-                "point_count": len(group),
-                "points": group[['pickup_latitude', 'pickup_longitude']].head(10).to_dict('records')
-            })
+        # identical concurrent requests share a single computation
+        if zoom is None and box is None:
+            key = (n_clusters, period.key, get_data_version())
+            return await coalescer.run("/clusters/pickup", key, compute_pickup_clusters, n_clusters, period)
         
-        return {
-            "clusters": clusters,
-            "total_clusters": len(clusters),
-            "total_points": len(df)
-        }
+        zoom = settings.PYRAMID_DEFAULT_ZOOM if zoom is None else zoom
+        key = (n_clusters, zoom, box, period.key, get_data_version())
+        if period.active:
+            return await coalescer.run(
+                "/clusters/pickup", key, compute_live_pyramid_clusters, n_clusters, zoom, box, period
+            )
+        return await coalescer.run("/clusters/pickup", key, compute_pyramid_clusters, n_clusters, zoom, box)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in clustering: {str(e)}")
-    
\ No newline at end of file
@@ -3,13 +3,31 @@ This file provides FastAPI endpoints for custom algorithms that work with the da
 """
 from fastapi import APIRouter, Query, HTTPException, Depends
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
-from core.database import get_db, execute_query
+import numpy as np
+from core.config import settings
+from core.database import (
+    get_db, execute_query, fetch_array, fetch_trip_batch, iter_array_batches, iter_trip_batches, table_exists,
+    get_data_version
+)
+from core.column_store import get_column_store
+from core.metrics import time_algorithm
+from core.singleflight import coalescer
+from core.time_range import TimeRange, pickup_time_range
 from algorithm.custom_algorithm import (
-    pickup_hour_frequency, 
-    rank_clusters_by_total_duration,
-    manual_kmeans_clustering,
-    custom_trip_sorter
+    hour_histogram_from_counts,
+    rank_cluster_totals,
+    kmeans_cluster_summary,
+    minibatch_kmeans,
+    top_k_trip_batches
+)
+from algorithm.time_series import (
+    MINUTES_PER_DAY,
+    build_minute_series,
+    series_from_rows,
+    daily_profile,
+    circular_peaks
 )
 
 router = APIRouter(prefix="/custom", tags=["custom"])
@@ -17,110 +35,184 @@ router = APIRouter(prefix="/custom", tags=["custom"])
 @router.get("/hourly-pickups")
 async def get_hourly_pickups(
     day_of_week: Optional[int] = Query(None, ge=0, le=6, description="Filter by day of week (0=Monday, 6=Sunday)"),
+    is_weekend: Optional[bool] = Query(None, description="Only weekend (true) or weekday (false) trips"),
+    period: TimeRange = Depends(pickup_time_range),
     db: Session = Depends(get_db)
 ):
     """Get hourly pickup frequency using custom algorithm."""
     try:
-        # build query to get pickup data
-        query = "SELECT pickup_datetime FROM trips WHERE 1=1"
+        # count per hour in SQL on the indexed pickup_hour column: 24 rows come back
+        query = "SELECT pickup_hour, COUNT(*) AS trip_count FROM trips WHERE 1=1"
         params = {}
         
         if day_of_week is not None:
             query += " AND day_of_week = :day_of_week"
             params['day_of_week'] = day_of_week
         
+        if is_weekend is not None:
+            query += " AND is_weekend = :is_weekend"
+            params['is_weekend'] = int(is_weekend)
+        
+        for condition in period.conditions():
+            query += f" AND {condition}"
+        params.update(period.params)
+        
+        query += " GROUP BY pickup_hour"
+        
         # execute query and get results
         results = execute_query(query, params)
         
         if not results:
             return {"hourly_pickups": {}, "message": "No data found"}
         
-        # convert to list of trip dictionaries for the custom algorithm
-        trips = [{"pickup_datetime": row["pickup_datetime"]} for row in results]
-        
-        # use custom algorithm
-        frequency = pickup_hour_frequency(trips, timestamp_key="pickup_datetime")
+        # use custom algorithm on the pre-aggregated counts
+        with time_algorithm("hour_histogram", input_size=len(results)):
+            frequency = hour_histogram_from_counts((row["pickup_hour"], row["trip_count"]) for row in results)
         
         return {
             "hourly_pickups": frequency,
-            "total_trips": len(trips),
-            "filters": {"day_of_week": day_of_week}
+            "total_trips": sum(frequency.values()),
+            "filters": {
+                "day_of_week": day_of_week,
+                "is_weekend": is_weekend,
+                **period.filters
+            }
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing hourly pickups: {str(e)}")
 
+def compute_cluster_ranking(n_clusters: int, cluster_type: str, method: str = "full",
+                            batch_size: Optional[int] = None):
+    """Cluster trip coordinates and rank the clusters by total duration."""
+    # get coordinates and durations from database
+    if cluster_type == "pickup":
+        query = "SELECT pickup_latitude, pickup_longitude, trip_duration FROM trips ORDER BY rowid"
+    else:
+        query = "SELECT dropoff_latitude, dropoff_longitude, trip_duration FROM trips ORDER BY rowid"
+    
+    # the memory-mapped column store holds the same rows in the same order
+    store = get_column_store(get_data_version())
+    prefix = "pickup" if cluster_type == "pickup" else "dropoff"
+    columns = [f"{prefix}_latitude", f"{prefix}_longitude", "trip_duration"]
+    
+    if method == "minibatch":
+        # stream fixed-size batches straight from the cursor (or mapped columns), memory is O(k + batch)
+        def batch_source():
+            if store is not None:
+                size = batch_size or settings.KMEANS_BATCH_SIZE
+                lat, lon, durations = (store[column] for column in columns)
+                for start in range(0, len(store), size):
+                    yield np.column_stack([lat[start:start + size], lon[start:start + size]]), durations[start:start + size]
+                return
+            for batch in iter_array_batches(query, batch_size=batch_size):
+                yield batch[:, :2], batch[:, 2]
+        
+        with time_algorithm("minibatch_kmeans") as run_stats:
+            clusters = minibatch_kmeans(batch_source, n_clusters, stats=run_stats)
+    else:
+        batch = store.batch(columns) if store is not None else fetch_trip_batch(query)
+        accelerated = method == "accelerated"
+        
+        # vectorized K-means, summary mode: no per-trip lists are built
+        with time_algorithm("kmeans_cluster_summary", input_size=len(batch)) as run_stats:
+            clusters = kmeans_cluster_summary(
+                batch.coordinates(cluster_type), batch["trip_duration"], n_clusters,
+                accelerated=accelerated, stats=run_stats
+            )
+    
+    if not clusters:
+        return {"clusters": [], "message": "No data found for clustering"}
+    
+    # rank clusters by their pre-aggregated total duration
+    with time_algorithm("rank_cluster_totals", input_size=len(clusters)):
+        ranked_clusters = rank_cluster_totals(
+            {cluster_id: cluster_data["total_duration"] for cluster_id, cluster_data in clusters.items()}
+        )
+    
+    # format response
+    ranked_result = []
+    for cluster_id, total_duration in ranked_clusters:
+        cluster_info = clusters[cluster_id]
+        ranked_result.append({
+            "cluster_id": cluster_id,
+            "total_duration": int(total_duration),
+            "center_lat": cluster_info["center"][0],
+            "center_lon": cluster_info["center"][1],
+            "trip_count": cluster_info["size"],
+            "avg_duration": total_duration / cluster_info["size"] if cluster_info["size"] else 0
+        })
+    
+    return {
+        "ranked_clusters": ranked_result,
+        "cluster_type": cluster_type,
+        "total_clusters": n_clusters
+    }
+
 @router.get("/cluster-ranking")
 async def get_cluster_ranking(
-    n_clusters: int = Query(5, ge=2, le=20, description="Number of clusters to create"),
+    n_clusters: int = Query(5, ge=2, le=settings.MAX_CLUSTERS, description="Number of clusters to create"),
     cluster_type: str = Query("pickup", description="Type of clustering: 'pickup' or 'dropoff'"),
+    method: str = Query(
+        "full", pattern="^(full|accelerated|minibatch)$",
+        description="'full' (in-memory), 'accelerated' (in-memory, triangle-inequality bounds) or 'minibatch' (streaming)"
+    ),
+    batch_size: int = Query(settings.KMEANS_BATCH_SIZE, ge=100, le=1000000, description="Rows per mini-batch"),
     db: Session = Depends(get_db)
 ):
     """Rank clusters by total trip duration using custom algorithm."""
     try:
-        # get coordinates and durations from database
-        if cluster_type == "pickup":
-            query = "SELECT pickup_latitude, pickup_longitude, trip_duration FROM trips"
-        else:
-            query = "SELECT dropoff_latitude, dropoff_longitude, trip_duration FROM trips"
-        
-        results = execute_query(query)
-        
-        if not results:
-            return {"clusters": [], "message": "No data found for clustering"}
-        
-        # convert to format expected by custom algorithm
-        trips = []
-        for row in results:
-            if cluster_type == "pickup":
-                trips.append({
-                    "pickup_latitude": row["pickup_latitude"],
-                    "pickup_longitude": row["pickup_longitude"],
-                    "trip_duration": row["trip_duration"]
-                })
-            else:
-                trips.append({
-                    "dropoff_latitude": row["dropoff_latitude"],
-                    "dropoff_longitude": row["dropoff_longitude"],
-                    "trip_duration": row["trip_duration"]
-                })
-        
-        # create clusters using custom K-means
-        clusters = manual_kmeans_clustering(trips, n_clusters, cluster_type)
-        
-        # build cluster map for ranking
-        cluster_map = {}
-        for cluster_id, cluster_data in clusters.items():
-            cluster_map[cluster_id] = [
-                {"trip_duration": trip["trip_duration"]} 
-                for trip in cluster_data["trips"]
-            ]
-        
-        # rank clusters by total duration
-        ranked_clusters = rank_clusters_by_total_duration(cluster_map)
-        
-        # format response
-        ranked_result = []
-        for cluster_id, total_duration in ranked_clusters:
-            cluster_info = clusters[cluster_id]
-            ranked_result.append({
-                "cluster_id": cluster_id,
-                "total_duration": total_duration,
-                "center_lat": cluster_info["center"][0],
-                "center_lon": cluster_info["center"][1],
-                "trip_count": len(cluster_info["trips"]),
-                "avg_duration": total_duration / len(cluster_info["trips"]) if cluster_info["trips"] else 0
-            })
-        
-        return {
-            "ranked_clusters": ranked_result,
-            "cluster_type": cluster_type,
-            "total_clusters": n_clusters
-        }
+        # identical concurrent requests share a single clustering run
+        key = (n_clusters, cluster_type, method, batch_size, get_data_version())
+        return await coalescer.run(
+            "/custom/cluster-ranking", key, compute_cluster_ranking,
+            n_clusters, cluster_type, method, batch_size
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in cluster ranking: {str(e)}")
 
+def compute_sorted_trips(sort_by: str, limit: int, order: str):
+    """Top trips by duration, distance or speed, streamed over every trip"""
+    query = """
+        SELECT 
+            id, trip_duration, trip_distance_km, trip_speed_km_h,
+            pickup_latitude, pickup_longitude
+        FROM trips 
+        WHERE trip_duration IS NOT NULL 
+        AND trip_distance_km IS NOT NULL
+        ORDER BY rowid
+    """
+    
+    # streaming columnar top-k: only the best `limit` rows are kept between chunks
+    batches = iter_trip_batches(query)
+    with time_algorithm("top_k_trip_batches"):
+        sorted_trips = top_k_trip_batches(batches, limit, sort_by=sort_by, order=order)
+    
+    if not sorted_trips:
+        return {"sorted_trips": [], "message": "No trip data found"}
+    
+    # format response
+    formatted_trips = []
+    for trip in sorted_trips:
+        formatted_trips.append({
+            "id": trip["id"],
+            "trip_duration_minutes": round(trip["trip_duration"] / 60, 2),
+            "trip_distance_km": round(trip["trip_distance_km"], 2),
+            "trip_speed_km_h": round(trip["trip_speed_km_h"], 2),
+            "pickup_location": {
+                "lat": trip["pickup_latitude"],
+                "lon": trip["pickup_longitude"]
+            }
+        })
+    
+    return {
+        "sorted_trips": formatted_trips,
+        "sort_by": sort_by,
+        "order": order,
+        "total_sorted": len(formatted_trips)
+    }
+
 @router.get("/trip-sorting")
 async def get_sorted_trips(
     sort_by: str = Query("duration", description="Sort by: 'duration', 'distance', or 'speed'"),
@@ -130,123 +222,103 @@ async def get_sorted_trips(
 ):
     """Sort trips using custom sorting algorithm."""
     try:
-        # get trip data from database
-        query = """
-            SELECT 
-                id, trip_duration, trip_distance_km, trip_speed_km_h,
-                pickup_latitude, pickup_longitude
-            FROM trips 
-            WHERE trip_duration IS NOT NULL 
-            AND trip_distance_km IS NOT NULL
-            LIMIT :limit
-        """
-        
-        results = execute_query(query, {"limit": limit * 2})  # Get more for sampling
-        
-        if not results:
-            return {"sorted_trips": [], "message": "No trip data found"}
-        
-        # convert to format for custom algorithm
-        trips = []
-        for row in results:
-            trips.append({
-                "id": row["id"],
-                "trip_duration": row["trip_duration"],
-                "trip_distance_km": row["trip_distance_km"],
-                "trip_speed_km_h": row["trip_speed_km_h"],
-                "pickup_latitude": row["pickup_latitude"],
-                "pickup_longitude": row["pickup_longitude"]
-            })
-        
-        # use custom sorting algorithm
-        sorted_trips = custom_trip_sorter(trips, sort_by=sort_by, order=order)
-        
-        # format response
-        formatted_trips = []
-        for trip in sorted_trips[:limit]:  # limit after sorting
-            formatted_trips.append({
-                "id": trip["id"],
-                "trip_duration_minutes": round(trip["trip_duration"] / 60, 2),
-                "trip_distance_km": round(trip["trip_distance_km"], 2),
-                "trip_speed_km_h": round(trip["trip_speed_km_h"], 2),
-                "pickup_location": {
-                    "lat": trip["pickup_latitude"],
-                    "lon": trip["pickup_longitude"]
-                }
-            })
-        
-        return {
-            "sorted_trips": formatted_trips,
-            "sort_by": sort_by,
-            "order": order,
-            "total_sorted": len(formatted_trips)
-        }
+        # every trip is scanned, off the event loop
+        return await run_in_threadpool(compute_sorted_trips, sort_by, limit, order)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in trip sorting: {str(e)}")
 
+# minute-of-week series of the loaded dataset, keyed by data version
+_minute_series_cache = {}
+
+def load_minute_series():
+    """
+    (counts, total durations) per [day_of_week, minute_of_day]
+    
+    Read from the pickup_minute_series table built by db_setup, or built from
+    the trips once per data version when the table is missing.
+    """
+    version = get_data_version()
+    series = _minute_series_cache.get(version)
+    if series is not None:
+        return series
+    
+    if table_exists("pickup_minute_series"):
+        rows = execute_query("SELECT minute_of_week, trip_count, total_duration FROM pickup_minute_series")
+        series = series_from_rows((row["minute_of_week"], row["trip_count"], row["total_duration"]) for row in rows)
+    else:
+        data = fetch_array("""
+            SELECT pickup_epoch, trip_duration FROM trips
+            WHERE pickup_epoch IS NOT NULL
+        """, dtype="int64")
+        series = build_minute_series(data[:, 0], data[:, 1])
+    
+    # only the current version is worth keeping
+    _minute_series_cache.clear()
+    _minute_series_cache[version] = series
+    return series
+
+def compute_peak_analysis(bucket_minutes: int, window: int, min_prominence: float, day_of_week: Optional[int]):
+    """Circular peak detection over the (optionally weekday-filtered) daily profile."""
+    counts, totals = load_minute_series()
+    
+    with time_algorithm("circular_peaks", input_size=MINUTES_PER_DAY // bucket_minutes):
+        trip_counts = daily_profile(counts, bucket_minutes, day_of_week)
+        durations = daily_profile(totals, bucket_minutes, day_of_week)
+        found = circular_peaks(trip_counts, window=window, min_prominence=min_prominence)
+    
+    if trip_counts.sum() == 0:
+        return {"peaks": [], "message": "No data found for analysis"}
+    
+    n_buckets = len(trip_counts)
+    peaks = []
+    for peak in found:
+        i = peak["index"]
+        minute = i * bucket_minutes
+        prev_count = trip_counts[(i - 1) % n_buckets]
+        next_count = trip_counts[(i + 1) % n_buckets]
+        current_count = int(trip_counts[i])
+        peaks.append({
+            "hour": minute // 60,
+            "minute_of_day": minute,
+            "time": f"{minute // 60:02d}:{minute % 60:02d}",
+            "trip_count": current_count,
+            "avg_duration": float(durations[i] / current_count),
+            "prominence": peak["prominence"],
+            "peak_type": "morning" if minute < 12 * 60 else "afternoon/evening",
+            "intensity": float(current_count / ((prev_count + next_count) / 2)) if (prev_count + next_count) > 0 else 1
+        })
+    
+    # sort peaks by intensity
+    peaks_sorted = sorted(peaks, key=lambda x: x["intensity"], reverse=True)
+    
+    return {
+        "peak_hours": peaks_sorted,
+        "total_peaks": len(peaks_sorted),
+        "analysis_based_on": f"{n_buckets} buckets of {bucket_minutes} minutes",
+        "parameters": {
+            "bucket_minutes": bucket_minutes,
+            "window": window,
+            "min_prominence": min_prominence,
+            "day_of_week": day_of_week
+        }
+    }
+
 @router.get("/peak-analysis")
 async def get_peak_analysis(
+    bucket_minutes: int = Query(60, ge=1, le=MINUTES_PER_DAY, description="Bucket width in minutes (must divide 1440)"),
+    window: int = Query(1, ge=1, le=720, description="Buckets on each side a peak must dominate"),
+    min_prominence: float = Query(0, ge=0, description="Minimum height above the surrounding valleys (trips)"),
+    day_of_week: Optional[int] = Query(None, ge=0, le=6, description="Filter by day of week (0=Monday, 6=Sunday)"),
     db: Session = Depends(get_db)
 ):
-    """Custom algorithm to identify peak hours and patterns."""
+    """Custom algorithm to identify peak times, wrapping around midnight."""
+    if MINUTES_PER_DAY % bucket_minutes:
+        raise HTTPException(status_code=400, detail="bucket_minutes must divide 1440")
+    
     try:
-        # get hourly data for analysis
-        query = """
-            SELECT 
-                pickup_hour,
-                COUNT(*) as trip_count,
-                AVG(trip_duration) as avg_duration,
-                AVG(trip_distance_km) as avg_distance,
-                AVG(trip_speed_km_h) as avg_speed
-            FROM trips
-            GROUP BY pickup_hour
-            ORDER BY pickup_hour
-        """
-        
-        results = execute_query(query)
-        
-        if not results:
-            return {"peaks": [], "message": "No data found for analysis"}
-        
-        # convert to format for analysis
-        hourly_data = []
-        for row in results:
-            hourly_data.append({
-                "hour": row["pickup_hour"],
-                "trip_count": row["trip_count"],
-                "avg_duration": row["avg_duration"],
-                "avg_distance": row["avg_distance"],
-                "avg_speed": row["avg_speed"]
-            })
-        
-        # custom peak detection algorithm
-        peaks = []
-        for i, hour_data in enumerate(hourly_data):
-            if i == 0 or i == len(hourly_data) - 1:
-                continue
-                
-            prev_count = hourly_data[i-1]["trip_count"]
-            current_count = hour_data["trip_count"]
-            next_count = hourly_data[i+1]["trip_count"]
-            
-            # simple peak detection: current count is higher than neighbors
-            if current_count > prev_count and current_count > next_count:
-                peaks.append({
-                    "hour": hour_data["hour"],
-                    "trip_count": current_count,
-                    "peak_type": "morning" if hour_data["hour"] < 12 else "afternoon/evening",
-                    "intensity": current_count / ((prev_count + next_count) / 2) if (prev_count + next_count) > 0 else 1
-                })
-        
-        # sort peaks by intensity
-        peaks_sorted = sorted(peaks, key=lambda x: x["intensity"], reverse=True)
-        
-        return {
-            "peak_hours": peaks_sorted,
-            "total_peaks": len(peaks_sorted),
-            "analysis_based_on": f"{len(hourly_data)} hours of data"
-        }
+        # O(buckets): works on the precomputed minute series, not the trips
+        return compute_peak_analysis(bucket_minutes, window, min_prominence, day_of_week)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in peak analysis: {str(e)}")
@@ -260,13 +332,13 @@ async def get_algorithm_info():
                 "name": "Hourly Pickup Frequency",
                 "endpoint": "/custom/hourly-pickups",
                 "description": "Custom frequency counter for pickup hours",
-                "parameters": ["day_of_week (optional)"]
+                "parameters": ["day_of_week (optional)", "is_weekend (optional)", "start (optional)", "end (optional)"]
             },
             {
                 "name": "Cluster Ranking",
                 "endpoint": "/custom/cluster-ranking", 
-                "description": "Manual K-means clustering and duration-based ranking",
-                "parameters": ["n_clusters", "cluster_type"]
+                "description": "Vectorized or streaming mini-batch K-means and duration-based ranking",
+                "parameters": ["n_clusters", "cluster_type", "method", "batch_size"]
             },
             {
                 "name": "Trip Sorting",
@@ -277,8 +349,8 @@ async def get_algorithm_info():
             {
                 "name": "Peak Analysis",
                 "endpoint": "/custom/peak-analysis", 
-                "description": "Custom peak detection in hourly patterns",
-                "parameters": "None"
+                "description": "Circular peak detection over the minute-of-week series",
+                "parameters": ["bucket_minutes", "window", "min_prominence", "day_of_week (optional)"]
             }
         ],
         "custom_implementation": "All algorithms implemented manually without sklearn/pandas built-ins"
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Query
+from core.config import settings
+from core.query_log import query_stats, slow_query_log
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+@router.get("/top-queries")
+async def get_top_queries(
+    limit: int = Query(20, ge=1, le=200),
+    order_by: str = Query("total_time", pattern="^(total_time|avg_time|max_time|calls|rows)$"),
+):
+    """
+    Get the heaviest SQL statements aggregated by fingerprint
+    """
+    queries = []
+    for entry in query_stats.top(limit=limit, order_by=order_by):
+        queries.append({
+            "fingerprint": entry["fingerprint"],
+            "calls": entry["calls"],
+            "total_time_ms": round(entry["total_time"] * 1000, 3),
+            "avg_time_ms": round(entry["avg_time"] * 1000, 3),
+            "max_time_ms": round(entry["max_time"] * 1000, 3),
+            "rows": entry["rows"],
+            "endpoints": entry["endpoints"]
+        })
+    
+    return {
+        "queries": queries,
+        "order_by": order_by,
+        "slow_query_threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "slow_query_log": settings.SLOW_QUERY_LOG_PATH if settings.SLOW_QUERY_LOG_ENABLED else None,
+        "slow_log_dropped": slow_query_log.dropped
+    }
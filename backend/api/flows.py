@@ -1,22 +1,96 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
-from core.database import get_db
+import asyncio
+import logging
+import numpy as np
+from core.config import settings
+from core.database import get_db, fetch_array, get_data_version
+from core.approx import approximate_groups, rounded_interval
+from core.column_store import get_column_store
+from core.time_range import TimeRange, pickup_time_range
+from core.singleflight import coalescer
+from algorithm.spatial_pyramid import cell_index, cell_bounds
+from algorithm.od_matrix import build_od_matrix, top_k
+from api.summary import hour_range
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/flows", tags=["flows"])
 
+OD_GROUPS = {
+    "pickup_lat": "ROUND(pickup_latitude, 3)",
+    "pickup_lon": "ROUND(pickup_longitude, 3)",
+    "dropoff_lat": "ROUND(dropoff_latitude, 3)",
+    "dropoff_lon": "ROUND(dropoff_longitude, 3)"
+}
+
+def approximate_top_pairs(limit, where, params):
+    """Top OD pairs estimated from a stratified sample, None if no sample is adequate"""
+    approximate = approximate_groups(OD_GROUPS, ("trip_duration", "trip_distance_km"), where, params)
+    if approximate is None:
+        return None
+    
+    estimates, rate = approximate
+    ranked = sorted(estimates.items(), key=lambda item: (-item[1]["count"]["value"], item[0]))[:limit]
+    flows = []
+    for (pickup_lat, pickup_lon, dropoff_lat, dropoff_lon), estimate in ranked:
+        flows.append({
+            "pickup": {"lat": pickup_lat, "lon": pickup_lon},
+            "dropoff": {"lat": dropoff_lat, "lon": dropoff_lon},
+            "trip_count": int(round(estimate["count"]["value"])),
+            "avg_duration_minutes": round(estimate["trip_duration"]["value"] / 60, 2),
+            "avg_distance_km": round(estimate["trip_distance_km"]["value"], 2),
+            "sample_rows": estimate["sample_rows"],
+            "confidence_intervals": {
+                "trip_count": rounded_interval(estimate["count"], digits=0),
+                "avg_duration_minutes": rounded_interval(estimate["trip_duration"], scale=1 / 60),
+                "avg_distance_km": rounded_interval(estimate["trip_distance_km"])
+            }
+        })
+    return flows, rate
+
 @router.get("/top-pairs")
 async def get_top_flow_pairs(
     limit: int = Query(20, ge=1, le=100),
     hour_start: Optional[int] = Query(None, ge=0, le=23),
     hour_end: Optional[int] = Query(None, ge=0, le=23),
+    approx: bool = Query(False, description="Answer from a stratified sample, with 95% confidence intervals"),
+    period: TimeRange = Depends(pickup_time_range),
     db: Session = Depends(get_db)
 ):
     """
     Get top origin-destination flow pairs
     """
     try:
+        filters = {
+            "hour_start": hour_start,
+            "hour_end": hour_end,
+            **period.filters
+        }
+        
+        if approx:
+            where = "pickup_latitude IS NOT NULL AND dropoff_latitude IS NOT NULL"
+            approx_params = {}
+            if hour_start is not None and hour_end is not None:
+                where += " AND pickup_hour BETWEEN :hour_start AND :hour_end"
+                approx_params = {"hour_start": hour_start, "hour_end": hour_end}
+            for condition in period.conditions():
+                where += f" AND {condition}"
+            approx_params.update(period.params)
+            approximate = approximate_top_pairs(limit, where, approx_params)
+            if approximate is not None:
+                flows, rate = approximate
+                return {
+                    "flows": flows,
+                    "total_flows": len(flows),
+                    "filters_applied": filters,
+                    "approximate": True,
+                    "sample_rate": rate
+                }
+        
         query = text("""
         SELECT 
             ROUND(pickup_latitude, 3) as pickup_lat,
@@ -37,6 +111,10 @@ async def get_top_flow_pairs(
             params['hour_start'] = hour_start
             params['hour_end'] = hour_end
         
+        for condition in period.conditions():
+            query = text(str(query) + f" AND {condition}")
+        params.update(period.params)
+        
         query = text(str(query) + """
         GROUP BY 
             ROUND(pickup_latitude, 3),
@@ -64,12 +142,188 @@ async def get_top_flow_pairs(
         return {
             "flows": flows,
             "total_flows": len(flows),
+            "filters_applied": filters,
+            **({"approximate": False} if approx else {})
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error in flow analysis: {str(e)}")
+    
+# trips columns an OD matrix is built from, in build_od_matrix argument order
+OD_COLUMNS = ("pickup_latitude", "pickup_longitude", "dropoff_latitude", "dropoff_longitude",
+              "pickup_hour", "trip_duration", "trip_distance_km")
+
+# last built OD matrix per zoom, as {zoom: (data version, matrix)}
+_od_cache = {}
+
+# background rebuilds, referenced until they finish
+_od_refreshes = set()
+
+def build_current_od_matrix(zoom):
+    """Build the ODMatrix of the current data version from the column store or the trips, and cache it"""
+    version = get_data_version()
+    cached = _od_cache.get(zoom)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    
+    store = get_column_store(version)
+    if store is not None:
+        columns = [store[name] for name in OD_COLUMNS]
+    else:
+        data = fetch_array(f"SELECT {', '.join(OD_COLUMNS)} FROM trips")
+        columns = [data[:, i] for i in range(len(OD_COLUMNS))]
+    matrix = build_od_matrix(*columns, settings.NYC_BOUNDS, zoom)
+    _od_cache[zoom] = (version, matrix)
+    return matrix
+
+def load_od_matrix(zoom: Optional[int] = None):
+    """ODMatrix of every trip at a zoom, built once per data version"""
+    return build_current_od_matrix(settings.OD_DEFAULT_ZOOM if zoom is None else zoom)
+
+def _log_refresh(task):
+    _od_refreshes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Error rebuilding the OD matrix: {task.exception()}")
+
+async def current_od_matrix(zoom):
+    """
+    ODMatrix for a request, without waiting on a rebuild when one is already built
+    
+    Every ingest commit changes the data version; the last matrix keeps being
+    served while one rebuild per zoom runs in the threadpool. Only the first
+    request of a zoom waits for its matrix.
+    """
+    cached = _od_cache.get(zoom)
+    if cached is not None and cached[0] == get_data_version():
+        return cached[1]
+    
+    rebuild = coalescer.run("/flows/od-matrix", zoom, build_current_od_matrix, zoom)
+    if cached is None:
+        return await rebuild
+    task = asyncio.ensure_future(rebuild)
+    _od_refreshes.add(task)
+    task.add_done_callback(_log_refresh)
+    return cached[1]
+
+def range_od_matrix(zoom, cell_x, cell_y, reverse, period):
+    """ODMatrix of the trips of a date range starting (ending when reverse) in one cell"""
+    prefix = "dropoff" if reverse else "pickup"
+    lat_column, lon_column = f"{prefix}_latitude", f"{prefix}_longitude"
+    min_lat, min_lon, max_lat, max_lon = cell_bounds(zoom, cell_x, cell_y, settings.NYC_BOUNDS)
+    # a small pad so float rounding at the cell edge can't drop trips, build_od_matrix does the exact cut
+    pad = 1e-9
+    conditions = [
+        f"{lat_column} BETWEEN :min_lat AND :max_lat", f"{lon_column} BETWEEN :min_lon AND :max_lon",
+        *period.conditions()
+    ]
+    params = {"min_lat": min_lat - pad, "max_lat": max_lat + pad, "min_lon": min_lon - pad, "max_lon": max_lon + pad,
+              **period.params}
+    data = fetch_array(f"SELECT {', '.join(OD_COLUMNS)} FROM trips WHERE {' AND '.join(conditions)}", params)
+    return build_od_matrix(*(data[:, i] for i in range(len(OD_COLUMNS))), settings.NYC_BOUNDS, zoom)
+
+def resolve_cell(zoom, x, y, lat, lon):
+    """(cell_x, cell_y) given directly or as the cell containing lat/lon"""
+    side = 1 << zoom
+    if x is not None and y is not None:
+        if x >= side or y >= side:
+            raise HTTPException(status_code=400, detail=f"x and y must be below {side} at zoom {zoom}")
+        return x, y
+    if lat is not None and lon is not None:
+        min_lat, min_lon, max_lat, max_lon = settings.NYC_BOUNDS
+        if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            raise HTTPException(status_code=400, detail="lat/lon outside the NYC bounds")
+        cell_x, cell_y = cell_index(np.array([lat]), np.array([lon]), zoom, settings.NYC_BOUNDS)
+        return int(cell_x[0]), int(cell_y[0])
+    raise HTTPException(status_code=400, detail="Give the cell as x and y, or as lat and lon")
+
+def describe_cell(zoom, cell_x, cell_y):
+    min_lat, min_lon, max_lat, max_lon = cell_bounds(zoom, cell_x, cell_y, settings.NYC_BOUNDS)
+    return {
+        "x": cell_x,
+        "y": cell_y,
+        "center": {"lat": round((min_lat + max_lat) / 2, 5), "lon": round((min_lon + max_lon) / 2, 5)}
+    }
+
+async def cell_flows(reverse, zoom, x, y, lat, lon, hour_start, hour_end, limit, period):
+    """Busiest destinations of a cell (origins when reverse), from the OD matrix or a date range's trips"""
+    cell_x, cell_y = resolve_cell(zoom, x, y, lat, lon)
+    hours = hour_range(hour_start, hour_end)
+    try:
+        if period.active:
+            matrix = await run_in_threadpool(range_od_matrix, zoom, cell_x, cell_y, reverse, period)
+            source = "trips"
+        else:
+            matrix, source = await current_od_matrix(zoom), "matrix"
+        
+        cells, counts, durations, distances = matrix.row(
+            cell_x * matrix.side + cell_y, None if len(hours) == 24 else hours, reverse
+        )
+        total = int(counts.sum())
+        flows = []
+        for i in top_k(counts, limit).tolist():
+            flows.append({
+                **describe_cell(zoom, *divmod(int(cells[i]), matrix.side)),
+                "trip_count": int(counts[i]),
+                "share": round(counts[i] / total, 4),
+                "avg_duration_minutes": round(durations[i] / counts[i] / 60, 2),
+                "avg_distance_km": round(distances[i] / counts[i], 2)
+            })
+        
+        cell, partners = ("destination", "origins") if reverse else ("origin", "destinations")
+        return {
+            cell: {"zoom": zoom, **describe_cell(zoom, cell_x, cell_y)},
+            partners: flows,
+            "total_trips": total,
+            f"distinct_{partners}": len(cells),
             "filters_applied": {
                 "hour_start": hour_start,
-                "hour_end": hour_end
-            }
+                "hour_end": hour_end,
+                **period.filters
+            },
+            "source": source
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in flow analysis: {str(e)}")
-    
\ No newline at end of file
+
+@router.get("/from-cell")
+async def get_flows_from_cell(
+    zoom: int = Query(settings.OD_DEFAULT_ZOOM, ge=0, le=settings.OD_MAX_ZOOM),
+    x: Optional[int] = Query(None, ge=0, description="Origin cell x (grows eastwards)"),
+    y: Optional[int] = Query(None, ge=0, description="Origin cell y (grows northwards)"),
+    lat: Optional[float] = Query(None, description="Origin point, instead of x/y"),
+    lon: Optional[float] = Query(None, description="Origin point, instead of x/y"),
+    hour_start: Optional[int] = Query(None, ge=0, le=23),
+    hour_end: Optional[int] = Query(None, ge=0, le=23),
+    limit: int = Query(10, ge=1, le=100),
+    period: TimeRange = Depends(pickup_time_range)
+):
+    """
+    Top destination cells of trips starting in one pyramid cell
+    
+    Hour ranges wrap around midnight when hour_start > hour_end (e.g. 22 to 2).
+    Answered from the in-memory OD matrix; with start/end the trips of that
+    range leaving the cell are aggregated on the fly.
+    """
+    return await cell_flows(False, zoom, x, y, lat, lon, hour_start, hour_end, limit, period)
+
+@router.get("/to-cell")
+async def get_flows_to_cell(
+    zoom: int = Query(settings.OD_DEFAULT_ZOOM, ge=0, le=settings.OD_MAX_ZOOM),
+    x: Optional[int] = Query(None, ge=0, description="Destination cell x (grows eastwards)"),
+    y: Optional[int] = Query(None, ge=0, description="Destination cell y (grows northwards)"),
+    lat: Optional[float] = Query(None, description="Destination point, instead of x/y"),
+    lon: Optional[float] = Query(None, description="Destination point, instead of x/y"),
+    hour_start: Optional[int] = Query(None, ge=0, le=23),
+    hour_end: Optional[int] = Query(None, ge=0, le=23),
+    limit: int = Query(10, ge=1, le=100),
+    period: TimeRange = Depends(pickup_time_range)
+):
+    """
+    Top origin cells of trips ending in one pyramid cell
+    
+    Hours are pickup hours and wrap around midnight when hour_start > hour_end.
+    Answered from the in-memory OD matrix; with start/end the trips of that
+    range arriving in the cell are aggregated on the fly.
+    """
+    return await cell_flows(True, zoom, x, y, lat, lon, hour_start, hour_end, limit, period)
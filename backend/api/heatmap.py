@@ -0,0 +1,124 @@
+from typing import Optional
+from functools import lru_cache
+import hashlib
+import numpy as np
+from fastapi import APIRouter, Query, Path, Header, HTTPException
+from fastapi.responses import Response
+from core.config import settings
+from core.database import execute_query, fetch_array, table_exists, format_data_version
+from core.ingest import HEATMAP_WATERMARK
+from core.column_store import get_column_store
+from algorithm.spatial_pyramid import cell_bounds
+from algorithm.density_raster import tile_raster, encode_tile
+
+router = APIRouter(prefix="/heatmap", tags=["heatmap"])
+
+LAYER_COLUMNS = {
+    "pickup": ("pickup_latitude", "pickup_longitude"),
+    "dropoff": ("dropoff_latitude", "dropoff_longitude")
+}
+
+@lru_cache(maxsize=1024)
+def _live_tile(version, layer, hour, zoom, tile_x, tile_y):
+    """
+    (raster bytes, point count, max count) of one tile binned from the trips
+
+    Used when the heatmap_tiles table has not been built; cached per data version.
+    """
+    lat_column, lon_column = LAYER_COLUMNS[layer]
+    store = get_column_store(version)
+    if store is not None:
+        # one pass over the mapped columns, no rows are materialized
+        lat, lon = store[lat_column], store[lon_column]
+        if hour is not None:
+            in_hour = store["pickup_hour"] == hour
+            lat, lon = lat[in_hour], lon[in_hour]
+        raster = tile_raster(lat, lon, settings.NYC_BOUNDS, zoom, tile_x, tile_y, settings.HEATMAP_TILE_SIZE)
+        return encode_tile(raster), int(raster.sum()), int(raster.max())
+
+    min_lat, min_lon, max_lat, max_lon = cell_bounds(zoom, tile_x, tile_y, settings.NYC_BOUNDS)
+    # pad by a pixel so float rounding at the tile edge can't drop points, tile_raster does the exact cut
+    pad_lat = (max_lat - min_lat) / settings.HEATMAP_TILE_SIZE
+    pad_lon = (max_lon - min_lon) / settings.HEATMAP_TILE_SIZE
+    where = f"{lat_column} BETWEEN :min_lat AND :max_lat AND {lon_column} BETWEEN :min_lon AND :max_lon"
+    params = {
+        "min_lat": min_lat - pad_lat, "max_lat": max_lat + pad_lat,
+        "min_lon": min_lon - pad_lon, "max_lon": max_lon + pad_lon
+    }
+    if hour is not None:
+        where += " AND pickup_hour = :hour"
+        params["hour"] = hour
+
+    coords = fetch_array(f"SELECT {lat_column}, {lon_column} FROM trips WHERE {where}", params)
+    raster = tile_raster(
+        coords[:, 0], coords[:, 1], settings.NYC_BOUNDS, zoom, tile_x, tile_y, settings.HEATMAP_TILE_SIZE
+    )
+    return encode_tile(raster), int(raster.sum()), int(raster.max())
+
+@lru_cache(maxsize=1)
+def _empty_tile():
+    return encode_tile(np.zeros((settings.HEATMAP_TILE_SIZE, settings.HEATMAP_TILE_SIZE), dtype=np.uint32))
+
+def load_tile(version, layer, hour, zoom, tile_x, tile_y):
+    """(raster bytes, point count, max count, source) from the precomputed tiles or the live fallback"""
+    precomputed = hour is None or settings.HEATMAP_PER_HOUR
+    if precomputed and table_exists("heatmap_tiles"):
+        rows = execute_query("""
+            SELECT raster, point_count, max_count FROM heatmap_tiles
+            WHERE layer = :layer AND hour = :hour AND zoom = :zoom AND tile_x = :x AND tile_y = :y
+        """, {"layer": layer, "hour": -1 if hour is None else hour, "zoom": zoom, "x": tile_x, "y": tile_y})
+        if not rows:
+            # only occupied tiles are stored
+            return _empty_tile(), 0, 0, "precomputed"
+        return rows[0]["raster"], rows[0]["point_count"], rows[0]["max_count"], "precomputed"
+
+    return (*_live_tile(version, layer, hour, zoom, tile_x, tile_y), "live")
+
+@router.get("/{z}/{x}/{y}")
+async def get_heatmap_tile(
+    z: int = Path(..., ge=0, le=settings.HEATMAP_MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    layer: str = Query("pickup", pattern="^(pickup|dropoff)$"),
+    hour: Optional[int] = Query(None, ge=0, le=23, description="Pickup hour, all hours when omitted"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Density tile of pickups or dropoffs
+
+    Tile z/x/y covers pyramid cell z/x/y of the NYC bounds (x eastwards, y
+    northwards). The body is gzip-encoded little-endian uint32 counts,
+    HEATMAP_TILE_SIZE rows of HEATMAP_TILE_SIZE pixels, north row first.
+    """
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail=f"Tile {z}/{x}/{y} is outside the zoom {z} grid")
+
+    try:
+        metadata = {row["key"]: row["value"] for row in execute_query("""
+            SELECT key, value FROM system_metadata
+            WHERE key IN ('last_data_load', 'total_trips', :watermark)
+        """, {"watermark": HEATMAP_WATERMARK})}
+        version = format_data_version(metadata)
+        # ingested trips reach heatmap_tiles after the commit that changed the version,
+        # so the tile watermark is part of the tag too
+        watermark = metadata.get(HEATMAP_WATERMARK, "")
+        etag = '"' + hashlib.sha1(f"{version}|{watermark}|{layer}|{hour}|{z}/{x}/{y}".encode()).hexdigest()[:20] + '"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={settings.HEATMAP_CACHE_SECONDS}"
+        }
+        if if_none_match == etag:
+            return Response(status_code=304, headers=headers)
+
+        raster, point_count, max_count, source = load_tile(version, layer, hour, z, x, y)
+        headers.update({
+            "Content-Encoding": "gzip",
+            "X-Tile-Size": str(settings.HEATMAP_TILE_SIZE),
+            "X-Tile-Point-Count": str(point_count),
+            "X-Tile-Max-Count": str(max_count),
+            "X-Tile-Source": source
+        })
+        return Response(content=raster, media_type="application/octet-stream", headers=headers)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error in heatmap tile: {str(e)}")
@@ -1,18 +1,58 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
-from core.database import get_db
+from functools import lru_cache
+from core.database import get_db, execute_query, fetch_array, table_exists, get_data_version
+from core.approx import approximate_groups, rounded_interval
+from core.time_range import TimeRange, pickup_time_range
+from algorithm.quantile_sketch import SKETCH_METRICS, TDigest, build_group_sketches
 import logging
 
 router = APIRouter(prefix="/summary", tags=["summary"])
 logger = logging.getLogger(__name__)
 
+OVERVIEW_METRICS = ("trip_duration", "trip_distance_km", "trip_speed_km_h", "passenger_count")
+
+def approximate_overview(where_conditions, params, filters):
+    """Overview estimated from the smallest adequate stratified sample, None if unavailable"""
+    approximate = approximate_groups({}, OVERVIEW_METRICS, " AND ".join(where_conditions) or "1=1", params)
+    if approximate is None:
+        return None
+    
+    estimates, rate = approximate
+    estimate = estimates.get(())
+    if estimate is None:
+        return {"total_trips": 0, "approximate": True, "sample_rate": rate, "filters_applied": filters}
+    
+    return {
+        "total_trips": int(round(estimate["count"]["value"])),
+        "avg_duration_minutes": round(estimate["trip_duration"]["value"] / 60, 2),
+        "avg_distance_km": round(estimate["trip_distance_km"]["value"], 2),
+        "avg_speed_km_h": round(estimate["trip_speed_km_h"]["value"], 2),
+        "avg_passengers": round(estimate["passenger_count"]["value"], 2),
+        "filters_applied": filters,
+        "approximate": True,
+        "sample_rate": rate,
+        "sample_rows": estimate["sample_rows"],
+        "confidence_intervals": {
+            "total_trips": rounded_interval(estimate["count"], digits=0),
+            "avg_duration_minutes": rounded_interval(estimate["trip_duration"], scale=1 / 60),
+            "avg_distance_km": rounded_interval(estimate["trip_distance_km"]),
+            "avg_speed_km_h": rounded_interval(estimate["trip_speed_km_h"]),
+            "avg_passengers": rounded_interval(estimate["passenger_count"])
+        }
+    }
+
 @router.get("/overview")
 async def get_summary_overview(
     hour_start: Optional[int] = Query(None, ge=0, le=23),
     hour_end: Optional[int] = Query(None, ge=0, le=23),
     day_of_week: Optional[int] = Query(None, ge=0, le=6),
+    passenger_count: Optional[int] = Query(None, ge=0, le=9),
+    approx: bool = Query(False, description="Answer from a stratified sample, with 95% confidence intervals"),
+    period: TimeRange = Depends(pickup_time_range),
     db: Session = Depends(get_db)
 ):
     """
@@ -44,6 +84,27 @@ async def get_summary_overview(
             where_conditions.append("day_of_week = :day_of_week")
             params['day_of_week'] = day_of_week
         
+        if passenger_count is not None:
+            where_conditions.append("passenger_count = :passenger_count")
+            params['passenger_count'] = passenger_count
+        
+        where_conditions.extend(period.conditions())
+        params.update(period.params)
+        
+        filters = {
+            "hour_start": hour_start,
+            "hour_end": hour_end,
+            "day_of_week": day_of_week,
+            "passenger_count": passenger_count,
+            **period.filters
+        }
+        
+        # sample tables answer in milliseconds whatever the table size
+        if approx:
+            approximate = approximate_overview(where_conditions, params, filters)
+            if approximate is not None:
+                return approximate
+        
         # add WHERE conditions if any
         if where_conditions:
             where_clause = " AND " + " AND ".join(where_conditions)
@@ -60,11 +121,8 @@ async def get_summary_overview(
             "avg_distance_km": round(result[2] or 0, 2),
             "avg_speed_km_h": round(result[3] or 0, 2),
             "avg_passengers": round(result[4] or 0, 2),
-            "filters_applied": {
-                "hour_start": hour_start,
-                "hour_end": hour_end,
-                "day_of_week": day_of_week
-            }
+            "filters_applied": filters,
+            **({"approximate": False} if approx else {})
         }
         
     except Exception as e:
@@ -74,6 +132,7 @@ async def get_summary_overview(
 @router.get("/busiest-hour")
 async def get_busiest_hour(
     day_of_week: Optional[int] = Query(None, ge=0, le=6),
+    period: TimeRange = Depends(pickup_time_range),
     db: Session = Depends(get_db)
 ):
     """
@@ -91,6 +150,10 @@ async def get_busiest_hour(
             query = text(str(query) + " AND day_of_week = :day_of_week")
             params['day_of_week'] = day_of_week
         
+        for condition in period.conditions():
+            query = text(str(query) + f" AND {condition}")
+        params.update(period.params)
+        
         query = text(str(query) + " GROUP BY pickup_hour ORDER BY trip_count DESC LIMIT 1")
         
         result = db.execute(query, params).fetchone()
@@ -99,16 +162,155 @@ async def get_busiest_hour(
             return {
                 "busiest_hour": None,
                 "trip_count": 0,
-                "day_of_week": day_of_week
+                "day_of_week": day_of_week,
+                **period.filters
             }
         
         return {
             "busiest_hour": result[0],
             "trip_count": result[1],
-            "day_of_week": day_of_week
+            "day_of_week": day_of_week,
+            **period.filters
         }
         
     except Exception as e:
         logger.error(f"Error in busiest hour: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
-    
\ No newline at end of file
+    
+# quantile sketches of the loaded dataset, keyed by data version
+_sketch_cache = {}
+
+def load_quantile_sketches():
+    """
+    {(pickup_hour, day_of_week, metric): TDigest} for the current data version
+    
+    Read from the trip_quantile_sketches table built by db_setup, or built from
+    the trips once per data version when the table is missing.
+    """
+    version = get_data_version()
+    sketches = _sketch_cache.get(version)
+    if sketches is not None:
+        return version, sketches
+    
+    if table_exists("trip_quantile_sketches"):
+        rows = execute_query("SELECT pickup_hour, day_of_week, metric, sketch FROM trip_quantile_sketches")
+        sketches = {
+            (row["pickup_hour"], row["day_of_week"], row["metric"]): TDigest.from_bytes(row["sketch"])
+            for row in rows
+        }
+    else:
+        data = fetch_array(f"SELECT pickup_hour, day_of_week, {', '.join(SKETCH_METRICS)} FROM trips")
+        sketches = build_group_sketches(
+            data[:, 0], data[:, 1], {metric: data[:, 2 + i] for i, metric in enumerate(SKETCH_METRICS)}
+        )
+    
+    # only the current version is worth keeping
+    _sketch_cache.clear()
+    _sketch_cache[version] = sketches
+    _merged_quantiles.cache_clear()
+    return version, sketches
+
+def hour_range(hour_start: Optional[int], hour_end: Optional[int]):
+    """Hours from hour_start to hour_end inclusive, wrapping past midnight when start > end"""
+    start = 0 if hour_start is None else hour_start
+    end = 23 if hour_end is None else hour_end
+    if start <= end:
+        return tuple(range(start, end + 1))
+    return tuple(range(start, 24)) + tuple(range(0, end + 1))
+
+@lru_cache(maxsize=4096)
+def _merged_quantiles(version, metric, hours, day_of_week, quantiles):
+    """(count, values) for one metric over the selected groups; repeated filters are answered from cache"""
+    sketches = _sketch_cache.get(version, {})
+    days = range(7) if day_of_week is None else (day_of_week,)
+    selected = [sketches[key] for key in ((hour, day, metric) for hour in hours for day in days) if key in sketches]
+    merged = TDigest.merge_all(selected)
+    return merged.count, merged.quantiles(quantiles)
+
+def range_quantiles(metrics, hours, day_of_week, period, quantiles):
+    """
+    {metric: (count, values)} over the trips of a date range
+    
+    The stored sketches cover the whole dataset per (hour, day), so a date
+    range digests the matching trips instead (an index range scan on
+    pickup_epoch).
+    """
+    conditions = period.conditions()
+    params = dict(period.params)
+    if len(hours) < 24:
+        conditions.append(f"pickup_hour IN ({', '.join(str(hour) for hour in hours)})")
+    if day_of_week is not None:
+        conditions.append("day_of_week = :day_of_week")
+        params["day_of_week"] = day_of_week
+    
+    data = fetch_array(f"SELECT {', '.join(metrics)} FROM trips WHERE {' AND '.join(conditions)}", params)
+    result = {}
+    for i, metric in enumerate(metrics):
+        digest = TDigest().add(data[:, i])
+        result[metric] = (digest.count, digest.quantiles(quantiles))
+    return result
+
+@router.get("/percentiles")
+async def get_percentiles(
+    hour_start: Optional[int] = Query(None, ge=0, le=23),
+    hour_end: Optional[int] = Query(None, ge=0, le=23),
+    day_of_week: Optional[int] = Query(None, ge=0, le=6),
+    percentiles: str = Query("50,90,99", description="Comma-separated percentiles, e.g. 50,90,99"),
+    metrics: Optional[str] = Query(None, description=f"Comma-separated subset of {', '.join(SKETCH_METRICS)}"),
+    period: TimeRange = Depends(pickup_time_range),
+    db: Session = Depends(get_db)
+):
+    """
+    Duration, distance and speed percentiles from per-(hour, day) quantile sketches
+    
+    Hour ranges wrap around midnight when hour_start > hour_end (e.g. 22 to 2).
+    With start/end the trips of that range are digested on the fly.
+    """
+    try:
+        levels = tuple(float(p) for p in percentiles.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles must be comma-separated numbers")
+    if not levels or any(p < 0 or p > 100 for p in levels):
+        raise HTTPException(status_code=400, detail="percentiles must be between 0 and 100")
+    
+    selected_metrics = SKETCH_METRICS if metrics is None else tuple(m.strip() for m in metrics.split(","))
+    unknown = [m for m in selected_metrics if m not in SKETCH_METRICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metrics: {', '.join(unknown)}")
+    
+    try:
+        hours = hour_range(hour_start, hour_end)
+        quantiles = tuple(p / 100 for p in levels)
+        if period.active:
+            # digests every trip of the range, off the event loop
+            ranged = await run_in_threadpool(range_quantiles, selected_metrics, hours, day_of_week, period, quantiles)
+        else:
+            version, _ = load_quantile_sketches()
+        
+        result = {}
+        trip_count = 0
+        for metric in selected_metrics:
+            if period.active:
+                count, values = ranged[metric]
+            else:
+                count, values = _merged_quantiles(version, metric, hours, day_of_week, quantiles)
+            trip_count = max(trip_count, int(count))
+            result[metric] = {
+                f"p{p:g}": (round(value, 2) if value is not None else None) for p, value in zip(levels, values)
+            }
+        
+        return {
+            "percentiles": result,
+            "trip_count": trip_count,
+            "filters_applied": {
+                "hour_start": hour_start,
+                "hour_end": hour_end,
+                "day_of_week": day_of_week,
+                **period.filters
+            },
+            "source": "trips" if period.active else "sketch"
+        }
+        
+    except Exception as e:
+        logger.error(f"Error in percentiles: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
@@ -1,27 +1,60 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from core.database import get_db
+from core.approx import approximate_groups, rounded_interval
+from core.time_range import TimeRange, pickup_time_range
 
 router = APIRouter(prefix="/temporal", tags=["temporal"])
 
+APPROX_QUERY = Query(False, description="Answer from a stratified sample, with 95% confidence intervals")
+
 @router.get("/hourly-distribution")
-async def get_hourly_distribution(db: Session = Depends(get_db)):
+async def get_hourly_distribution(
+    approx: bool = APPROX_QUERY,
+    period: TimeRange = Depends(pickup_time_range),
+    db: Session = Depends(get_db)
+):
     """
     Get trip distribution by hour of day
     """
-    query = text("""
+    where = " AND ".join(period.conditions()) or "1=1"
+    if approx:
+        approximate = approximate_groups(
+            {"pickup_hour": "pickup_hour"}, ("trip_duration", "trip_speed_km_h"), where, period.params
+        )
+        if approximate is not None:
+            estimates, rate = approximate
+            hourly_data = []
+            for (hour,), estimate in sorted(estimates.items()):
+                hourly_data.append({
+                    "hour": hour,
+                    "trip_count": int(round(estimate["count"]["value"])),
+                    "avg_duration_minutes": round(estimate["trip_duration"]["value"] / 60, 2),
+                    "avg_speed_km_h": round(estimate["trip_speed_km_h"]["value"], 2),
+                    "sample_rows": estimate["sample_rows"],
+                    "confidence_intervals": {
+                        "trip_count": rounded_interval(estimate["count"], digits=0),
+                        "avg_duration_minutes": rounded_interval(estimate["trip_duration"], scale=1 / 60),
+                        "avg_speed_km_h": rounded_interval(estimate["trip_speed_km_h"])
+                    }
+                })
+            return {"hourly_distribution": hourly_data, "approximate": True, "sample_rate": rate,
+                    "filters_applied": period.filters}
+    
+    query = text(f"""
     SELECT 
         pickup_hour,
         COUNT(*) as trip_count,
         AVG(trip_duration) as avg_duration,
         AVG(trip_speed_km_h) as avg_speed
     FROM trips
+    WHERE {where}
     GROUP BY pickup_hour
     ORDER BY pickup_hour
     """)
     
-    results = db.execute(query).fetchall()
+    results = db.execute(query, period.params).fetchall()
     
     hourly_data = []
     for row in results:
@@ -32,14 +65,52 @@ async def get_hourly_distribution(db: Session = Depends(get_db)):
             "avg_speed_km_h": round(row[3] or 0, 2)
         })
     
-    return {"hourly_distribution": hourly_data}
+    return {
+        "hourly_distribution": hourly_data,
+        "filters_applied": period.filters,
+        **({"approximate": False} if approx else {})
+    }
 
 @router.get("/daily-patterns")
-async def get_daily_patterns(db: Session = Depends(get_db)):
+async def get_daily_patterns(
+    approx: bool = APPROX_QUERY,
+    period: TimeRange = Depends(pickup_time_range),
+    db: Session = Depends(get_db)
+):
     """
     Get trip patterns by day of week
     """
-    query = text("""
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    where = " AND ".join(period.conditions()) or "1=1"
+    
+    if approx:
+        approximate = approximate_groups(
+            {"day_of_week": "day_of_week"}, ("trip_duration", "trip_speed_km_h", "passenger_count"),
+            where, period.params
+        )
+        if approximate is not None:
+            estimates, rate = approximate
+            daily_data = []
+            for (day,), estimate in sorted(estimates.items()):
+                daily_data.append({
+                    "day_of_week": day,
+                    "day_name": days[day] if day < len(days) else "Unknown",
+                    "trip_count": int(round(estimate["count"]["value"])),
+                    "avg_duration_minutes": round(estimate["trip_duration"]["value"] / 60, 2),
+                    "avg_speed_km_h": round(estimate["trip_speed_km_h"]["value"], 2),
+                    "avg_passengers": round(estimate["passenger_count"]["value"], 2),
+                    "sample_rows": estimate["sample_rows"],
+                    "confidence_intervals": {
+                        "trip_count": rounded_interval(estimate["count"], digits=0),
+                        "avg_duration_minutes": rounded_interval(estimate["trip_duration"], scale=1 / 60),
+                        "avg_speed_km_h": rounded_interval(estimate["trip_speed_km_h"]),
+                        "avg_passengers": rounded_interval(estimate["passenger_count"])
+                    }
+                })
+            return {"daily_patterns": daily_data, "approximate": True, "sample_rate": rate,
+                    "filters_applied": period.filters}
+    
+    query = text(f"""
     SELECT 
         day_of_week,
         COUNT(*) as trip_count,
@@ -47,14 +118,14 @@ async def get_daily_patterns(db: Session = Depends(get_db)):
         AVG(trip_speed_km_h) as avg_speed,
         AVG(passenger_count) as avg_passengers
     FROM trips
+    WHERE {where}
     GROUP BY day_of_week
     ORDER BY day_of_week
     """)
     
-    results = db.execute(query).fetchall()
+    results = db.execute(query, period.params).fetchall()
     
     daily_data = []
-    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
     
     for row in results:
         daily_data.append({
@@ -66,4 +137,8 @@ async def get_daily_patterns(db: Session = Depends(get_db)):
             "avg_passengers": round(row[4] or 0, 2)
         })
     
-    return {"daily_patterns": daily_data}
+    return {
+        "daily_patterns": daily_data,
+        "filters_applied": period.filters,
+        **({"approximate": False} if approx else {})
+    }
@@ -0,0 +1,71 @@
+import json
+import pandas as pd
+from fastapi import APIRouter, Request, HTTPException
+from starlette.concurrency import run_in_threadpool
+from core.config import settings
+from core.ingest import trip_writer, ingest_trips_total
+from data.cleaning import RAW_COLUMNS, validate_trips
+import logging
+
+router = APIRouter(tags=["trips"])
+logger = logging.getLogger(__name__)
+
+def prepare_trips(body):
+    """Parse and validate a JSON array of raw trips: (valid trips, {index: rejection reason}, trips received)"""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of trips")
+    if not isinstance(payload, list) or not all(isinstance(trip, dict) for trip in payload):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of trip objects")
+    if len(payload) > settings.INGEST_MAX_TRIPS_PER_REQUEST:
+        raise HTTPException(
+            status_code=413, detail=f"At most {settings.INGEST_MAX_TRIPS_PER_REQUEST} trips per request"
+        )
+
+    try:
+        trip_writer.check_database()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    try:
+        trips, rejected = validate_trips(pd.DataFrame.from_records(payload, columns=list(RAW_COLUMNS)))
+    except TypeError:
+        # nested objects or arrays as field values
+        raise HTTPException(status_code=400, detail="Trip fields must be strings, numbers or null")
+    return trips, rejected, len(payload)
+
+@router.post("/trips:batch")
+async def ingest_trip_batch(request: Request):
+    """
+    Append a batch of raw trips (a JSON array with the fields of data/raw/train.csv)
+
+    Trips are validated with the cleaning rules and the valid ones committed
+    before the response, grouped with other requests' batches. Every
+    aggregate reflects them from then on, except heatmap tiles and the column
+    store, which catch up within INGEST_REFRESH_SECONDS.
+    """
+    trips, rejected, received = await run_in_threadpool(prepare_trips, await request.body())
+
+    try:
+        result = await trip_writer.write(trips)
+    except Exception as e:
+        logger.error(f"Error in trip ingestion: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    rejected.update(result["rejected"])
+    if settings.METRICS_ENABLED:
+        ingest_trips_total.inc("accepted", amount=result["accepted"])
+        ingest_trips_total.inc("rejected", amount=len(rejected))
+
+    return {
+        "received": received,
+        "accepted": result["accepted"],
+        "rejected": len(rejected),
+        "rejections": [
+            {"index": index, "reason": reason}
+            for index, reason in sorted(rejected.items())[:settings.INGEST_MAX_REJECTIONS]
+        ],
+        "total_trips": result["total_trips"],
+        "data_version": result["data_version"]
+    }
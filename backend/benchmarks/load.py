@@ -0,0 +1,263 @@
+"""
+Closed-loop load generator for the API
+
+Replays the requests of dashboard page loads (loadDashboard in
+frontend/script.js) from --concurrency clients for --duration seconds. Every
+client sends its next request as soon as the previous one has returned, so
+the offered load adapts to what the server sustains. Runs either in-process
+against the ASGI app (default: no sockets, the app's own lifespan and
+warm-up) or against a running server (--url).
+
+--filters default replays the default dashboard; --filters mixed gives every
+page load a random day/hour filter, as users applying filters would.
+
+Reports throughput, p50/p95/p99/max latency and error rate per endpoint and
+overall, and writes them as JSON. --compare prints the change against an
+earlier report.
+
+Usage (from backend/):
+    python benchmarks/load.py --concurrency 16 --duration 30
+    python benchmarks/load.py --url http://127.0.0.1:8000 --concurrency 32 --filters mixed
+    python benchmarks/load.py --url http://127.0.0.1:8000 --compare results/load-before.json
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.append(BACKEND_DIR)
+
+from core.warmup import DASHBOARD_REQUESTS, dashboard_requests, asgi_get
+
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+FILTER_MODES = ("default", "mixed")
+PERCENTILES = (50, 95, 99)
+
+
+def page_loads(mode, rng):
+    """Endless page loads: the list of request paths of each"""
+    while True:
+        if mode == "default" or rng.random() < 0.5:
+            yield DASHBOARD_REQUESTS
+            continue
+        day = rng.choice([None] + list(range(7)))
+        hours = (None, None)
+        if rng.random() < 0.5:
+            hours = (rng.randrange(24), rng.randrange(24))
+        yield dashboard_requests(day, *hours)
+
+
+class Recorder:
+    """Latencies of successful requests and error counts, per endpoint"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, path, seconds, ok):
+        endpoint = path.partition("?")[0]
+        self.latencies.setdefault(endpoint, [])
+        self.errors.setdefault(endpoint, 0)
+        if ok:
+            self.latencies[endpoint].append(seconds)
+        else:
+            self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        endpoints = {
+            endpoint: latency_stats(self.latencies[endpoint], self.errors[endpoint], elapsed)
+            for endpoint in sorted(self.latencies)
+        }
+        overall = latency_stats(
+            [seconds for values in self.latencies.values() for seconds in values],
+            sum(self.errors.values()), elapsed
+        )
+        return overall, endpoints
+
+
+def latency_stats(latencies, errors, elapsed):
+    total = len(latencies) + errors
+    stats = {
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+    }
+    values = np.array(latencies) * 1000
+    for p in PERCENTILES:
+        stats[f"p{p}_ms"] = float(np.percentile(values, p)) if len(values) else None
+    stats["max_ms"] = float(values.max()) if len(values) else None
+    return stats
+
+
+async def client(fetch, mode, rng, stop_at, recorder):
+    """Closed loop: the next request goes out as soon as the previous one has returned"""
+    for paths in page_loads(mode, rng):
+        for path in paths:
+            if time.perf_counter() >= stop_at:
+                return
+            start = time.perf_counter()
+            try:
+                ok = await fetch(path) == 200
+            except Exception:
+                ok = False
+            recorder.add(path, time.perf_counter() - start, ok)
+
+
+async def run_clients(fetchers, mode, seed, duration):
+    recorder = Recorder()
+    stop_at = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(fetch, mode, random.Random(seed * 1000 + i), stop_at, recorder)
+        for i, fetch in enumerate(fetchers)
+    ))
+    return recorder.summary(time.perf_counter() - start)
+
+
+# targets ------------------------------------------------------------------------
+
+def asgi_fetchers(app, concurrency):
+    async def fetch(path):
+        status, _ = await asgi_get(app, path)
+        return status
+    return [fetch] * concurrency
+
+
+def http_fetchers(url, concurrency, executor):
+    """One keep-alive connection per client; the blocking calls run on the executor's threads"""
+    parts = urlsplit(url)
+    loop = asyncio.get_running_loop()
+
+    def make_fetch():
+        conn = [http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)]
+
+        def request(path):
+            try:
+                conn[0].request("GET", path)
+                response = conn[0].getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                # reconnect for the next request; this one counts as an error
+                conn[0].close()
+                conn[0] = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+                raise
+
+        async def fetch(path):
+            return await loop.run_in_executor(executor, request, path)
+        return fetch
+
+    return [make_fetch() for _ in range(concurrency)]
+
+
+async def wait_until_ready(fetch, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if await fetch("/health/ready") == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("target did not become ready")
+
+
+async def run_load(url=None, concurrency=16, duration=30.0, warmup=3.0, mode="default", seed=0):
+    """Run the load against url, or in-process against main.app when url is None; returns the report"""
+    async def measure(fetchers):
+        await wait_until_ready(fetchers[0])
+        if warmup > 0:
+            await run_clients(fetchers, mode, seed + 1, warmup)
+        return await run_clients(fetchers, mode, seed, duration)
+
+    if url is None:
+        from main import app
+        # the app's lifespan starts the same warm-up a served process runs
+        async with app.router.lifespan_context(app):
+            overall, endpoints = await measure(asgi_fetchers(app, concurrency))
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            overall, endpoints = await measure(http_fetchers(url, concurrency, executor))
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target": url or "asgi",
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "filters": mode,
+        "seed": seed,
+        "machine": {"cpus": os.cpu_count(), "python": platform.python_version()},
+        "overall": overall,
+        "endpoints": endpoints,
+    }
+
+
+# reporting ----------------------------------------------------------------------
+
+def _ms(value):
+    return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+
+
+def print_report(report, previous=None):
+    print(f"{report['target']}, {report['concurrency']} clients, {report['duration_s']:.0f}s, "
+          f"{report['filters']} filters")
+    header = f"{'endpoint':<40} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}"
+    if previous:
+        header += f" {'d req/s':>8} {'d p99':>8}"
+    print(header)
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, stats in rows:
+        line = (f"{name:<40} {stats['throughput_rps']:>8.1f} {_ms(stats['p50_ms'])} {_ms(stats['p95_ms'])} "
+                f"{_ms(stats['p99_ms'])} {_ms(stats['max_ms'])} {stats['error_rate']:>7.1%}")
+        old = previous["overall"] if previous and name == "overall" else (previous or {}).get("endpoints", {}).get(name)
+        if old:
+            line += f" {_change(stats['throughput_rps'], old['throughput_rps'])} {_change(stats['p99_ms'], old['p99_ms'])}"
+        print(line)
+
+
+def _change(new, old):
+    if not new or not old:
+        return f"{'-':>8}"
+    return f"{(new - old) / old:>+8.0%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop load test of the dashboard request mix")
+    parser.add_argument("--url", help="server to load, e.g. http://127.0.0.1:8000 (default: in-process ASGI app)")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of unmeasured load first")
+    parser.add_argument("--filters", choices=FILTER_MODES, default="default")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the mixed filter choices")
+    parser.add_argument("--output", help="report file (default: benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier report to print changes against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.url, args.concurrency, args.duration, args.warmup, args.filters, args.seed))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(report, previous)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,650 @@
+"""
+Offline benchmark suite with a stored baseline
+
+Times, on synthetic trips at several data scales:
+- algorithm: every public function of algorithm/custom_algorithm.py
+- cleaning:  every stage of data/cleaning.py TaxiDataCleaner, chained in
+             pipeline order (each stage gets the previous stage's output)
+- api:       every SQL path of api/*.py, as in-process requests through the
+             app against a synthetic SQLite database, once with the
+             precomputed tables and column store ("precomputed") and once
+             with the trips table only ("live" fallbacks)
+
+Each benchmark reports the best of --repeat runs. Results are written as
+JSON and compared against a baseline file; a benchmark more than
+--threshold slower than its baseline is a regression and makes the run exit
+with status 1. A fixed calibration workload is timed before and after every
+group, and each baseline timing is scaled by the ratio of the calibrations
+around it and around the current timing, so a slower or busier host is not
+reported as a regression; a warning is printed when the baseline comes from
+a different kind of host. Nothing touches db/mobility.db or the network.
+
+Quadratic and per-row Python code has a largest n (max_n) above which it is
+recorded as skipped; --no-limits lifts the caps.
+
+Usage (from backend/):
+    python benchmarks/suite.py                                  # 10^4..10^6, compare to baseline.json
+    python benchmarks/suite.py --sizes 10000000 --groups algorithm api
+    python benchmarks/suite.py --sizes 10000 100000 --save-baseline
+    python benchmarks/suite.py --input results/old.json --baseline results/new.json
+"""
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.append(BACKEND_DIR)
+
+from core.config import settings
+from algorithm import custom_algorithm as ca
+from algorithm.trip_batch import TripBatch
+from data.generate_trips import iter_trip_chunks, write_trips_csv
+
+DEFAULT_SIZES = [10**4, 10**5, 10**6]
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+GROUPS = ("algorithm", "cleaning", "api")
+K = 8  # clusters, as on the dashboard
+
+
+# synthetic data ---------------------------------------------------------------
+
+def synthetic_trips(n, seed=42):
+    """n clean trips from data/generate_trips.py as {column: array}, with the derived trips-table columns"""
+    chunks = list(iter_trip_chunks(n, seed))
+    data = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0] if name != "missing"}
+    distance = ca.haversine_distance(data["pickup_latitude"], data["pickup_longitude"],
+                                     data["dropoff_latitude"], data["dropoff_longitude"])
+    day_of_week = ((data["pickup_epoch"] // 86400 + 3) % 7).astype(np.int8)  # 1970-01-01 was a Thursday
+    data.update(
+        vendor_id=data["vendor_id"].astype(np.int8),
+        passenger_count=data["passenger_count"].astype(np.int8),
+        trip_duration=data["trip_duration"].astype(np.int32),
+        trip_distance_km=distance,
+        trip_speed_km_h=distance / (data["trip_duration"] / 3600),
+        pickup_hour=((data["pickup_epoch"] % 86400) // 3600).astype(np.int8),
+        day_of_week=day_of_week,
+        is_weekend=(day_of_week >= 5).astype(np.int8),
+    )
+    return data
+
+
+def datetime_strings(epochs):
+    """'YYYY-MM-DD HH:MM:SS' strings, the format of the raw CSV and the trips table"""
+    return np.char.replace(np.datetime_as_string(epochs.astype("datetime64[s]")), "T", " ")
+
+
+def trip_dicts(data, columns):
+    return [dict(zip(columns, row)) for row in zip(*(data[column].tolist() for column in columns))]
+
+
+# timing -------------------------------------------------------------------------
+
+def time_runs(fn, repeat, before=None):
+    """Seconds of each of `repeat` calls of fn; before() runs untimed ahead of every call"""
+    runs = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def calibrate(repeat=7):
+    """
+    Best-of-repeat seconds of a fixed workload mixing the kinds of work the
+    benchmarks do: a Python loop, a NumPy sort and a SQLite aggregate
+    """
+    values = np.random.default_rng(0).random(500_000)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (x REAL)")
+    conn.executemany("INSERT INTO t VALUES (?)", ((float(x),) for x in values[:100_000]))
+
+    def work():
+        sum(i * i for i in range(200_000))
+        np.sort(values)
+        conn.execute("SELECT CAST(x * 100 AS INTEGER), COUNT(*), SUM(x) FROM t GROUP BY 1").fetchall()
+
+    try:
+        return min(time_runs(work, repeat))
+    finally:
+        conn.close()
+
+
+def result(group, name, n, runs=None, skipped=None, error=None):
+    entry = {"key": f"{group}/{name}@{n}", "group": group, "name": name, "n": n}
+    if runs:
+        entry.update(seconds=min(runs), median=float(np.median(runs)), runs=[round(r, 6) for r in runs])
+    if skipped:
+        entry["skipped"] = skipped
+    if error:
+        entry["error"] = error
+    return entry
+
+
+# algorithm group ----------------------------------------------------------------
+
+class Case:
+    """One benchmark: setup(data, n) returns the zero-argument call to time"""
+
+    def __init__(self, name, setup, max_n=None, covers=None):
+        self.name = name
+        self.setup = setup
+        self.max_n = max_n
+        self.covers = covers or name  # custom_algorithm function it measures
+
+
+def _coords(data, prefix="pickup"):
+    return np.column_stack([data[f"{prefix}_latitude"], data[f"{prefix}_longitude"]])
+
+
+def _batches(data, size=65536):
+    coords, durations = _coords(data), data["trip_duration"]
+    return lambda: ((coords[i:i + size], durations[i:i + size]) for i in range(0, len(coords), size))
+
+
+def _cluster_map(data, n):
+    labels = np.random.default_rng(0).integers(0, K, size=n)
+    trips = trip_dicts(data, ["trip_duration"])
+    clusters = {}
+    for label, trip in zip(labels.tolist(), trips):
+        clusters.setdefault(label, []).append(trip)
+    return clusters
+
+
+def _timestamp_dicts(data):
+    stamps = datetime_strings(data["pickup_epoch"]).tolist()
+    return [{"pickup_datetime": stamp} for stamp in stamps]
+
+
+def _labels(data):
+    return ca.kmeans_fit(_coords(data), K)[1]
+
+
+SORT_COLUMNS = ["id", "trip_duration", "trip_distance_km", "trip_speed_km_h"]
+CLUSTER_COLUMNS = ["id", "pickup_latitude", "pickup_longitude", "trip_duration"]
+
+ALGORITHM_CASES = [
+    Case("pickup_hour_frequency[dicts]", lambda d, n: (
+        lambda trips=_timestamp_dicts(d): ca.pickup_hour_frequency(trips)), max_n=10**6,
+        covers="pickup_hour_frequency"),
+    Case("pickup_hour_frequency[batch]", lambda d, n: (
+        lambda batch=TripBatch({"pickup_hour": d["pickup_hour"]}): ca.pickup_hour_frequency(batch)),
+        covers="pickup_hour_frequency"),
+    Case("hour_histogram", lambda d, n: lambda: ca.hour_histogram(d["pickup_hour"])),
+    Case("hour_histogram_from_counts", lambda d, n: (
+        lambda counts=list(enumerate(np.bincount(d["pickup_hour"], minlength=24).tolist())):
+        ca.hour_histogram_from_counts(counts))),
+    Case("rank_clusters_by_total_duration", lambda d, n: (
+        lambda clusters=_cluster_map(d, n): ca.rank_clusters_by_total_duration(clusters)), max_n=10**6),
+    Case("aggregate_cluster_durations", lambda d, n: (
+        lambda labels=np.random.default_rng(0).integers(0, K, size=n):
+        ca.aggregate_cluster_durations(labels, d["trip_duration"], K))),
+    Case("rank_cluster_totals", lambda d, n: (
+        lambda totals=ca.aggregate_cluster_durations(np.random.default_rng(0).integers(0, K, size=n),
+                                                     d["trip_duration"], K):
+        ca.rank_cluster_totals(totals))),
+    Case("manual_kmeans_clustering", lambda d, n: (
+        lambda trips=trip_dicts(d, CLUSTER_COLUMNS): ca.manual_kmeans_clustering(trips, K)), max_n=10**4),
+    Case("kmeans_plus_plus_init", lambda d, n: lambda coords=_coords(d): ca.kmeans_plus_plus_init(coords, K)),
+    Case("kmeans_fit", lambda d, n: lambda coords=_coords(d): ca.kmeans_fit(coords, K)),
+    Case("hamerly_kmeans_fit", lambda d, n: lambda coords=_coords(d): ca.hamerly_kmeans_fit(coords, K)),
+    Case("group_indices_by_label", lambda d, n: lambda labels=_labels(d): ca.group_indices_by_label(labels, K)),
+    Case("kmeans_cluster_summary", lambda d, n: (
+        lambda coords=_coords(d): ca.kmeans_cluster_summary(coords, d["trip_duration"], K))),
+    Case("minibatch_kmeans", lambda d, n: lambda source=_batches(d): ca.minibatch_kmeans(source, K)),
+    Case("vectorized_kmeans_clustering", lambda d, n: (
+        lambda trips=trip_dicts(d, CLUSTER_COLUMNS): ca.vectorized_kmeans_clustering(trips, K)), max_n=10**6),
+    Case("selection_sort_trips", lambda d, n: (
+        lambda trips=trip_dicts(d, SORT_COLUMNS): ca.selection_sort_trips(trips, "trip_duration")), max_n=10**4),
+    Case("custom_trip_sorter", lambda d, n: (
+        lambda trips=trip_dicts(d, SORT_COLUMNS): ca.custom_trip_sorter(trips)), max_n=10**4),
+    Case("top_k_indices", lambda d, n: lambda: ca.top_k_indices(d["trip_duration"], 100)),
+    Case("top_k_trips[dicts]", lambda d, n: (
+        lambda trips=trip_dicts(d, SORT_COLUMNS): ca.top_k_trips(trips, 100)), max_n=10**6,
+        covers="top_k_trips"),
+    Case("top_k_trips[batch]", lambda d, n: (
+        lambda batch=TripBatch({c: d[c] for c in SORT_COLUMNS}): ca.top_k_trips(batch, 100)),
+        covers="top_k_trips"),
+    Case("top_k_trip_batches", lambda d, n: (
+        lambda batch=TripBatch({c: d[c] for c in SORT_COLUMNS}): ca.top_k_trip_batches(
+            (batch[start:start + 65536] for start in range(0, len(batch), 65536)), 100))),
+    Case("haversine_distance", lambda d, n: lambda: ca.haversine_distance(
+        d["pickup_latitude"], d["pickup_longitude"], d["dropoff_latitude"], d["dropoff_longitude"])),
+]
+
+# public functions with nothing to time
+ALGORITHM_EXCLUDED = {"calculate_complexity_metrics"}
+
+
+def check_algorithm_coverage():
+    """Every public function of custom_algorithm needs a case (or an explicit exclusion)"""
+    functions = {
+        name for name, member in inspect.getmembers(ca, inspect.isfunction)
+        if member.__module__ == ca.__name__ and not name.startswith("_")
+    }
+    missing = functions - ALGORITHM_EXCLUDED - {case.covers for case in ALGORITHM_CASES}
+    if missing:
+        raise SystemExit(f"custom_algorithm functions without a benchmark: {', '.join(sorted(missing))}")
+
+
+def run_algorithm_group(n, repeat, limits, pattern):
+    data = synthetic_trips(n)
+    results = []
+    for case in ALGORITHM_CASES:
+        if pattern and pattern not in case.name:
+            continue
+        if limits and case.max_n is not None and n > case.max_n:
+            results.append(result("algorithm", case.name, n, skipped=f"n > max_n={case.max_n}"))
+            continue
+        try:
+            call = case.setup(data, n)
+            results.append(result("algorithm", case.name, n, runs=time_runs(call, repeat)))
+        except Exception as e:
+            results.append(result("algorithm", case.name, n, error=str(e)))
+        report(results[-1])
+    return results
+
+
+# cleaning group -----------------------------------------------------------------
+
+CLEANING_DIRTY_FRACTION = 0.02
+
+# TaxiDataCleaner stages in pipeline order
+CLEANING_STAGES = [
+    "load_raw_data",
+    "_handle_missing_values",
+    "_remove_duplicates",
+    "_filter_valid_coordinates",
+    "_filter_valid_durations",
+    "_process_timestamps",
+    "_calculate_derived_features",
+    "_filter_impossible_trips",
+    "_sample_data_if_needed",
+    "_final_validation",
+    "save_cleaned_data",
+]
+
+
+def run_cleaning_group(n, repeat, limits, pattern):
+    from data.cleaning import TaxiDataCleaner
+    results = []
+    workdir = tempfile.mkdtemp(prefix="bench-clean-")
+    try:
+        cleaner = TaxiDataCleaner()
+        cleaner.raw_data_path = os.path.join(workdir, "train.csv")
+        cleaner.cleaned_data_path = os.path.join(workdir, "clean.csv")
+        cleaner.log_path = os.path.join(workdir, "clean_log.txt")
+        write_trips_csv(cleaner.raw_data_path, n, dirty_fraction=CLEANING_DIRTY_FRACTION)
+
+        frame = None
+        for name in CLEANING_STAGES:
+            stage = getattr(cleaner, name)
+            state = {}
+            if name == "load_raw_data":
+                before, call = None, lambda: state.update(output=stage())
+            elif name == "save_cleaned_data":
+                before, call = None, lambda: stage(frame)
+            else:
+                # stages may add columns in place, so every run gets a fresh copy of the input
+                before = lambda: state.update(input=frame.copy())
+                call = lambda: state.update(output=stage(state["input"]))
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    entry = result("cleaning", name, n, runs=time_runs(call, repeat, before))
+                frame = state.get("output", frame)
+            except Exception as e:
+                entry = result("cleaning", name, n, error=str(e))
+            if not pattern or pattern in name:
+                results.append(entry)
+                report(entry)
+            if "error" in entry:
+                break
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# api group ----------------------------------------------------------------------
+
+# one request per SQL path of api/*.py (filters and modes that change the query)
+API_CASES = [
+    ("summary/overview", "/api/v1/summary/overview"),
+    ("summary/overview[filtered]", "/api/v1/summary/overview?hour_start=7&hour_end=10&day_of_week=2&passenger_count=1"),
+    ("summary/overview[approx]", "/api/v1/summary/overview?approx=true"),
+    ("summary/overview[range]", "/api/v1/summary/overview?start=2016-03-01&end=2016-03-07"),
+    ("summary/busiest-hour", "/api/v1/summary/busiest-hour"),
+    ("summary/busiest-hour[day]", "/api/v1/summary/busiest-hour?day_of_week=4"),
+    ("summary/percentiles", "/api/v1/summary/percentiles"),
+    ("summary/percentiles[filtered]", "/api/v1/summary/percentiles?hour_start=17&hour_end=19&day_of_week=1"),
+    ("summary/percentiles[range]", "/api/v1/summary/percentiles?start=2016-03-01&end=2016-03-07"),
+    ("temporal/hourly-distribution", "/api/v1/temporal/hourly-distribution"),
+    ("temporal/hourly-distribution[approx]", "/api/v1/temporal/hourly-distribution?approx=true"),
+    ("temporal/hourly-distribution[range]", "/api/v1/temporal/hourly-distribution?start=2016-03-01&end=2016-03-07"),
+    ("temporal/daily-patterns", "/api/v1/temporal/daily-patterns"),
+    ("temporal/daily-patterns[approx]", "/api/v1/temporal/daily-patterns?approx=true"),
+    ("flows/top-pairs", "/api/v1/flows/top-pairs?limit=15"),
+    ("flows/top-pairs[hours]", "/api/v1/flows/top-pairs?limit=15&hour_start=7&hour_end=10"),
+    ("flows/top-pairs[approx]", "/api/v1/flows/top-pairs?limit=15&approx=true"),
+    ("flows/top-pairs[range]", "/api/v1/flows/top-pairs?limit=15&start=2016-03-01&end=2016-03-07"),
+    ("clusters/pickup", "/api/v1/clusters/pickup?n_clusters=8"),
+    ("clusters/pickup[pyramid]", "/api/v1/clusters/pickup?n_clusters=20&zoom=3"),
+    ("clusters/pickup[bbox]", "/api/v1/clusters/pickup?n_clusters=20&bbox=-74.02,40.70,-73.93,40.80"),
+    ("clusters/pickup[range]", "/api/v1/clusters/pickup?n_clusters=8&start=2016-03-01&end=2016-03-07"),
+    ("clusters/pickup[pyramid,range]", "/api/v1/clusters/pickup?n_clusters=20&zoom=3&start=2016-03-01&end=2016-03-07"),
+    ("custom/hourly-pickups", "/api/v1/custom/hourly-pickups"),
+    ("custom/hourly-pickups[filtered]", "/api/v1/custom/hourly-pickups?is_weekend=false&start=2016-02-01&end=2016-03-31"),
+    ("custom/cluster-ranking[full]", "/api/v1/custom/cluster-ranking?n_clusters=5&method=full"),
+    ("custom/cluster-ranking[accelerated]", "/api/v1/custom/cluster-ranking?n_clusters=5&method=accelerated"),
+    ("custom/cluster-ranking[minibatch]", "/api/v1/custom/cluster-ranking?n_clusters=5&method=minibatch"),
+    ("custom/trip-sorting", "/api/v1/custom/trip-sorting?sort_by=duration&order=desc&limit=10"),
+    ("custom/peak-analysis", "/api/v1/custom/peak-analysis?bucket_minutes=30&day_of_week=0"),
+    ("heatmap/tile[z0]", "/api/v1/heatmap/0/0/0"),
+    ("heatmap/tile[z4,hour]", "/api/v1/heatmap/4/4/6?layer=dropoff&hour=18"),
+]
+
+# routes that run no SQL over the trips
+API_EXCLUDED = {"/", "/health", "/health/ready", "/metrics", "/debug/top-queries", "/api/v1/custom/algorithm-info"}
+
+
+def build_api_database(data, path, precomputed, column_dir):
+    """Write the synthetic trips into a fresh database built from schema.sql"""
+    conn = sqlite3.connect(path)
+    with open(os.path.join(BACKEND_DIR, "db", "schema.sql")) as f:
+        conn.executescript(f.read())
+    pickup = datetime_strings(data["pickup_epoch"])
+    dropoff = datetime_strings(data["dropoff_epoch"])
+    month = pickup.astype("U7")
+    columns = [data["id"].tolist(), data["vendor_id"].tolist(), pickup.tolist(), dropoff.tolist(),
+               data["passenger_count"].tolist(), data["pickup_longitude"].tolist(),
+               data["pickup_latitude"].tolist(), data["dropoff_longitude"].tolist(),
+               data["dropoff_latitude"].tolist(), data["trip_duration"].tolist(),
+               data["trip_distance_km"].tolist(), data["trip_speed_km_h"].tolist(),
+               data["pickup_hour"].tolist(), data["day_of_week"].tolist(), data["is_weekend"].tolist(),
+               [int(m[5:]) for m in month.tolist()], data["pickup_epoch"].tolist(), data["dropoff_epoch"].tolist()]
+    conn.executemany("""
+        INSERT INTO trips (id, vendor_id, pickup_datetime, dropoff_datetime, passenger_count,
+                           pickup_longitude, pickup_latitude, dropoff_longitude, dropoff_latitude,
+                           store_and_fwd_flag, trip_duration, trip_distance_km, trip_speed_km_h,
+                           pickup_hour, day_of_week, is_weekend, pickup_month, pickup_year,
+                           pickup_epoch, dropoff_epoch)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'N', ?, ?, ?, ?, ?, ?, ?, 2016, ?, ?)
+    """, zip(*columns))
+    conn.execute("UPDATE system_metadata SET value = ? WHERE key = 'total_trips'", (str(len(data["id"])),))
+    conn.execute("UPDATE system_metadata SET value = datetime('now') WHERE key = 'last_data_load'")
+    if not precomputed:
+        # schema.sql creates the precomputed tables empty; without them the API takes its live paths
+        derived = conn.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type = 'table' AND name NOT IN ('trips', 'system_metadata') AND name NOT LIKE 'sqlite_%'
+        """).fetchall()
+        for (table,) in derived:
+            conn.execute(f'DROP TABLE "{table}"')
+    conn.commit()
+    conn.close()
+    if not precomputed:
+        return
+
+    from db.db_setup import DatabaseSetup
+    setup = DatabaseSetup()
+    setup.db_path = path
+    settings.COLUMN_STORE_DIR = column_dir
+    with contextlib.redirect_stdout(io.StringIO()):
+        for build in (setup.build_column_store, setup.build_pickup_pyramid, setup.build_minute_series,
+                      setup.build_quantile_sketches, setup.build_heatmap_tiles, setup.build_sample_tables):
+            if not build():
+                raise RuntimeError(f"{build.__name__} failed on the benchmark database")
+
+
+def reset_api_caches():
+    """Drop the per-version caches so every run pays for its SQL"""
+    from api import custom, heatmap, summary
+    custom._minute_series_cache.clear()
+    summary._sketch_cache.clear()
+    summary._merged_quantiles.cache_clear()
+    heatmap._live_tile.cache_clear()
+
+
+def api_worker(db_path, column_dir, variant, n, repeat, pattern):
+    """Time API_CASES against one database; runs in its own process (the engine binds at import)"""
+    import asyncio
+    settings.DATABASE_URL = f"sqlite:///{db_path}"
+    settings.COLUMN_STORE_DIR = column_dir
+    settings.SLOW_QUERY_LOG_ENABLED = False
+    from fastapi.routing import APIRoute
+    from core.warmup import asgi_get
+    from main import app
+
+    routes = {route.path for route in app.routes if isinstance(route, APIRoute)}
+    covered = {path.split("?")[0] for _, path in API_CASES}
+    missing = [route for route in routes - API_EXCLUDED
+               if not any(_route_matches(route, path) for path in covered)]
+    if missing:
+        raise SystemExit(f"API routes without a benchmark case: {', '.join(sorted(missing))}")
+
+    async def run():
+        results = []
+        for name, path in API_CASES:
+            if pattern and pattern not in name:
+                continue
+            label = f"{name}[{variant}]" if "[" not in name else f"{name[:-1]},{variant}]"
+            status, body = await asgi_get(app, path)  # untimed: page cache, imports
+            if status != 200:
+                results.append(result("api", label, n, error=f"HTTP {status}: {body[:200].decode(errors='replace')}"))
+                continue
+            runs = []
+            for _ in range(repeat):
+                reset_api_caches()
+                start = time.perf_counter()
+                await asgi_get(app, path)
+                runs.append(time.perf_counter() - start)
+            results.append(result("api", label, n, runs=runs))
+        return results
+
+    return asyncio.run(run())
+
+
+def _route_matches(route, path):
+    route_parts, path_parts = route.strip("/").split("/"), path.strip("/").split("/")
+    return len(route_parts) == len(path_parts) and all(
+        r == p or r.startswith("{") for r, p in zip(route_parts, path_parts))
+
+
+def run_api_group(n, repeat, limits, pattern):
+    results = []
+    workdir = tempfile.mkdtemp(prefix="bench-api-")
+    try:
+        data = synthetic_trips(n)
+        for variant in ("precomputed", "live"):
+            db_path = os.path.join(workdir, f"{variant}.db")
+            column_dir = os.path.join(workdir, f"{variant}-columns")
+            build_api_database(data, db_path, variant == "precomputed", column_dir)
+            command = [sys.executable, os.path.abspath(__file__), "--api-worker", db_path, column_dir, variant,
+                       "--sizes", str(n), "--repeat", str(repeat)]
+            if pattern:
+                command += ["--filter", pattern]
+            process = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+            if process.returncode != 0:
+                raise SystemExit(f"API worker failed ({variant}, n={n}):\n{process.stderr[-2000:]}")
+            for entry in json.loads(process.stdout.strip().splitlines()[-1]):
+                results.append(entry)
+                report(entry)
+            os.remove(db_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# results and baseline -----------------------------------------------------------
+
+def report(entry):
+    if "seconds" in entry:
+        status = f"{entry['seconds'] * 1000:>11.2f} ms"
+    elif "skipped" in entry:
+        status = f"{'skipped':>14}"
+    else:
+        status = f"{'error':>14}  {entry['error'][:80]}"
+    print(f"  {entry['group']:<10} {entry['name']:<48} {entry['n']:>10,} {status}", flush=True)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "processor": platform.processor() or None,
+        "cpus": os.cpu_count(),
+    }
+
+
+# host properties that make timings incomparable when they differ
+HOST_KEYS = ("machine", "processor", "cpus", "python", "numpy", "sqlite")
+
+
+def host_differences(current, baseline):
+    """[(key, baseline value, current value)] of the host properties that differ"""
+    current_env, baseline_env = current.get("environment", {}), baseline.get("environment", {})
+    return [(key, baseline_env.get(key), current_env.get(key)) for key in HOST_KEYS
+            if baseline_env.get(key) != current_env.get(key)]
+
+
+def calibration_scale(entry, previous):
+    """Factor applied to a baseline timing: current calibration / baseline calibration, 1 when either is missing"""
+    now, then = entry.get("calibration_seconds"), previous.get("calibration_seconds")
+    return now / then if now and then else 1.0
+
+
+def compare(current, baseline, threshold, min_delta):
+    """
+    (regressions, rows) of current vs baseline results
+
+    Baseline timings are multiplied by calibration_scale first. A benchmark
+    regresses when it is more than `threshold` (a fraction) slower than its
+    baseline and at least `min_delta` seconds slower, so millisecond-level
+    noise never fails a run.
+    """
+    base = {entry["key"]: entry for entry in baseline["results"] if "seconds" in entry}
+    rows, regressions = [], []
+    for entry in current["results"]:
+        if "seconds" not in entry:
+            continue
+        previous = base.get(entry["key"])
+        if previous is None:
+            rows.append((entry["key"], None, entry["seconds"], None, "new"))
+            continue
+        previous = dict(previous, seconds=previous["seconds"] * calibration_scale(entry, previous))
+        ratio = entry["seconds"] / previous["seconds"] if previous["seconds"] > 0 else float("inf")
+        slower = ratio > 1 + threshold and entry["seconds"] - previous["seconds"] >= min_delta
+        faster = ratio < 1 / (1 + threshold) and previous["seconds"] - entry["seconds"] >= min_delta
+        verdict = "REGRESSION" if slower else "faster" if faster else "ok"
+        rows.append((entry["key"], previous["seconds"], entry["seconds"], ratio, verdict))
+        if slower:
+            regressions.append(entry["key"])
+    return regressions, rows
+
+
+def print_comparison(rows, baseline, differences=()):
+    env = baseline.get("environment", {})
+    print(f"\nCompared with baseline from {env.get('created_at')} (commit {env.get('commit')}, "
+          f"{env.get('cpus')} CPUs, Python {env.get('python')}); baseline column scaled by the calibration workload")
+    if differences:
+        changed = ", ".join(f"{key} {before} -> {after}" for key, before, after in differences)
+        print(f"WARNING: the baseline was recorded on a different host ({changed}); "
+              "calibration only partly corrects for that, regenerate it here with --save-baseline")
+    print(f"{'benchmark':<72} {'baseline':>11} {'current':>11} {'ratio':>7}")
+    for key, previous, current, ratio, verdict in rows:
+        before = f"{previous * 1000:.2f}ms" if previous is not None else "-"
+        change = f"{ratio:.2f}x" if ratio is not None else "-"
+        print(f"{key:<72} {before:>11} {current * 1000:>9.2f}ms {change:>7}  {verdict}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite with baseline comparison")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of trips")
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--filter", help="only benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark (best is kept)")
+    parser.add_argument("--no-limits", action="store_true", help="also run capped benchmarks above their max_n")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-delta", type=float, default=0.010, help="ignore slowdowns below this many seconds")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--input", help="compare an existing results file instead of running")
+    parser.add_argument("--api-worker", nargs=3, metavar=("DB", "COLUMNS", "VARIANT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.api_worker:
+        with contextlib.redirect_stdout(sys.stderr):
+            entries = api_worker(*args.api_worker, args.sizes[0], args.repeat, args.filter)
+        print(json.dumps(entries))
+        return
+
+    if args.input:
+        with open(args.input) as f:
+            current = json.load(f)
+    else:
+        check_algorithm_coverage()
+        runners = {"algorithm": run_algorithm_group, "cleaning": run_cleaning_group, "api": run_api_group}
+        current = {"environment": environment(), "repeat": args.repeat, "results": []}
+        for n in args.sizes:
+            print(f"n = {n:,}")
+            for group in args.groups:
+                # host speed around this group, averaged over both ends
+                before = calibrate()
+                entries = runners[group](n, args.repeat, not args.no_limits, args.filter)
+                calibration = (before + calibrate()) / 2
+                for entry in entries:
+                    entry["calibration_seconds"] = calibration
+                current["results"] += entries
+
+        output = args.baseline if args.save_baseline else args.output
+        if output is None:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(output, "w") as f:
+            json.dump(current, f, indent=1)
+        print(f"\nResults written to {output}")
+        if args.save_baseline:
+            return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions, rows = compare(current, baseline, args.threshold, args.min_delta)
+    print_comparison(rows, baseline, host_differences(current, baseline))
+    errors = [entry["key"] for entry in current["results"] if "error" in entry]
+    if errors:
+        print(f"\n{len(errors)} benchmark(s) failed: {', '.join(errors)}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+    if regressions or errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark top_k_trips / top_k_indices against custom_trip_sorter
+
+Usage (from backend/):
+    python benchmarks/top_k.py --sizes 1000 10000 100000 1000000 10000000 --k 100
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# add the parent directory to path to import the algorithm module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from algorithm.custom_algorithm import custom_trip_sorter, top_k_trips, top_k_indices
+
+
+def generate_trips(n, seed=42):
+    """Yield n synthetic trip dictionaries without keeping them in memory"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, n, 100000):
+        durations = rng.integers(30, 10800, size=min(100000, n - start))
+        for offset, duration in enumerate(durations.tolist()):
+            yield {"id": start + offset, "trip_duration": duration}
+
+
+def time_call(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Top-k vs insertion sort benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10**3, 10**4, 10**5, 10**6, 10**7])
+    parser.add_argument("--k", type=int, default=100)
+    parser.add_argument("--max-insertion-n", type=int, default=10**4,
+                        help="largest n to run the O(n^2) insertion sort on")
+    args = parser.parse_args()
+
+    print(f"{'n':>10} {'insertion sort':>16} {'heap (dicts)':>14} {'partition (array)':>18}")
+    for n in args.sizes:
+        if n <= args.max_insertion_n:
+            trips = list(generate_trips(n))
+            insertion = f"{time_call(lambda: custom_trip_sorter(trips)[:args.k]):.4f}s"
+        else:
+            insertion = "skipped"
+
+        heap = time_call(lambda: top_k_trips(generate_trips(n), args.k))
+        durations = np.random.default_rng(42).integers(30, 10800, size=n)
+        partition = time_call(lambda: top_k_indices(durations, args.k))
+        print(f"{n:>10} {insertion:>16} {heap:>13.4f}s {partition:>17.4f}s")
+
+    print("\nheap timings include generating the trip dictionaries on the fly")
+
+
+if __name__ == "__main__":
+    main()
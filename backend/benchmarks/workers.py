@@ -0,0 +1,59 @@
+"""
+Benchmark API throughput against the number of serve.py worker processes
+
+Starts `serve.py --workers N` for every N, replays the requests one dashboard
+page load makes (frontend/script.js, default filters) from concurrent
+keep-alive clients for a fixed time with the load.py generator, and reports
+requests/s and latency percentiles.
+
+Usage (from backend/):
+    python benchmarks/workers.py --workers 1 2 4 --clients 16 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from load import run_load
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput vs worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent keep-alive clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load per worker count")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.duration:.0f}s per run")
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for workers in args.workers:
+        server = subprocess.Popen(
+            [sys.executable, "serve.py", "--workers", str(workers), "--port", str(args.port)],
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            report = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.clients, args.duration, args.warmup))
+            result = {"workers": workers, **report["overall"]}
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        results.append(result)
+        print(f"{workers:>8} {result['throughput_rps']:>10.1f} {result['p50_ms']:>10.1f} "
+              f"{result['p99_ms']:>10.1f} {result['errors']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "clients": args.clients, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
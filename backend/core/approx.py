@@ -0,0 +1,143 @@
+"""
+Approximate query answers from stratified sample tables
+
+db_setup builds one sample table per rate in settings.APPROX_SAMPLE_RATES.
+Trips are stratified by (pickup_hour, day_of_week, passenger_count); every
+stratum keeps ceil(rate * size) uniformly chosen trips (at least
+APPROX_MIN_PER_STRATUM) and each sampled row carries its stratum's size and
+sample count, so estimates are reweighted per stratum.
+"""
+import math
+import numpy as np
+from core.config import settings
+from core.database import execute_query, table_exists
+
+STRATUM_COLUMNS = ("pickup_hour", "day_of_week", "passenger_count")
+
+
+def sample_table_name(rate):
+    """trips_sample_1000 holds the 0.1% sample, trips_sample_100 the 1% one"""
+    return f"trips_sample_{int(round(1 / rate))}"
+
+
+def stratified_sample(strata, rate, min_per_stratum=None, seed=42):
+    """
+    Choose a stratified random sample
+
+    Args:
+        strata: integer stratum id per trip
+        rate: sampling rate per stratum
+
+    Returns:
+        (indices, stratum_size, stratum_samples) arrays aligned with the chosen trips
+    """
+    min_per_stratum = settings.APPROX_MIN_PER_STRATUM if min_per_stratum is None else min_per_stratum
+    strata = np.asarray(strata)
+    _, group, sizes = np.unique(strata, return_inverse=True, return_counts=True)
+    group = group.reshape(-1)
+    quota = np.minimum(sizes, np.maximum(np.ceil(sizes * rate).astype(np.int64), min_per_stratum))
+
+    # random priority per trip; the lowest `quota` priorities of each stratum are kept
+    priority = np.random.default_rng(seed).random(len(strata))
+    order = np.lexsort((priority, group))
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    rank = np.arange(len(order)) - starts[group[order]]
+    chosen = np.sort(order[rank < quota[group[order]]])
+    return chosen, sizes[group[chosen]], quota[group[chosen]]
+
+
+def _interval(value, variance, floor=None):
+    half_width = settings.APPROX_CONFIDENCE_Z * math.sqrt(max(variance, 0.0))
+    low = value - half_width if floor is None else max(floor, value - half_width)
+    return {"value": value, "ci_low": low, "ci_high": value + half_width}
+
+
+def estimate_groups(rows, group_columns, metrics):
+    """
+    Stratified estimates per output group
+
+    rows are per (group, stratum) aggregates with stratum_size (N_h),
+    stratum_samples (n_h), sample_count (m) and sum_<metric>/sumsq_<metric>.
+    Counts are Horvitz-Thompson totals; means are ratio estimators with a
+    linearized variance. Every estimate comes as {"value", "ci_low", "ci_high"}.
+    """
+    groups = {}
+    for row in rows:
+        key = tuple(row[column] for column in group_columns)
+        groups.setdefault(key, []).append(row)
+
+    estimates = {}
+    for key, strata in groups.items():
+        count = 0.0
+        count_variance = 0.0
+        totals = {metric: 0.0 for metric in metrics}
+        for row in strata:
+            size, samples, matched = row["stratum_size"], row["stratum_samples"], row["sample_count"]
+            weight = size / samples
+            count += weight * matched
+            if samples > 1:
+                # domain indicator variance inside the stratum
+                s2 = (matched - matched * matched / samples) / (samples - 1)
+                count_variance += size * size * (1 - samples / size) * s2 / samples
+            for metric in metrics:
+                totals[metric] += weight * (row[f"sum_{metric}"] or 0)
+
+        result = {"count": _interval(count, count_variance, floor=0.0), "sample_rows": sum(row["sample_count"] for row in strata)}
+        for metric in metrics:
+            mean = totals[metric] / count if count else 0.0
+            variance = 0.0
+            for row in strata:
+                size, samples, matched = row["stratum_size"], row["stratum_samples"], row["sample_count"]
+                if samples < 2:
+                    continue
+                # residuals e = (y - mean) inside the group, 0 outside it
+                sum_e = (row[f"sum_{metric}"] or 0) - mean * matched
+                sum_e2 = (row[f"sumsq_{metric}"] or 0) - 2 * mean * (row[f"sum_{metric}"] or 0) + mean * mean * matched
+                s2 = (sum_e2 - sum_e * sum_e / samples) / (samples - 1)
+                variance += size * size * (1 - samples / size) * s2 / samples
+            result[metric] = _interval(mean, variance / (count * count) if count else 0.0)
+        estimates[key] = result
+    return estimates
+
+
+def approximate_groups(group_exprs, metrics, where="1=1", params=None, min_rows=None):
+    """
+    Estimate per-group counts and metric means from the smallest adequate sample
+
+    Args:
+        group_exprs: {output column: SQL expression} to group by (may be empty)
+        metrics: trip columns to average
+        where: SQL filter on trip columns
+
+    Returns:
+        (estimates, sample_rate) or None when no sample table exists or none
+        has at least min_rows matching rows (callers then run the exact query)
+    """
+    min_rows = settings.APPROX_MIN_SAMPLE_ROWS if min_rows is None else min_rows
+    select_groups = "".join(f"{expr} AS {name}, " for name, expr in group_exprs.items())
+    group_by = ", ".join(list(group_exprs.values()) + list(STRATUM_COLUMNS))
+    sums = ", ".join(
+        f"SUM({metric}) AS sum_{metric}, SUM({metric} * {metric}) AS sumsq_{metric}" for metric in metrics
+    )
+
+    for rate in sorted(settings.APPROX_SAMPLE_RATES):
+        table = sample_table_name(rate)
+        if not table_exists(table):
+            continue
+        rows = execute_query(f"""
+            SELECT {select_groups}
+                   MAX(stratum_size) AS stratum_size,
+                   MAX(stratum_samples) AS stratum_samples,
+                   COUNT(*) AS sample_count{", " + sums if sums else ""}
+            FROM {table}
+            WHERE {where}
+            GROUP BY {group_by}
+        """, params or {})
+        if sum(row["sample_count"] for row in rows) >= min_rows:
+            return estimate_groups(rows, list(group_exprs), metrics), rate
+    return None
+
+
+def rounded_interval(estimate, scale=1.0, digits=2):
+    """[ci_low, ci_high] of an estimate, scaled (e.g. seconds to minutes) and rounded"""
+    return [round(estimate["ci_low"] * scale, digits), round(estimate["ci_high"] * scale, digits)]
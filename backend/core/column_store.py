@@ -0,0 +1,202 @@
+"""
+Memory-mapped column store of the trips table
+
+db_setup writes one .npy file per column (trips in rowid order) plus a
+manifest.json recording the row count, dtypes and the data version it was
+built from. Readers map the files with np.load(mmap_mode="r"), so a column is
+a zero-copy array backed by the page cache: scanning every trip for
+clustering or histograms touches no Python objects per row.
+"""
+import json
+import os
+import shutil
+import time
+import numpy as np
+from core.config import settings
+from algorithm.trip_batch import TRIP_COLUMN_DTYPES, TripBatch
+
+MANIFEST_NAME = "manifest.json"
+STORE_FORMAT = 1
+NULL_INTEGER = -1  # integer columns store NULL as -1, float columns as NaN
+
+# stored column -> SQL expression over the trips table
+STORE_COLUMNS = {
+    "pickup_latitude": "pickup_latitude",
+    "pickup_longitude": "pickup_longitude",
+    "dropoff_latitude": "dropoff_latitude",
+    "dropoff_longitude": "dropoff_longitude",
+    "trip_duration": "trip_duration",
+    "trip_distance_km": "trip_distance_km",
+    "trip_speed_km_h": "trip_speed_km_h",
+    "passenger_count": "passenger_count",
+    "pickup_hour": "pickup_hour",
+    "day_of_week": "day_of_week",
+    "pickup_epoch": "pickup_epoch",
+}
+
+
+def _select_expression(name):
+    expression = STORE_COLUMNS[name]
+    if np.issubdtype(TRIP_COLUMN_DTYPES[name], np.integer):
+        expression = f"COALESCE({expression}, {NULL_INTEGER})"
+    return f"{expression} AS {name}"
+
+
+def write_column_store(conn, path, data_version, batch_size=65536):
+    """
+    Write the trips of an open sqlite3 connection as a column store at path
+
+    Columns are filled from the cursor batch by batch into preallocated .npy
+    memmaps, so memory stays O(batch_size). The store is built next to path
+    and swapped in by rename; readers still holding the old files keep a
+    valid mapping.
+
+    Returns the manifest dict.
+    """
+    row_count = conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0]
+    building = f"{path}.building"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    columns = {
+        name: np.lib.format.open_memmap(
+            os.path.join(building, f"{name}.npy"), mode="w+", dtype=TRIP_COLUMN_DTYPES[name], shape=(row_count,)
+        )
+        for name in STORE_COLUMNS
+    }
+    cursor = conn.execute(
+        f"SELECT {', '.join(_select_expression(name) for name in STORE_COLUMNS)} FROM trips ORDER BY rowid"
+    )
+    offset = 0
+    for batch in TripBatch.iter_cursor(cursor, batch_size):
+        for name, column in columns.items():
+            column[offset:offset + len(batch)] = batch[name]
+        offset += len(batch)
+    if offset != row_count:
+        raise RuntimeError(f"trips changed while writing the column store ({offset} of {row_count} rows)")
+    for column in columns.values():
+        column.flush()
+    del columns
+
+    manifest = {
+        "format": STORE_FORMAT,
+        "data_version": data_version,
+        "row_count": row_count,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "columns": {
+            name: {"file": f"{name}.npy", "dtype": np.dtype(TRIP_COLUMN_DTYPES[name]).str}
+            for name in STORE_COLUMNS
+        }
+    }
+    # manifest last: a store without one is never opened
+    with open(os.path.join(building, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    previous = f"{path}.previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(building, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+class ColumnStore:
+    """
+    Read-only view of a column store directory
+
+    store["trip_duration"] is a read-only memmap of the column; store.batch()
+    wraps any subset of columns in a TripBatch without copying.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self._columns = {}
+
+    @classmethod
+    def open(cls, path):
+        """Open the store at path (FileNotFoundError if it has no manifest)"""
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported column store format: {manifest.get('format')}")
+        store = cls(path, manifest)
+        # map every column now (cheap, nothing is read) so a later rebuild can't swap files underneath
+        for name in store.column_names:
+            store[name]
+        return store
+
+    @property
+    def data_version(self):
+        return self.manifest["data_version"]
+
+    @property
+    def column_names(self):
+        return list(self.manifest["columns"])
+
+    def __len__(self):
+        return self.manifest["row_count"]
+
+    def __contains__(self, name):
+        return name in self.manifest["columns"]
+
+    def __getitem__(self, name):
+        column = self._columns.get(name)
+        if column is None:
+            info = self.manifest["columns"][name]
+            column = np.load(os.path.join(self.path, info["file"]), mmap_mode="r")
+            if column.dtype.str != info["dtype"] or len(column) != len(self):
+                raise ValueError(f"Column store file for {name} does not match the manifest")
+            self._columns[name] = column
+        return column
+
+    def warm(self):
+        """Fault every mapped column into the OS page cache, returns the bytes mapped"""
+        total = 0
+        for name in self.column_names:
+            column = self[name]
+            if hasattr(os, "posix_fadvise"):
+                fd = os.open(column.filename, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                finally:
+                    os.close(fd)
+            # touching one value per page faults the file in
+            column[::max(1, 4096 // column.itemsize)].sum()
+            total += column.nbytes
+        return total
+
+    def batch(self, names=None):
+        """TripBatch over the given columns (all when None), backed by the mapped files"""
+        return TripBatch({name: self[name] for name in (names or self.column_names)})
+
+
+_store_cache = {}
+
+def get_column_store(data_version):
+    """
+    The configured column store if it was built from data_version, else None
+
+    Callers fall back to SQL when None is returned (store disabled, never
+    built, or stale after a data reload). Open stores are reused until the
+    manifest file changes.
+    """
+    if not settings.COLUMN_STORE_ENABLED:
+        return None
+    path = settings.COLUMN_STORE_DIR
+    try:
+        stat = os.stat(os.path.join(path, MANIFEST_NAME))
+    except OSError:
+        return None
+
+    key = (path, stat.st_ino, stat.st_mtime_ns)
+    store = _store_cache.get(key)
+    if store is None:
+        try:
+            store = ColumnStore.open(path)
+        except (OSError, ValueError):
+            return None
+        _store_cache.clear()
+        _store_cache[key] = store
+    return store if store.data_version == data_version else None
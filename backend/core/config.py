@@ -16,11 +16,22 @@ class Settings:
     API_V1_STR: str = "/api/v1"
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WORKERS: int = 0  # serve.py worker processes, 0 = one per CPU
     
     # application Settings
     DEBUG: bool = True
     LOG_LEVEL: str = "INFO"
     
+    # startup Settings
+    WARMUP_ENABLED: bool = True  # warm connections, page cache and caches after startup (see /health/ready)
+    
+    # monitoring Settings
+    METRICS_ENABLED: bool = True
+    SQL_ECHO: bool = False  # echo every statement (slow, use the slow-query log instead)
+    SLOW_QUERY_LOG_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: float = 100.0
+    SLOW_QUERY_LOG_PATH: str = "./logs/slow_queries.log"
+    
     # data Processing Settings
     MAX_TRIPS_PROCESS: int = 50000
     
@@ -29,10 +40,43 @@ class Settings:
     NYC_MAX_LAT: float = 40.9
     NYC_MIN_LON: float = -74.3
     NYC_MAX_LON: float = -73.7
+    NYC_BOUNDS: tuple = (NYC_MIN_LAT, NYC_MIN_LON, NYC_MAX_LAT, NYC_MAX_LON)
     
     # clustering Settings
     DEFAULT_CLUSTERS: int = 10
     MAX_CLUSTERS: int = 50
+    KMEANS_BATCH_SIZE: int = 4096  # rows per mini-batch for streaming k-means
+    
+    # pickup pyramid Settings (quadtree over NYC_BOUNDS, zoom z = 2^z x 2^z cells)
+    PYRAMID_MAX_ZOOM: int = 8
+    PYRAMID_DEFAULT_ZOOM: int = 6
+    PYRAMID_SAMPLES_PER_CELL: int = 10
+    
+    # memory-mapped column store of the trips, written by db_setup
+    COLUMN_STORE_ENABLED: bool = True
+    COLUMN_STORE_DIR: str = "./db/columns"
+    
+    # heatmap tile Settings (tile z/x/y covers pyramid cell z/x/y of NYC_BOUNDS)
+    HEATMAP_TILE_SIZE: int = 128  # pixels per tile side, power of two
+    HEATMAP_MAX_ZOOM: int = 4
+    HEATMAP_PER_HOUR: bool = True  # also precompute one set of tiles per pickup hour
+    HEATMAP_CACHE_SECONDS: int = 3600
+    
+    # approximate query Settings (stratified sample tables built by db_setup)
+    APPROX_SAMPLE_RATES: tuple = (0.001, 0.01)
+    APPROX_MIN_PER_STRATUM: int = 2  # keep small strata represented
+    APPROX_MIN_SAMPLE_ROWS: int = 1000  # smaller matches fall through to a bigger sample or exact
+    APPROX_CONFIDENCE_Z: float = 1.96  # 95% confidence intervals
+
+    # origin-destination matrix Settings (pyramid cells x cells per pickup hour, built in memory per data version)
+    OD_DEFAULT_ZOOM: int = 6
+    OD_MAX_ZOOM: int = 8
+
+    # live ingestion Settings (POST /trips:batch, see core/ingest.py)
+    INGEST_MAX_TRIPS_PER_REQUEST: int = 10000
+    INGEST_MAX_COMMIT_TRIPS: int = 50000  # queued batches appended together in one transaction, up to this many trips
+    INGEST_REFRESH_SECONDS: float = 30.0  # how often heatmap tiles and the column store catch up with ingested trips
+    INGEST_MAX_REJECTIONS: int = 100  # rejection reasons listed per response
 
 # global settings instance
 settings = Settings()
@@ -1,19 +1,44 @@
+import os
 import sqlite3
-from sqlalchemy import create_engine, MetaData, text
+import time
+import numpy as np
+from sqlalchemy import create_engine, MetaData, text, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from core.config import settings
+from core import metrics
+from core.query_log import record_query
+from algorithm.trip_batch import TripBatch
 
 # SQLAlchemy setup for ORM
 engine = create_engine(
     settings.DATABASE_URL, 
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    echo=settings.DEBUG  # show SQL in debug mode *_* (At least we can get logs when it's not working)
+    echo=settings.SQL_ECHO  # statement logging is synchronous, slow statements go to the slow-query log instead
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 metadata = MetaData()
 
+def _record_query(statement, params, duration, rows=None):
+    """Feed one statement execution to the metrics and the slow-query log"""
+    if settings.METRICS_ENABLED:
+        metrics.observe_query(statement, duration)
+        if rows is not None and rows >= 0:
+            metrics.observe_rows(statement, rows)
+    record_query(statement, params, duration, rows)
+
+# time every statement that goes through the SQLAlchemy engine
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start_time"].pop()
+    # executemany parameter lists can be huge, only keep single-statement params
+    _record_query(statement, None if executemany else parameters, time.perf_counter() - start)
+
 def get_db():
     """Dependency for getting database session"""
     db = SessionLocal()
@@ -41,6 +66,7 @@ def execute_query(query, params=None):
         List of dictionaries for SELECT queries, or dict with affected_rows for others
     """
     conn = get_sqlite_connection()
+    start = time.perf_counter()
     try:
         cursor = conn.cursor()
         
@@ -53,10 +79,12 @@ def execute_query(query, params=None):
         if query.strip().upper().startswith('SELECT'):
             columns = [description[0] for description in cursor.description]
             results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            _record_query(query, params, time.perf_counter() - start, len(results))
             return results
         else:
             # for INSERT, UPDATE, DELETE return affected rows
             conn.commit()
+            _record_query(query, params, time.perf_counter() - start, cursor.rowcount)
             return {"affected_rows": cursor.rowcount}
             
     except Exception as e:
@@ -65,6 +93,86 @@ def execute_query(query, params=None):
     finally:
         conn.close()
 
+def fetch_array(query, params=None, dtype=np.float64):
+    """
+    Execute a SELECT and return the rows as a 2D NumPy array
+    
+    Skips the per-row dictionaries of execute_query, for numeric columns
+    that feed the custom algorithms.
+    """
+    conn = get_sqlite_connection()
+    conn.row_factory = None  # plain tuples convert to arrays much faster
+    start = time.perf_counter()
+    try:
+        cursor = conn.execute(query, params or {})
+        rows = cursor.fetchall()
+        n_columns = len(cursor.description)
+        _record_query(query, params, time.perf_counter() - start, len(rows))
+        if not rows:
+            return np.empty((0, n_columns), dtype=dtype)
+        return np.array(rows, dtype=dtype)
+    finally:
+        conn.close()
+
+def fetch_trip_batch(query, params=None):
+    """
+    Execute a SELECT and return the rows as a columnar TripBatch
+    
+    Columns are converted straight from the cursor into typed arrays, no
+    per-row dictionaries are built.
+    """
+    conn = get_sqlite_connection()
+    conn.row_factory = None
+    start = time.perf_counter()
+    try:
+        batch = TripBatch.from_cursor(conn.execute(query, params or {}))
+        _record_query(query, params, time.perf_counter() - start, len(batch))
+        return batch
+    finally:
+        conn.close()
+
+def iter_array_batches(query, params=None, batch_size=None, dtype=np.float64):
+    """
+    Stream a SELECT as 2D NumPy arrays of at most batch_size rows
+    
+    Rows are pulled from the cursor with fetchmany, so memory stays
+    O(batch_size) whatever the table size.
+    """
+    batch_size = batch_size or settings.KMEANS_BATCH_SIZE
+    conn = get_sqlite_connection()
+    conn.row_factory = None
+    start = time.perf_counter()
+    total_rows = 0
+    try:
+        cursor = conn.execute(query, params or {})
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            total_rows += len(rows)
+            yield np.array(rows, dtype=dtype)
+        _record_query(query, params, time.perf_counter() - start, total_rows)
+    finally:
+        conn.close()
+
+def iter_trip_batches(query, params=None, batch_size=65536):
+    """
+    Stream a SELECT as columnar TripBatch chunks of at most batch_size rows
+    
+    Like iter_array_batches, memory stays O(batch_size) whatever the table size.
+    """
+    conn = get_sqlite_connection()
+    conn.row_factory = None
+    start = time.perf_counter()
+    total_rows = 0
+    try:
+        for batch in TripBatch.iter_cursor(conn.execute(query, params or {}), batch_size):
+            total_rows += len(batch)
+            yield batch
+        _record_query(query, params, time.perf_counter() - start, total_rows)
+    finally:
+        conn.close()
+
 def execute_query_with_session(db, query, params=None):
     """
     Execute query using SQLAlchemy session
@@ -86,7 +194,10 @@ def execute_query_with_session(db, query, params=None):
         # Convert to list of dictionaries
         if query.strip().upper().startswith('SELECT'):
             columns = result.keys()
-            return [dict(zip(columns, row)) for row in result.fetchall()]
+            rows = [dict(zip(columns, row)) for row in result.fetchall()]
+            if settings.METRICS_ENABLED:
+                metrics.observe_rows(query, len(rows))
+            return rows
         else:
             db.commit()
             return {"affected_rows": result.rowcount}
@@ -95,6 +206,69 @@ def execute_query_with_session(db, query, params=None):
         db.rollback()
         raise e
 
+def table_exists(table_name):
+    """Check whether a table exists (derived tables are optional and built by db_setup)"""
+    result = execute_query(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name", {"name": table_name}
+    )
+    return bool(result)
+
+def column_exists(table_name, column_name):
+    """Check whether a table has a column (databases loaded by older versions lack newer columns)"""
+    result = execute_query(
+        "SELECT 1 FROM pragma_table_info(:table) WHERE name = :column", {"table": table_name, "column": column_name}
+    )
+    return bool(result)
+
+def format_data_version(metadata):
+    """Data version string from system_metadata {key: value} pairs"""
+    return f"{metadata.get('last_data_load', '')}|{metadata.get('total_trips', '')}"
+
+# {database file signature: data version}, only the latest signature is kept
+_data_version_cache = {}
+
+def _database_signature():
+    """
+    (path, inode, mtime, size) of the database file and of its write-ahead log
+
+    Every commit writes one of the two, whichever process made it (a reload
+    by db_setup, an ingest, another worker), so an unchanged signature means
+    an unchanged data version.
+    """
+    path = settings.DATABASE_URL.replace('sqlite:///', '')
+    signature = [path]
+    for file_path in (path, path + "-wal"):
+        try:
+            stat = os.stat(file_path)
+            signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def get_data_version():
+    """
+    Identifier of the currently loaded dataset
+
+    Changes whenever data is (re)loaded, so it can be used as part of cache keys.
+    Kept in memory until the database files change, so the usual call costs
+    two stat() calls rather than a query.
+    """
+    signature = _database_signature()
+    version = _data_version_cache.get(signature)
+    if version is not None:
+        return version
+    try:
+        result = execute_query("""
+            SELECT key, value FROM system_metadata
+            WHERE key IN ('last_data_load', 'total_trips')
+        """)
+        version = format_data_version({row['key']: row['value'] for row in result})
+    except Exception:
+        return "unknown"
+    _data_version_cache.clear()
+    _data_version_cache[signature] = version
+    return version
+
 def get_database_stats():
     """Get basic database statistics"""
     try:
@@ -104,11 +278,11 @@ def get_database_stats():
         result = execute_query("SELECT COUNT(*) as total_trips FROM trips")
         stats['total_trips'] = result[0]['total_trips'] if result else 0
         
-        # date range
+        # date range (MIN/MAX are single lookups on the pickup_epoch index)
         result = execute_query("""
             SELECT 
-                MIN(pickup_datetime) as earliest_trip,
-                MAX(pickup_datetime) as latest_trip
+                datetime(MIN(pickup_epoch), 'unixepoch') as earliest_trip,
+                datetime(MAX(pickup_epoch), 'unixepoch') as latest_trip
             FROM trips
         """)
         if result:
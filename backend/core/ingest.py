@@ -0,0 +1,596 @@
+"""
+Live trip ingestion with group commit and incremental aggregates
+
+POST /trips:batch validates raw trips with validate_trips from
+data/cleaning.py (vectorized, off the event loop) and queues the valid ones
+for the single writer thread of the process. The writer takes every batch
+that queued up while its previous commit ran and appends them together in
+one transaction (group commit), so concurrent requests share one journal
+sync instead of paying one each.
+
+The database runs in WAL mode: readers keep reading the last committed
+snapshot while the writer appends, and neither waits for the other.
+
+The commit transaction also folds the new trips, and only them, into the
+derived tables db_setup built:
+- system_metadata total_trips / last_data_load, i.e. the data version, so
+  every version-keyed cache picks the new trips up
+- pickup_minute_series: counts and durations added per minute
+- trip_quantile_sketches: digests of the new values merged in
+- pickup_pyramid: counts added, centroids re-weighted and the per-cell
+  reservoir samples merged so they stay uniform
+- the stratified sample tables: the affected strata resampled, with their
+  new sizes
+
+Two structures cost too much to rewrite on every commit and catch up from a
+maintenance thread every INGEST_REFRESH_SECONDS instead:
+- heatmap_tiles (a gzip round trip per tile): tiles of the trips past the
+  heatmap_tiles_rowid watermark in system_metadata are merged in, and the
+  watermark moves in the same transaction, so every trip is counted once
+  across restarts and worker processes
+- the column store (a copy of every row) is rebuilt; until then its data
+  version is stale and readers fall back to SQL
+Derived tables that were never built (empty) are left alone.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+from core.config import settings
+from core.metrics import registry, SIZE_BUCKETS
+from core.approx import STRATUM_COLUMNS, sample_table_name
+from core.column_store import MANIFEST_NAME, write_column_store
+from core.database import format_data_version
+from algorithm.time_series import build_minute_series
+from algorithm.quantile_sketch import SKETCH_METRICS, TDigest, build_group_sketches
+from algorithm.spatial_pyramid import build_pickup_pyramid
+from algorithm.density_raster import build_heatmap_tiles, encode_tile, decode_tile
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks (Windows): concurrent column store rebuilds are not serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# system_metadata key: last trips rowid counted in heatmap_tiles
+HEATMAP_WATERMARK = "heatmap_tiles_rowid"
+
+ingest_trips_total = registry.counter(
+    "ingest_trips_total", "Trips received by POST /trips:batch by outcome (accepted or rejected)", ("outcome",)
+)
+ingest_commits_total = registry.counter("ingest_commits_total", "Group commits of the trip writer")
+ingest_commit_trips = registry.histogram(
+    "ingest_commit_trips", "Trips appended per group commit", buckets=SIZE_BUCKETS
+)
+ingest_commit_seconds = registry.histogram(
+    "ingest_commit_seconds", "Duration of one group commit, aggregate updates included"
+)
+
+
+def connect(db_path):
+    """Autocommit connection in WAL mode, for explicit BEGIN IMMEDIATE ... COMMIT writes"""
+    conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    # other processes' writers hold the lock for one commit at a time
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute("PRAGMA journal_mode = WAL")
+    # a commit survives crashes, only the last ones can be lost on power failure (fsync per checkpoint)
+    conn.execute("PRAGMA synchronous = NORMAL")
+    # index pages of the trips table stay cached between commits
+    conn.execute("PRAGMA cache_size = -65536")
+    return conn
+
+
+def _built(conn, table):
+    """True when a derived table exists and has rows (db_setup filled it)"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+        return False
+    return conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None
+
+
+def _random_ranks(groups, rng):
+    """Position of every element within its group after shuffling each group"""
+    order = np.lexsort((rng.random(len(groups)), groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    ranks = np.empty(len(groups), dtype=np.int64)
+    ranks[order] = np.arange(len(groups)) - np.repeat(starts, np.diff(np.r_[starts, len(groups)]))
+    return ranks
+
+
+def _insert_columns(conn):
+    """(name, declared type) of the trips columns an ingested trip fills"""
+    columns = []
+    for _, name, declared, _, _, pk in conn.execute("PRAGMA table_info(trips)"):
+        # an INTEGER PRIMARY KEY id is the rowid itself, leave it to SQLite
+        if name == "created_at" or (pk and declared.upper() == "INTEGER"):
+            continue
+        columns.append((name, declared.upper()))
+    return columns
+
+
+def _stored_form(trips, columns):
+    """The trips as they are stored: epoch columns added, integer columns rounded, datetimes as text"""
+    trips = trips.copy()
+    for column, source in (("pickup_epoch", "pickup_datetime"), ("dropoff_epoch", "dropoff_datetime")):
+        trips[column] = (trips[source] - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+    for name, declared in columns:
+        if name in trips and ("INT" in declared or "BOOL" in declared) and pd.api.types.is_numeric_dtype(trips[name]):
+            trips[name] = trips[name].round().astype("Int64")
+    return trips
+
+
+def _rows(trips, names):
+    values = []
+    for name in names:
+        column = trips[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            column = column.dt.strftime("%Y-%m-%d %H:%M:%S")
+        # tolist() gives plain Python values; missing ones (NaN, pd.NA) are bound as NULL
+        column_values = column.tolist()
+        for i in np.flatnonzero(column.isna().to_numpy()).tolist():
+            column_values[i] = None
+        values.append(column_values)
+    return list(zip(*values))
+
+
+def _stored_ids(conn, ids):
+    """The given trip ids that are already in the trips table (an idx_trips_id lookup per chunk)"""
+    found = set()
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        found.update(row[0] for row in conn.execute(
+            f"SELECT id FROM trips WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        ))
+    return found
+
+
+def commit_trips(conn, batches, rng=None):
+    """
+    Append validated trip batches in one transaction and update the derived tables
+
+    batches are validate_trips outputs, indexed by position in their request.
+    A trip whose id is already stored, or was taken from an earlier batch of
+    the same commit, is rejected as a duplicate.
+
+    Returns per batch {"accepted", "rejected": {position: reason},
+    "total_trips", "data_version"}.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    columns = _insert_columns(conn)
+    names = [name for name, _ in columns]
+    trips = pd.concat(
+        [batch.assign(_batch=i, _position=batch.index) for i, batch in enumerate(batches)], ignore_index=True
+    )
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        duplicate = pd.Series(False, index=trips.index)
+        if "id" in names and len(trips):
+            ids = trips["id"]
+            stored = _stored_ids(conn, ids.dropna().unique().tolist())
+            duplicate = ids.notna() & (ids.duplicated() | ids.isin(stored))
+        new = _stored_form(trips[~duplicate], columns)
+
+        if len(new):
+            # without deletes SQLite numbers appended rows from MAX(rowid) + 1 up
+            first_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM trips").fetchone()[0] + 1
+            rowids = np.arange(first_rowid, first_rowid + len(new), dtype=np.int64)
+            if _built(conn, "heatmap_tiles"):
+                # tiles built before the watermark existed cover every trip stored so far
+                conn.execute(
+                    "INSERT OR IGNORE INTO system_metadata (key, value, description) VALUES (?, ?, ?)",
+                    (HEATMAP_WATERMARK, str(first_rowid - 1), "Last trips rowid counted in heatmap_tiles")
+                )
+            insert_names = [name for name in names if name in new]
+            conn.executemany(
+                f"INSERT INTO trips ({', '.join(insert_names)}) VALUES ({', '.join('?' * len(insert_names))})",
+                _rows(new, insert_names)
+            )
+            if conn.execute("SELECT MAX(rowid) FROM trips").fetchone()[0] != rowids[-1]:
+                raise RuntimeError("appended trips did not get consecutive rowids")
+
+            update_derived_tables(conn, new, rowids, rng)
+            conn.execute(
+                "UPDATE system_metadata SET value = CAST(value AS INTEGER) + ? WHERE key = 'total_trips'", (len(new),)
+            )
+            conn.execute("UPDATE system_metadata SET value = datetime('now') WHERE key = 'last_data_load'")
+
+        metadata = dict(conn.execute("SELECT key, value FROM system_metadata").fetchall())
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+    accepted = new["_batch"].value_counts()
+    rejected = trips.loc[duplicate, ["_batch", "_position"]]
+    return [
+        {
+            "accepted": int(accepted.get(i, 0)),
+            "rejected": {int(position): "duplicate id" for position in rejected.loc[rejected["_batch"] == i, "_position"]},
+            "total_trips": int(metadata.get("total_trips", 0)),
+            "data_version": format_data_version(metadata),
+        }
+        for i in range(len(batches))
+    ]
+
+
+# incremental maintenance, in the commit transaction --------------------------------
+
+def update_derived_tables(conn, trips, rowids, rng):
+    """Fold newly appended trips (stored form, with their rowids) into every derived table db_setup built"""
+    if _built(conn, "pickup_minute_series"):
+        update_minute_series(conn, trips)
+    if _built(conn, "trip_quantile_sketches"):
+        update_quantile_sketches(conn, trips)
+    if _built(conn, "pickup_pyramid"):
+        update_pickup_pyramid(conn, trips, rng)
+    for rate in settings.APPROX_SAMPLE_RATES:
+        table = sample_table_name(rate)
+        if _built(conn, table):
+            update_sample_table(conn, table, rate, trips, rowids, rng)
+
+
+def update_minute_series(conn, trips):
+    """Add the new trips' counts and durations to their minutes of the week"""
+    counts, totals = build_minute_series(
+        trips["pickup_epoch"].to_numpy(dtype=np.int64), trips["trip_duration"].to_numpy(dtype=np.float64)
+    )
+    counts, totals = counts.reshape(-1), totals.reshape(-1)
+    minutes = np.flatnonzero(counts)
+    conn.executemany("""
+        INSERT INTO pickup_minute_series VALUES (?, ?, ?)
+        ON CONFLICT(minute_of_week) DO UPDATE SET
+            trip_count = trip_count + excluded.trip_count,
+            total_duration = total_duration + excluded.total_duration
+    """, zip(minutes.tolist(), counts[minutes].tolist(), totals[minutes].tolist()))
+
+
+def update_quantile_sketches(conn, trips):
+    """Merge digests of the new trips into the sketches of their (hour, day, metric) groups"""
+    delta = build_group_sketches(
+        trips["pickup_hour"].to_numpy(dtype=np.int64), trips["day_of_week"].to_numpy(dtype=np.int64),
+        {metric: trips[metric].to_numpy(dtype=np.float64) for metric in SKETCH_METRICS}
+    )
+    groups = sorted({hour * 7 + day for hour, day, _ in delta})
+    stored = {
+        (hour, day, metric): TDigest.from_bytes(sketch)
+        for hour, day, metric, sketch in conn.execute(f"""
+            SELECT pickup_hour, day_of_week, metric, sketch FROM trip_quantile_sketches
+            WHERE pickup_hour * 7 + day_of_week IN ({', '.join(str(group) for group in groups)})
+        """)
+    }
+    records = []
+    for key, digest in delta.items():
+        if key in stored:
+            digest = TDigest.merge_all([stored[key], digest])
+        records.append((*key, int(digest.count), digest.to_bytes()))
+    conn.executemany("INSERT OR REPLACE INTO trip_quantile_sketches VALUES (?, ?, ?, ?, ?)", records)
+
+
+def update_pickup_pyramid(conn, trips, rng):
+    """
+    Add the new pickups to every pyramid level
+
+    A cell holding C points with min(k, C) stored samples that receives D new
+    points keeps a uniform k-sample of all C + D: the number taken from the
+    new points is drawn from the hypergeometric distribution, that many come
+    from the new points' own bottom-k sample and a random subset of the
+    stored samples makes up the rest.
+    """
+    k = settings.PYRAMID_SAMPLES_PER_CELL
+    pyramid = build_pickup_pyramid(
+        trips["pickup_latitude"].to_numpy(dtype=np.float64), trips["pickup_longitude"].to_numpy(dtype=np.float64),
+        settings.NYC_BOUNDS, settings.PYRAMID_MAX_ZOOM, samples_per_cell=k, seed=int(rng.integers(2**32))
+    )
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS ingest_cells (zoom INTEGER, cell_x INTEGER, cell_y INTEGER)")
+
+    for zoom, level in pyramid.items():
+        cells = len(level["cell_x"])
+        conn.execute("DELETE FROM ingest_cells")
+        conn.executemany(
+            "INSERT INTO ingest_cells VALUES (?, ?, ?)",
+            zip([zoom] * cells, level["cell_x"].tolist(), level["cell_y"].tolist())
+        )
+        # temp table rowid - 1 is the cell's position in the level arrays
+        join = """
+            FROM ingest_cells c JOIN {table} t
+            ON t.zoom = c.zoom AND t.cell_x = c.cell_x AND t.cell_y = c.cell_y
+        """
+        old_count = np.zeros(cells, dtype=np.int64)
+        for position, count in conn.execute(f"SELECT c.rowid - 1, t.point_count {join.format(table='pickup_pyramid')}"):
+            old_count[position] = count
+
+        conn.executemany("""
+            INSERT INTO pickup_pyramid VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(zoom, cell_x, cell_y) DO UPDATE SET
+                center_lat = (center_lat * point_count + excluded.center_lat * excluded.point_count)
+                             / (point_count + excluded.point_count),
+                center_lon = (center_lon * point_count + excluded.center_lon * excluded.point_count)
+                             / (point_count + excluded.point_count),
+                point_count = point_count + excluded.point_count
+        """, zip([zoom] * cells, level["cell_x"].tolist(), level["cell_y"].tolist(),
+                 level["point_count"].tolist(), level["center_lat"].tolist(), level["center_lon"].tolist()))
+
+        new_count = level["point_count"]
+        keep = np.minimum(k, old_count + new_count)
+        from_new = rng.hypergeometric(new_count, old_count, keep)
+        drop_old = np.minimum(k, old_count) - (keep - from_new)
+
+        if drop_old.any():
+            stored = np.array(
+                conn.execute(f"SELECT c.rowid - 1, t.rowid {join.format(table='pickup_pyramid_samples')}").fetchall(),
+                dtype=np.int64
+            ).reshape(-1, 2)
+            dropped = stored[_random_ranks(stored[:, 0], rng) < drop_old[stored[:, 0]], 1]
+            conn.executemany("DELETE FROM pickup_pyramid_samples WHERE rowid = ?", ((rowid,) for rowid in dropped.tolist()))
+
+        # the new samples of a cell are in ascending priority, so any prefix is a uniform sample
+        sample_cell = level["sample_cell"]
+        taken = (np.arange(len(sample_cell)) - np.searchsorted(sample_cell, sample_cell)) < from_new[sample_cell]
+        conn.executemany(
+            "INSERT INTO pickup_pyramid_samples VALUES (?, ?, ?, ?, ?)",
+            zip([zoom] * int(taken.sum()), level["cell_x"][sample_cell[taken]].tolist(),
+                level["cell_y"][sample_cell[taken]].tolist(),
+                level["sample_lat"][taken].tolist(), level["sample_lon"][taken].tolist())
+        )
+
+
+def update_sample_table(conn, table, rate, trips, rowids, rng):
+    """
+    Resample the strata of a stratified sample table the new trips fall in
+
+    Every stratum keeps its quota of the grown stratum (as in
+    stratified_sample): the share drawn from the new trips is hypergeometric,
+    random stored rows make room for it. Stored rows are never added back, so
+    when the quota outgrows what they can supply the new trips fill the gap.
+    """
+    strata = trips[list(STRATUM_COLUMNS)].astype("Int64").fillna(-1).to_numpy(dtype=np.int64)
+    keys, group = np.unique(strata, axis=0, return_inverse=True)
+    group = group.reshape(-1)
+    # NULL strata values are grouped as -1 like db_setup does, and matched with IS NULL
+    params = [tuple(None if value == -1 else value for value in key) for key in keys.tolist()]
+    stratum_where = " AND ".join(f"{column} IS ?" for column in STRATUM_COLUMNS)
+
+    stored = {
+        tuple(row[:len(STRATUM_COLUMNS)]): row[len(STRATUM_COLUMNS):]
+        for row in conn.execute(f"""
+            SELECT {', '.join(STRATUM_COLUMNS)}, MAX(stratum_size), COUNT(*) FROM {table}
+            GROUP BY {', '.join(STRATUM_COLUMNS)}
+        """)
+    }
+    old_size = np.array([stored.get(key, (0, 0))[0] for key in params], dtype=np.int64)
+    old_samples = np.array([stored.get(key, (0, 0))[1] for key in params], dtype=np.int64)
+    new_size = np.bincount(group, minlength=len(keys))
+
+    size = old_size + new_size
+    quota = np.minimum(size, np.maximum(np.ceil(size * rate).astype(np.int64), settings.APPROX_MIN_PER_STRATUM))
+    from_new = rng.hypergeometric(new_size, old_size, quota)
+    from_old = np.minimum(quota - from_new, old_samples)
+    from_new = np.minimum(quota - from_old, new_size)
+
+    drop = old_samples - from_old
+    conn.executemany(f"""
+        DELETE FROM {table} WHERE rowid IN (
+            SELECT rowid FROM {table} WHERE {stratum_where} ORDER BY random() LIMIT ?
+        )
+    """, [(*params[i], int(drop[i])) for i in np.flatnonzero(drop)])
+
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+               if row[1] not in ("stratum_size", "stratum_samples")]
+    chosen = rowids[_random_ranks(group, rng) < from_new[group]]
+    conn.executemany(f"""
+        INSERT INTO {table} ({', '.join(columns)}, stratum_size, stratum_samples)
+        SELECT {', '.join(columns)}, 0, 0 FROM trips WHERE rowid = ?
+    """, ((rowid,) for rowid in chosen.tolist()))
+    conn.executemany(
+        f"UPDATE {table} SET stratum_size = ?, stratum_samples = ? WHERE {stratum_where}",
+        [(int(size[i]), int(from_old[i] + from_new[i]), *params[i]) for i in range(len(keys))]
+    )
+
+
+# deferred maintenance ---------------------------------------------------------------
+
+def catch_up_heatmap_tiles(conn):
+    """
+    Merge tiles of the trips past the heatmap_tiles_rowid watermark into heatmap_tiles
+
+    Tiles are decoded, added to and re-encoded outside the write transaction,
+    which only stores them if the watermark has not moved meanwhile (another
+    process caught up first). Returns the number of trips folded in.
+    """
+    if not _built(conn, "heatmap_tiles"):
+        return 0
+    row = conn.execute("SELECT value FROM system_metadata WHERE key = ?", (HEATMAP_WATERMARK,)).fetchone()
+    if row is None:
+        return 0
+    watermark = int(row[0])
+    data = np.array(conn.execute("""
+        SELECT rowid, pickup_hour, pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude
+        FROM trips WHERE rowid > ?
+    """, (watermark,)).fetchall(), dtype=np.float64).reshape(-1, 6)
+    if not len(data):
+        return 0
+
+    hours = [-1] + (np.unique(data[:, 1]).astype(int).tolist() if settings.HEATMAP_PER_HOUR else [])
+    records = []
+    for layer, lat_column in (("pickup", 2), ("dropoff", 4)):
+        for hour in hours:
+            selected = data if hour < 0 else data[data[:, 1] == hour]
+            tiles = build_heatmap_tiles(
+                selected[:, lat_column], selected[:, lat_column + 1], settings.NYC_BOUNDS,
+                settings.HEATMAP_MAX_ZOOM, settings.HEATMAP_TILE_SIZE
+            )
+            for (zoom, x, y), raster in tiles.items():
+                stored = conn.execute("""
+                    SELECT raster FROM heatmap_tiles
+                    WHERE layer = ? AND hour = ? AND zoom = ? AND tile_x = ? AND tile_y = ?
+                """, (layer, hour, zoom, x, y)).fetchone()
+                if stored is not None:
+                    raster = raster + decode_tile(stored[0], settings.HEATMAP_TILE_SIZE)
+                records.append((layer, hour, zoom, x, y, int(raster.sum()), int(raster.max()), encode_tile(raster)))
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = conn.execute("SELECT value FROM system_metadata WHERE key = ?", (HEATMAP_WATERMARK,)).fetchone()
+        if current is None or int(current[0]) != watermark:
+            conn.execute("ROLLBACK")
+            return 0
+        conn.executemany("INSERT OR REPLACE INTO heatmap_tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records)
+        conn.execute("UPDATE system_metadata SET value = ? WHERE key = ?", (str(int(data[:, 0].max())), HEATMAP_WATERMARK))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return len(data)
+
+
+def refresh_column_store(db_path):
+    """
+    Rebuild the column store if it exists but no longer matches the data version
+
+    The trips and the version are read in one transaction so they match, and
+    an advisory lock keeps concurrent workers from building the same
+    directory. Returns True when the store was rebuilt.
+    """
+    path = settings.COLUMN_STORE_DIR
+    if not settings.COLUMN_STORE_ENABLED or not os.path.exists(os.path.join(path, MANIFEST_NAME)):
+        return False
+    with open(f"{path}.lock", "w") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False  # another process is rebuilding it
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("BEGIN")
+            version = format_data_version(dict(conn.execute("SELECT key, value FROM system_metadata").fetchall()))
+            with open(os.path.join(path, MANIFEST_NAME)) as f:
+                if json.load(f).get("data_version") == version:
+                    return False
+            write_column_store(conn, path, version)
+            return True
+        finally:
+            conn.close()
+
+
+class TripWriter:
+    """
+    Writer thread of the process, appending queued trip batches with group commit
+
+    Request handlers validate and queue; the writer commits everything queued
+    while its previous commit ran (up to INGEST_MAX_COMMIT_TRIPS trips) in one
+    transaction. A maintenance thread catches heatmap tiles and the column
+    store up every INGEST_REFRESH_SECONDS while trips keep arriving.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.queue = queue.Queue()
+        self.commits = 0
+        self.trips_written = 0
+        self._stale = threading.Event()
+        self._threads = None
+        self._lock = threading.Lock()
+        self._checked = False
+
+    def check_database(self):
+        """Raise RuntimeError unless the trips table can take ingested trips (checked once)"""
+        if self._checked:
+            return
+        conn = connect(self.db_path)
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(trips)")}
+            if not columns:
+                raise RuntimeError("No trips table, run `python db/db_setup.py` first")
+            if "pickup_epoch" not in columns:
+                raise RuntimeError("The trips table predates the epoch columns, run `python db/db_setup.py --migrate`")
+            # every commit looks its trip ids up
+            if "id" in columns:
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_trips_id ON trips(id)")
+        finally:
+            conn.close()
+        self._checked = True
+
+    def _ensure_threads(self):
+        if self._threads is not None:
+            return
+        with self._lock:
+            if self._threads is None:
+                self._threads = [
+                    threading.Thread(target=self._run, name="trip-writer", daemon=True),
+                    threading.Thread(target=self._maintain, name="trip-maintenance", daemon=True),
+                ]
+                for thread in self._threads:
+                    thread.start()
+
+    def submit(self, trips):
+        """Queue validated trips; the future resolves to this batch's commit_trips result"""
+        self._ensure_threads()
+        future = Future()
+        self.queue.put((trips, future))
+        return future
+
+    async def write(self, trips):
+        return await asyncio.wrap_future(self.submit(trips))
+
+    def _run(self):
+        conn = None
+        while True:
+            items = [self.queue.get()]
+            size = len(items[0][0])
+            # group commit: whatever queued up during the previous commit goes into this one
+            while size < settings.INGEST_MAX_COMMIT_TRIPS:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+                size += len(item[0])
+
+            start = time.perf_counter()
+            try:
+                conn = conn or connect(self.db_path)
+                results = commit_trips(conn, [trips for trips, _ in items])
+            except Exception as e:
+                logger.error(f"Error committing {size} trips: {e}")
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            accepted = sum(result["accepted"] for result in results)
+            self.commits += 1
+            self.trips_written += accepted
+            if settings.METRICS_ENABLED:
+                ingest_commits_total.inc()
+                ingest_commit_trips.observe(value=accepted)
+                ingest_commit_seconds.observe(value=time.perf_counter() - start)
+            if accepted:
+                self._stale.set()
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
+
+    def _maintain(self):
+        conn = None
+        while True:
+            self._stale.wait()
+            time.sleep(settings.INGEST_REFRESH_SECONDS)
+            self._stale.clear()
+            try:
+                conn = conn or connect(self.db_path)
+                catch_up_heatmap_tiles(conn)
+                refresh_column_store(self.db_path)
+            except Exception as e:
+                logger.error(f"Error catching up heatmap tiles and column store: {e}")
+
+
+# global writer of this process
+trip_writer = TripWriter(settings.DATABASE_URL.replace("sqlite:///", ""))
@@ -0,0 +1,231 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# default latency buckets in seconds (1ms .. 10s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# buckets for sizes (rows returned, items sorted, ...)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+# route template of the request currently being served (set by the middleware)
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="-")
+
+
+def _format_labels(label_names, label_values, extra=None):
+    """Render a Prometheus label set"""
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    rendered = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + rendered + "}"
+
+
+class _Metric:
+    """Base class holding name, help text and label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in sorted(items):
+            lines.extend(self._render_sample(label_values, value))
+        return lines
+
+    def _render_sample(self, label_values, value):
+        return [f"{self.name}{_format_labels(self.label_names, label_values)} {value}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value=0):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram (cumulative buckets are computed on render)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *label_values, value):
+        # bisect is O(log buckets) and keeps the hot path allocation free
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[label_values] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, label_values, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(self.label_names, label_values, ("le", le))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, label_values)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# global registry instance
+registry = MetricsRegistry()
+
+# HTTP metrics
+http_requests_total = registry.counter(
+    "http_requests_total", "Total HTTP requests", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("route",)
+)
+
+# database metrics
+db_query_duration_seconds = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("endpoint", "operation")
+)
+db_query_rows = registry.histogram(
+    "db_query_rows", "Rows returned by SQL statements", ("endpoint", "operation"), buckets=SIZE_BUCKETS
+)
+
+# algorithm metrics
+algorithm_duration_seconds = registry.histogram(
+    "algorithm_duration_seconds", "Custom algorithm run time", ("algorithm",)
+)
+algorithm_iterations = registry.histogram(
+    "algorithm_iterations", "Iterations used by iterative algorithms", ("algorithm",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+algorithm_distance_computations_saved_total = registry.counter(
+    "algorithm_distance_computations_saved_total",
+    "Point-to-center distance computations skipped by bounds-based k-means", ("algorithm",),
+)
+algorithm_input_size = registry.histogram(
+    "algorithm_input_size", "Number of items processed by custom algorithms", ("algorithm",),
+    buckets=SIZE_BUCKETS,
+)
+
+
+def statement_operation(statement):
+    """Return the leading SQL keyword (SELECT, INSERT, ...) used as a low-cardinality label"""
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "UNKNOWN"
+
+
+def observe_query(statement, duration):
+    """Record the execution time of one SQL statement"""
+    db_query_duration_seconds.observe(current_endpoint.get(), statement_operation(statement), value=duration)
+
+
+def observe_rows(statement, rows):
+    """Record how many rows a SQL statement returned"""
+    db_query_rows.observe(current_endpoint.get(), statement_operation(statement), value=rows)
+
+
+@contextmanager
+def time_algorithm(name, input_size=None):
+    """
+    Time a custom algorithm run
+
+    Yields a dict the caller can fill with 'iterations' and
+    'distance_computations_saved' when they are known.
+    """
+    stats = {}
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        algorithm_duration_seconds.observe(name, value=time.perf_counter() - start)
+        if input_size is not None:
+            algorithm_input_size.observe(name, value=input_size)
+        if stats.get("iterations") is not None:
+            algorithm_iterations.observe(name, value=stats["iterations"])
+        if stats.get("distance_computations_saved"):
+            algorithm_distance_computations_saved_total.inc(name, amount=stats["distance_computations_saved"])
+
+
+def render_metrics():
+    """Prometheus text exposition of every registered metric"""
+    return registry.render()
@@ -0,0 +1,66 @@
+"""
+ASGI middleware for request instrumentation
+"""
+import time
+from starlette.routing import Match
+from core import metrics
+
+
+class MetricsMiddleware:
+    """
+    Count requests, time them and track in-flight requests per route template
+
+    Implemented as a plain ASGI middleware so the per-request cost is a route
+    lookup (cached per path) and a few histogram updates.
+    """
+
+    def __init__(self, app, router=None, max_cached_paths=1024):
+        self.app = app
+        self.router = router
+        self.max_cached_paths = max_cached_paths
+        self._route_cache = {}
+
+    def _route_template(self, scope):
+        """Map a concrete path to its route template (e.g. /api/v1/heatmap/{z}/{x}/{y})"""
+        path = scope["path"]
+        template = self._route_cache.get(path)
+        if template is not None:
+            return template
+
+        template = "unmatched"
+        for route in self.router.routes if self.router else []:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = getattr(route, "path", path)
+                break
+
+        # bounded cache so random 404 paths can't grow memory
+        if len(self._route_cache) < self.max_cached_paths:
+            self._route_cache[path] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        token = metrics.current_endpoint.set(route)
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        metrics.http_requests_in_flight.inc(route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            metrics.http_requests_in_flight.dec(route)
+            metrics.http_request_duration_seconds.observe(method, route, value=duration)
+            metrics.http_requests_total.inc(method, route, str(status_holder["status"]))
+            metrics.current_endpoint.reset(token)
@@ -0,0 +1,182 @@
+"""
+Query fingerprinting, per-fingerprint statistics and the slow-query log
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from functools import lru_cache
+from core.config import settings
+from core.metrics import current_endpoint
+
+logger = logging.getLogger(__name__)
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_PARAM_RE = re.compile(r":\w+|\?|%\(\w+\)s")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement):
+    """
+    Normalize a SQL statement so queries differing only in literals group together
+
+    Comments are removed, literals and bind parameters become '?', IN lists
+    collapse to '(?+)' and whitespace/case are normalized.
+    """
+    sql = _COMMENT_RE.sub(" ", statement)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("(?+)", sql)
+    return _SPACE_RE.sub(" ", sql).strip().lower()
+
+
+class QueryStats:
+    """Aggregated execution statistics keyed by query fingerprint"""
+
+    def __init__(self, max_fingerprints=1000):
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, fp, duration, rows=None, endpoint=None):
+        with self._lock:
+            entry = self._stats.get(fp)
+            if entry is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    return
+                entry = {"calls": 0, "total_time": 0.0, "max_time": 0.0, "rows": 0, "endpoints": set()}
+                self._stats[fp] = entry
+            entry["calls"] += 1
+            entry["total_time"] += duration
+            if duration > entry["max_time"]:
+                entry["max_time"] = duration
+            if rows is not None and rows >= 0:
+                entry["rows"] += rows
+            if endpoint is not None:
+                entry["endpoints"].add(endpoint)
+
+    def top(self, limit=20, order_by="total_time"):
+        """Return the heaviest fingerprints, sorted by the given field"""
+        with self._lock:
+            snapshot = [(fp, dict(entry, endpoints=sorted(entry["endpoints"]))) for fp, entry in self._stats.items()]
+
+        results = []
+        for fp, entry in snapshot:
+            entry["fingerprint"] = fp
+            entry["avg_time"] = entry["total_time"] / entry["calls"] if entry["calls"] else 0.0
+            results.append(entry)
+
+        results.sort(key=lambda entry: entry[order_by], reverse=True)
+        return results[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class SlowQueryLog:
+    """
+    Writes slow statements as JSON lines from a background thread
+
+    The request thread only does a non-blocking queue put; if the queue is
+    full the entry is dropped and counted instead of adding latency.
+    """
+
+    def __init__(self, path, max_queue=10000):
+        self.path = path
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-query-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def submit(self, entry):
+        self._ensure_writer()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as f:
+                while True:
+                    batch = [self.queue.get()]
+                    # drain whatever else is queued before flushing once
+                    while True:
+                        try:
+                            batch.append(self.queue.get_nowait())
+                        except queue.Empty:
+                            break
+                    try:
+                        for entry in batch:
+                            f.write(json.dumps(entry, default=str) + "\n")
+                        f.flush()
+                    finally:
+                        # only done once on disk, so flush() means written
+                        for _ in batch:
+                            self.queue.task_done()
+        except OSError as e:
+            logger.error(f"Slow-query log disabled, cannot write {self.path}: {e}")
+
+        # keep draining so submitters and flush() never wait on a dead writer
+        while True:
+            self.queue.get()
+            self.dropped += 1
+            self.queue.task_done()
+
+    def flush(self, timeout=5.0):
+        """Wait until every queued entry has been written, at most timeout seconds; True if all were"""
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+
+# global instances
+query_stats = QueryStats()
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_LOG_PATH)
+
+
+def record_query(statement, params, duration, rows=None):
+    """Aggregate one execution by fingerprint and log it if it crossed the threshold"""
+    fp = fingerprint(statement)
+    endpoint = current_endpoint.get()
+    query_stats.record(fp, duration, rows, endpoint)
+
+    if settings.SLOW_QUERY_LOG_ENABLED and duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        slow_query_log.submit({
+            "timestamp": datetime.datetime.now().isoformat(),
+            "fingerprint": fp,
+            "params": params,
+            "duration_ms": round(duration * 1000, 3),
+            "rows": rows,
+            "endpoint": endpoint,
+        })
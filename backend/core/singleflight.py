@@ -0,0 +1,76 @@
+"""
+Single-flight request coalescing for expensive computations
+"""
+import asyncio
+import time
+from starlette.concurrency import run_in_threadpool
+from core.metrics import registry
+
+singleflight_requests_total = registry.counter(
+    "singleflight_requests_total",
+    "Coalescable requests by outcome (executed = ran the computation, coalesced = shared a running one)",
+    ("route", "outcome"),
+)
+singleflight_saved_seconds_total = registry.counter(
+    "singleflight_saved_seconds_total",
+    "Computation time avoided by handing a shared result to coalesced waiters",
+    ("route",),
+)
+singleflight_in_flight = registry.gauge(
+    "singleflight_in_flight", "Distinct computations currently running", ("route",)
+)
+
+
+class SingleFlight:
+    """
+    Run at most one computation per key at a time
+
+    Concurrent callers with the same key await the running computation and all
+    receive the same result object, so callers must treat it as read-only.
+    The computation runs in the threadpool, which keeps the event loop free
+    while it works and lets identical requests actually overlap.
+    """
+
+    def __init__(self):
+        self._in_flight = {}  # key -> [task, waiter_count]
+        self.executed = 0
+        self.coalesced = 0
+
+    async def run(self, route, key, fn, *args, **kwargs):
+        full_key = (route, key)
+        entry = self._in_flight.get(full_key)
+
+        if entry is not None:
+            entry[1] += 1
+            self.coalesced += 1
+            singleflight_requests_total.inc(route, "coalesced")
+            # shield so one waiter disconnecting doesn't cancel the shared work
+            return await asyncio.shield(entry[0])
+
+        self.executed += 1
+        singleflight_requests_total.inc(route, "executed")
+        singleflight_in_flight.inc(route)
+        start = time.perf_counter()
+        task = asyncio.ensure_future(run_in_threadpool(fn, *args, **kwargs))
+        entry = [task, 0]
+        self._in_flight[full_key] = entry
+
+        def _done(_):
+            self._in_flight.pop(full_key, None)
+            singleflight_in_flight.dec(route)
+            if entry[1]:
+                singleflight_saved_seconds_total.inc(route, amount=entry[1] * (time.perf_counter() - start))
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+
+# global coalescer shared by all routers
+coalescer = SingleFlight()
@@ -0,0 +1,83 @@
+"""
+Pickup date-range filters
+
+Trip times are stored twice: pickup_datetime as text for display and
+pickup_epoch as integer seconds (the text read as UTC, so both share one
+clock). Range filters compare integers on idx_trips_pickup_epoch, a plain
+index range scan, instead of comparing text.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException, Query
+
+EPOCH = datetime(1970, 1, 1)
+TIME_PATTERN = r"^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2})?)?$"
+
+
+def to_epoch(value: str, end: bool = False):
+    """
+    Epoch seconds of a YYYY-MM-DD[THH:MM[:SS]] string
+
+    A bare date as the end of a range stands for the whole day, so it maps to
+    the following midnight.
+    """
+    moment = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        moment += timedelta(days=1)
+    return int((moment - EPOCH).total_seconds())
+
+
+class TimeRange:
+    """Half-open pickup range [start, end) in epoch seconds; either side may be open"""
+
+    def __init__(self, start: Optional[str] = None, end: Optional[str] = None):
+        self.start = start
+        self.end = end
+        try:
+            self.start_epoch = to_epoch(start) if start is not None else None
+            self.end_epoch = to_epoch(end, end=True) if end is not None else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="start and end must be valid dates or date-times")
+        if self.start_epoch is not None and self.end_epoch is not None and self.start_epoch >= self.end_epoch:
+            raise HTTPException(status_code=400, detail="start must be before end")
+
+    @property
+    def active(self):
+        return self.start_epoch is not None or self.end_epoch is not None
+
+    @property
+    def key(self):
+        """Hashable form for cache and coalescing keys"""
+        return (self.start_epoch, self.end_epoch)
+
+    def conditions(self, column="pickup_epoch"):
+        """SQL conditions on column, bound by params"""
+        conditions = []
+        if self.start_epoch is not None:
+            conditions.append(f"{column} >= :start_epoch")
+        if self.end_epoch is not None:
+            conditions.append(f"{column} < :end_epoch")
+        return conditions
+
+    @property
+    def params(self):
+        params = {}
+        if self.start_epoch is not None:
+            params["start_epoch"] = self.start_epoch
+        if self.end_epoch is not None:
+            params["end_epoch"] = self.end_epoch
+        return params
+
+    @property
+    def filters(self):
+        return {"start": self.start, "end": self.end}
+
+
+def pickup_time_range(
+    start: Optional[str] = Query(None, pattern=TIME_PATTERN,
+                                 description="First pickup time, YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]"),
+    end: Optional[str] = Query(None, pattern=TIME_PATTERN,
+                               description="End of the range, exclusive; a bare date includes that whole day")
+):
+    """Dependency: the start/end query parameters as a TimeRange"""
+    return TimeRange(start, end)
@@ -0,0 +1,171 @@
+"""
+Startup warm-up and readiness
+
+Runs once per process after startup: opens the pooled connections, pulls the
+hot indexes and precomputed tables into the page cache, maps the column
+store, prebuilds the per-version caches and replays the requests of a
+default dashboard load through the app. Until it finishes the process is
+live but not ready (see /health/ready).
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from sqlalchemy import text
+from core.config import settings
+from core.database import engine, get_data_version
+from core.column_store import get_column_store
+
+# uvicorn configures this logger, so startup timings show up in the server output
+logger = logging.getLogger("uvicorn.error")
+
+def dashboard_requests(day_of_week=None, hour_start=None, hour_end=None):
+    """The requests of one dashboard load with the given filters (loadDashboard in frontend/script.js)"""
+    day = [("day_of_week", day_of_week)]
+    hours = [("hour_start", hour_start), ("hour_end", hour_end)]
+    requests = [
+        ("/summary/overview", day + hours),
+        ("/summary/busiest-hour", day),
+        ("/temporal/hourly-distribution", day),
+        ("/custom/hourly-pickups", day),
+        ("/temporal/daily-patterns", hours),
+        ("/clusters/pickup", [("n_clusters", 8)] + day + hours),
+        ("/custom/cluster-ranking", [("n_clusters", 5), ("cluster_type", "pickup")] + day),
+        ("/flows/top-pairs", [("limit", 15)] + day + hours),
+        ("/custom/trip-sorting", [("sort_by", "duration"), ("order", "desc"), ("limit", 10)] + day),
+    ]
+    paths = []
+    for route, params in requests:
+        query = "&".join(f"{name}={value}" for name, value in params if value is not None)
+        paths.append(f"{settings.API_V1_STR}{route}" + (f"?{query}" if query else ""))
+    return paths
+
+
+# requests of one dashboard load with default filters
+DASHBOARD_REQUESTS = dashboard_requests()
+
+
+class StartupState:
+    """Timings and readiness of this process"""
+
+    def __init__(self):
+        self.import_seconds = None
+        self.warmup_seconds = None
+        self.steps = {}
+        self.errors = []
+        self.ready = False
+
+    def to_dict(self):
+        return {
+            "ready": self.ready,
+            "import_ms": None if self.import_seconds is None else round(self.import_seconds * 1000, 1),
+            "warmup_ms": None if self.warmup_seconds is None else round(self.warmup_seconds * 1000, 1),
+            "warmup_steps_ms": {name: round(seconds * 1000, 1) for name, seconds in self.steps.items()},
+            "warmup_errors": self.errors
+        }
+
+
+startup_state = StartupState()
+
+
+def open_pooled_connections():
+    """Check out as many connections as the pool keeps, so requests never pay for connecting"""
+    size = getattr(engine.pool, "size", lambda: 1)()
+    connections = [engine.connect() for _ in range(max(size, 1))]
+    try:
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+def touch_hot_pages():
+    """Read every trips index and every precomputed table once (OS page cache)"""
+    conn = sqlite3.connect(settings.DATABASE_URL.replace("sqlite:///", ""))
+    try:
+        objects = conn.execute("""
+            SELECT type, name, tbl_name FROM sqlite_master
+            WHERE (type = 'index' AND tbl_name = 'trips' AND sql IS NOT NULL)
+               OR (type = 'table' AND name NOT IN ('trips', 'system_metadata') AND name NOT LIKE 'sqlite_%')
+        """).fetchall()
+        for kind, name, table in objects:
+            if kind == "index":
+                conn.execute(f'SELECT COUNT(*) FROM "{table}" INDEXED BY "{name}"').fetchone()
+            else:
+                for _ in conn.execute(f'SELECT * FROM "{name}"'):
+                    pass
+        return len(objects)
+    finally:
+        conn.close()
+
+
+def map_column_store():
+    store = get_column_store(get_data_version())
+    return store.warm() if store is not None else 0
+
+
+async def asgi_get(app, path):
+    """GET a path straight through an ASGI app, without a network round trip; returns (status, body)"""
+    route, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": route, "raw_path": route.encode(), "root_path": "",
+        "query_string": query.encode(), "headers": [(b"host", b"warmup")],
+        "client": ("127.0.0.1", 0), "server": ("warmup", 80)
+    }
+    response = {"status": None, "body": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], b"".join(response["body"])
+
+
+async def run_warmup(app, cache_loaders=()):
+    """
+    Run every warm-up step, recording timings in startup_state
+
+    A failing step is logged and skipped; the process becomes ready anyway,
+    it only serves its first requests cold.
+    """
+    started = time.perf_counter()
+    blocking_steps = [
+        ("connections", open_pooled_connections),
+        ("page_cache", touch_hot_pages),
+        ("column_store", map_column_store),
+    ] + [(f"cache:{loader.__name__}", loader) for loader in cache_loaders]
+
+    for name, step in blocking_steps:
+        step_started = time.perf_counter()
+        try:
+            await asyncio.to_thread(step)
+        except Exception as e:
+            startup_state.errors.append(f"{name}: {e}")
+        startup_state.steps[name] = time.perf_counter() - step_started
+
+    # default dashboard requests (they are counted in /metrics like any other request)
+    step_started = time.perf_counter()
+    for path in DASHBOARD_REQUESTS:
+        try:
+            status, _ = await asgi_get(app, path)
+            if status != 200:
+                startup_state.errors.append(f"{path}: HTTP {status}")
+        except Exception as e:
+            startup_state.errors.append(f"{path}: {e}")
+    startup_state.steps["dashboard_requests"] = time.perf_counter() - step_started
+
+    startup_state.warmup_seconds = time.perf_counter() - started
+    startup_state.ready = True
+    steps = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in startup_state.steps.items())
+    logger.info(f"Warm-up finished in {startup_state.warmup_seconds * 1000:.0f} ms ({steps})")
+    for error in startup_state.errors:
+        logger.warning(f"Warm-up step failed: {error}")
@@ -1,27 +1,35 @@
+import os
+import sys
 from flask import Blueprint, jsonify, request
+import numpy as np
 import pandas as pd
-from sklearn.cluster import DBSCAN
 from database import engine
 
+# the shared algorithm package lives in backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from algorithm.density_clustering import density_hotspots
+
+# meters per degree of latitude, used to read the legacy degree-based eps
+METERS_PER_DEGREE = 111195.0
+
 analysis_bp = Blueprint('analysis', __name__)
 
 @analysis_bp.route('/hotspots', methods=['GET'])
 def get_hotspots():
-    eps = float(request.args.get('eps', 0.01))
+    # eps_m is in meters; the old eps parameter (degrees) is still accepted
+    if 'eps_m' in request.args:
+        eps_m = float(request.args['eps_m'])
+    else:
+        eps_m = float(request.args.get('eps', 0.01)) * METERS_PER_DEGREE
     min_samples = int(request.args.get('min_samples', 50))
+    prebin_m = request.args.get('prebin_m', type=float)
     
-    df = pd.read_sql("SELECT pickup_latitude, pickup_longitude FROM taxi_trips", engine)
-    coords = df[['pickup_latitude', 'pickup_longitude']].to_numpy()
-    clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(coords)
-    df['cluster'] = clustering.labels_
-    
-    clusters_summary = df.groupby('cluster').agg({
-        'pickup_latitude': 'mean',
-        'pickup_longitude': 'mean',
-        'cluster': 'count'
-    }).rename(columns={'cluster': 'num_trips'}).reset_index()
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT pickup_latitude, pickup_longitude FROM taxi_trips").fetchall()
+    coords = np.array(rows, dtype=np.float64).reshape(-1, 2)
     
-    return jsonify(clusters_summary.to_dict(orient='records'))
+    # grid-bucketed DBSCAN: neighbours are only searched in adjacent cells
+    return jsonify(density_hotspots(coords, eps_m=eps_m, min_samples=min_samples, prebin_m=prebin_m))
 
 @analysis_bp.route('/peak_traffic', methods=['GET'])
 def peak_traffic():
@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime
@@ -8,6 +9,29 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.config import settings
+from algorithm.custom_algorithm import haversine_distance as haversine_distances
+
+# cleaning rules, shared by TaxiDataCleaner and validate_trips (live ingestion)
+CRITICAL_COLUMNS = (
+    'pickup_datetime', 'dropoff_datetime',
+    'pickup_longitude', 'pickup_latitude',
+    'dropoff_longitude', 'dropoff_latitude',
+    'trip_duration'
+)
+NUMERIC_COLUMNS = (
+    'vendor_id', 'passenger_count', 'pickup_longitude', 'pickup_latitude',
+    'dropoff_longitude', 'dropoff_latitude', 'trip_duration'
+)
+# fields of a raw trip (the data/raw/train.csv columns)
+RAW_COLUMNS = (
+    'id', 'vendor_id', 'pickup_datetime', 'dropoff_datetime', 'passenger_count',
+    'pickup_longitude', 'pickup_latitude', 'dropoff_longitude', 'dropoff_latitude',
+    'store_and_fwd_flag', 'trip_duration'
+)
+MIN_TRIP_DURATION, MAX_TRIP_DURATION = 30, 10800  # seconds: 30 s to 3 h
+MIN_TRIP_SPEED, MAX_TRIP_SPEED = 1, 120  # km/h
+MIN_TRIP_DISTANCE, MAX_TRIP_DISTANCE = 0.1, 100  # km
+MAX_PASSENGERS = 6
 
 # import utility functions directly to avoid circular imports
 def haversine_distance(lat1, lon1, lat2, lon2):
@@ -41,6 +65,89 @@ def validate_nyc_coordinates(lat, lon):
         settings.NYC_MIN_LON <= lon <= settings.NYC_MAX_LON
     )
 
+def nyc_coordinates_mask(lat, lon):
+    """Vectorized validate_nyc_coordinates: True where the point is inside the configured bounds (NaN is not)"""
+    return (
+        (lat >= settings.NYC_MIN_LAT) & (lat <= settings.NYC_MAX_LAT) &
+        (lon >= settings.NYC_MIN_LON) & (lon <= settings.NYC_MAX_LON)
+    )
+
+def add_temporal_features(df):
+    """Hour, day, month, year, day of week and weekend flag of the (datetime) pickup times"""
+    df['pickup_hour'] = df['pickup_datetime'].dt.hour
+    df['pickup_day'] = df['pickup_datetime'].dt.day
+    df['pickup_month'] = df['pickup_datetime'].dt.month
+    df['pickup_year'] = df['pickup_datetime'].dt.year
+    df['day_of_week'] = df['pickup_datetime'].dt.dayofweek
+    df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
+    return df
+
+def add_distance_features(df):
+    """Haversine trip distance and average speed (NaN instead of infinite speeds)"""
+    df['trip_distance_km'] = haversine_distances(
+        df['pickup_latitude'].to_numpy(dtype=np.float64), df['pickup_longitude'].to_numpy(dtype=np.float64),
+        df['dropoff_latitude'].to_numpy(dtype=np.float64), df['dropoff_longitude'].to_numpy(dtype=np.float64)
+    )
+    df['trip_speed_km_h'] = (df['trip_distance_km'] / (df['trip_duration'] / 3600))
+    df['trip_speed_km_h'] = df['trip_speed_km_h'].replace([np.inf, -np.inf], np.nan)
+    return df
+
+def plausible_trip_mask(df):
+    """Speed, distance and passenger count within the cleaning limits"""
+    mask = (
+        (df['trip_speed_km_h'] >= MIN_TRIP_SPEED) & (df['trip_speed_km_h'] <= MAX_TRIP_SPEED) &
+        (df['trip_distance_km'] >= MIN_TRIP_DISTANCE) & (df['trip_distance_km'] <= MAX_TRIP_DISTANCE)
+    )
+    if 'passenger_count' in df.columns:
+        mask &= (df['passenger_count'] > 0) & (df['passenger_count'] <= MAX_PASSENGERS)
+    return mask
+
+def validate_trips(df):
+    """
+    Apply the cleaning rules to a batch of raw trips in one vectorized pass
+    
+    Same filters as TaxiDataCleaner.clean_data (without sampling) for trips
+    arriving through the API: unparseable values count as missing, and
+    duplicates are only detected within the batch.
+    
+    Returns:
+        (valid trips with the derived columns, {input position: rejection reason})
+    """
+    df = df.reset_index(drop=True)
+    reasons = pd.Series(None, index=df.index, dtype=object)
+    
+    def reject(mask, reason):
+        reasons[mask & reasons.isna()] = reason
+    
+    for column in CRITICAL_COLUMNS:
+        if column not in df.columns:
+            df[column] = np.nan
+    for column in NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    for column in ('pickup_datetime', 'dropoff_datetime'):
+        # the dataset holds naive local times, values with a UTC offset are not comparable
+        text = df[column].astype('string')
+        has_offset = text.str.contains(r'(?:Z|[+-]\d{2}:?\d{2})$', na=False)
+        df[column] = pd.to_datetime(text.mask(has_offset), errors='coerce', format='ISO8601')
+    
+    for column in CRITICAL_COLUMNS:
+        reject(df[column].isna(), f"missing or invalid {column}")
+    reject(df.duplicated(), "duplicate trip")
+    if 'id' in df.columns:
+        reject(df['id'].notna() & df.duplicated(subset=['id']), "duplicate id")
+    reject(~(nyc_coordinates_mask(df['pickup_latitude'], df['pickup_longitude']) &
+             nyc_coordinates_mask(df['dropoff_latitude'], df['dropoff_longitude'])),
+           "coordinates outside NYC bounds")
+    reject((df['trip_duration'] < MIN_TRIP_DURATION) | (df['trip_duration'] > MAX_TRIP_DURATION),
+           "trip_duration out of range")
+    
+    df = add_distance_features(df)
+    reject(~plausible_trip_mask(df), "impossible speed, distance or passenger count")
+    
+    valid = add_temporal_features(df[reasons.isna()].copy())
+    return valid, reasons.dropna().to_dict()
+
 class TaxiDataCleaner:
     """
     Comprehensive cleaning pipeline for NYC Taxi Trip data
@@ -134,16 +241,8 @@ class TaxiDataCleaner:
         else:
             print("No missing values found")
         
-        # remove rows with critical missing values
-        critical_columns = [
-            'pickup_datetime', 'dropoff_datetime',
-            'pickup_longitude', 'pickup_latitude',
-            'dropoff_longitude', 'dropoff_latitude',
-            'trip_duration'
-        ]
-        
-        # check which critical columns exist in the dataset
-        existing_critical = [col for col in critical_columns if col in df.columns]
+        # remove rows with critical missing values (only the critical columns present in the dataset)
+        existing_critical = [col for col in CRITICAL_COLUMNS if col in df.columns]
         
         df_clean = df.dropna(subset=existing_critical)
         
@@ -190,17 +289,9 @@ class TaxiDataCleaner:
         
         initial_count = len(df)
         
-        # filter pickup coordinates within NYC bounds
-        pickup_mask = df.apply(
-            lambda row: validate_nyc_coordinates(row['pickup_latitude'], row['pickup_longitude']), 
-            axis=1
-        )
-        
-        # filter dropoff coordinates within NYC bounds
-        dropoff_mask = df.apply(
-            lambda row: validate_nyc_coordinates(row['dropoff_latitude'], row['dropoff_longitude']), 
-            axis=1
-        )
+        # filter pickup and dropoff coordinates within NYC bounds
+        pickup_mask = nyc_coordinates_mask(df['pickup_latitude'], df['pickup_longitude'])
+        dropoff_mask = nyc_coordinates_mask(df['dropoff_latitude'], df['dropoff_longitude'])
         
         df_clean = df[pickup_mask & dropoff_mask]
         
@@ -222,7 +313,7 @@ class TaxiDataCleaner:
         
         # remove trips that are too short or too long
         # minimum: 30 seconds, Maximum: 3 hours (10800 seconds)
-        duration_mask = (df['trip_duration'] >= 30) & (df['trip_duration'] <= 10800)
+        duration_mask = (df['trip_duration'] >= MIN_TRIP_DURATION) & (df['trip_duration'] <= MAX_TRIP_DURATION)
         
         df_clean = df[duration_mask]
         
@@ -245,12 +336,7 @@ class TaxiDataCleaner:
         df['dropoff_datetime'] = pd.to_datetime(df['dropoff_datetime'])
         
         # extract temporal features
-        df['pickup_hour'] = df['pickup_datetime'].dt.hour
-        df['pickup_day'] = df['pickup_datetime'].dt.day
-        df['pickup_month'] = df['pickup_datetime'].dt.month
-        df['pickup_year'] = df['pickup_datetime'].dt.year
-        df['day_of_week'] = df['pickup_datetime'].dt.dayofweek
-        df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
+        df = add_temporal_features(df)
         
         print("Extracted temporal features: hour, day, month, day_of_week, is_weekend")
         
@@ -260,22 +346,8 @@ class TaxiDataCleaner:
         """Calculate derived features like distance and speed"""
         print("Calculating derived features...")
         
-        # calculate trip distance using Haversine formula
-        print("  Calculating trip distances...")
-        df['trip_distance_km'] = df.apply(
-            lambda row: haversine_distance(
-                row['pickup_latitude'], row['pickup_longitude'],
-                row['dropoff_latitude'], row['dropoff_longitude']
-            ), 
-            axis=1
-        )
-        
-        # calculate trip speed (km/h)
-        print("  Calculating trip speeds...")
-        df['trip_speed_km_h'] = (df['trip_distance_km'] / (df['trip_duration'] / 3600))
-        
-        # handle infinite values from division by zero
-        df['trip_speed_km_h'] = df['trip_speed_km_h'].replace([np.inf, -np.inf], np.nan)
+        # trip distance using the Haversine formula, then speed (km/h), for all trips at once
+        df = add_distance_features(df)
         
         print("Calculated derived features: distance, speed")
         
@@ -287,19 +359,8 @@ class TaxiDataCleaner:
         
         initial_count = len(df)
         
-        # filter reasonable speeds (1 km/h to 120 km/h)
-        speed_mask = (df['trip_speed_km_h'] >= 1) & (df['trip_speed_km_h'] <= 120)
-        
-        # filter reasonable distances (0.1 km to 100 km)
-        distance_mask = (df['trip_distance_km'] >= 0.1) & (df['trip_distance_km'] <= 100)
-        
-        # filter zero passenger trips
-        if 'passenger_count' in df.columns:
-            passenger_mask = (df['passenger_count'] > 0) & (df['passenger_count'] <= 6)
-        else:
-            passenger_mask = pd.Series([True] * len(df))
-        
-        df_clean = df[speed_mask & distance_mask & passenger_mask]
+        # reasonable speeds (1 to 120 km/h), distances (0.1 to 100 km) and passenger counts (1 to 6)
+        df_clean = df[plausible_trip_mask(df)]
         
         removed = initial_count - len(df_clean)
         if removed > 0:
@@ -335,9 +396,10 @@ class TaxiDataCleaner:
             print("No missing values in final dataset")
         
         # validate data ranges
-        valid_speed = ((df['trip_speed_km_h'] >= 1) & (df['trip_speed_km_h'] <= 120)).all()
-        valid_duration = ((df['trip_duration'] >= 30) & (df['trip_duration'] <= 10800)).all()
-        valid_distance = ((df['trip_distance_km'] >= 0.1) & (df['trip_distance_km'] <= 100)).all()
+        valid_speed = ((df['trip_speed_km_h'] >= MIN_TRIP_SPEED) & (df['trip_speed_km_h'] <= MAX_TRIP_SPEED)).all()
+        valid_duration = ((df['trip_duration'] >= MIN_TRIP_DURATION) & (df['trip_duration'] <= MAX_TRIP_DURATION)).all()
+        valid_distance = ((df['trip_distance_km'] >= MIN_TRIP_DISTANCE) &
+                          (df['trip_distance_km'] <= MAX_TRIP_DISTANCE)).all()
         
         if all([valid_speed, valid_duration, valid_distance]):
             print("All data validation checks passed")
@@ -419,7 +481,17 @@ Configuration used:
 
 def main():
     """Main function to run the cleaning pipeline"""
+    parser = argparse.ArgumentParser(description="Clean the raw NYC taxi trip CSV")
+    parser.add_argument("--input", help="raw CSV (default: data/raw/train.csv)")
+    parser.add_argument("--output", help="cleaned CSV (default: data/clean/clean.csv)")
+    args = parser.parse_args()
+    
     cleaner = TaxiDataCleaner()
+    if args.input:
+        cleaner.raw_data_path = args.input
+    if args.output:
+        cleaner.cleaned_data_path = args.output
+        cleaner.log_path = os.path.join(os.path.dirname(args.output) or ".", "clean_log.txt")
     cleaner.run_pipeline()
 
 if __name__ == "__main__":
@@ -0,0 +1,365 @@
+"""
+Deterministic synthetic NYC taxi trips in the train.csv schema
+
+Writes CSVs of any size with the columns of data/raw/train.csv, for scale
+testing the cleaning pipeline, db_setup and the API. The output depends only
+on --seed, --rows and --dirty: rows are generated in fixed-size chunks, each
+from its own seeded generator, and formatted straight into a byte matrix
+with NumPy (no per-row Python), so memory stays O(chunk) at any size and
+chunks can be generated by several processes (--jobs) without changing the
+output.
+
+Trips follow weekday/weekend hour profiles and busier Thursdays-Saturdays
+over January-June 2016, start and end around pickup hotspots inside the
+configured NYC bounds, and take as long as the distance at an hour-dependent
+traffic speed. A --dirty fraction of rows gets one defect the cleaner
+removes: coordinates outside NYC, an impossible duration, a duplicate of an
+earlier row, or an empty critical field.
+
+Usage (from backend/):
+    python data/generate_trips.py --rows 10000000 --output data/raw/train_10m.csv
+    python data/cleaning.py --input data/raw/train_10m.csv --output data/clean/clean.csv
+"""
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+
+# add the parent directory to path to import core modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import settings
+from algorithm.custom_algorithm import haversine_distance
+
+CHUNK_ROWS = 1 << 17  # fixed, so the output does not depend on how it is written
+HEADER = (b"id,vendor_id,pickup_datetime,dropoff_datetime,passenger_count,pickup_longitude,"
+          b"pickup_latitude,dropoff_longitude,dropoff_latitude,store_and_fwd_flag,trip_duration\n")
+
+START_EPOCH = 1451606400  # 2016-01-01 00:00:00
+DAYS = 182                # through 2016-06-30
+
+# share of trips per hour of day (NYC yellow cabs, 2016)
+WEEKDAY_HOURS = np.array([2.4, 1.4, 0.9, 0.6, 0.6, 1.0, 2.6, 4.2, 4.9, 4.6, 4.4, 4.5,
+                          4.7, 4.6, 4.9, 4.8, 4.2, 5.0, 6.3, 6.6, 6.1, 5.9, 5.6, 4.2])
+WEEKEND_HOURS = np.array([5.4, 4.6, 3.7, 2.8, 1.9, 1.1, 1.0, 1.4, 2.2, 3.2, 4.0, 4.6,
+                          4.9, 5.0, 5.0, 4.8, 4.6, 4.8, 5.2, 5.3, 5.0, 5.0, 5.2, 5.0])
+# relative trips per day of week, 0 = Monday
+DAY_OF_WEEK_WEIGHTS = np.array([0.88, 0.95, 1.00, 1.05, 1.09, 1.08, 0.95])
+# median traffic speed in km/h by hour of day
+HOUR_SPEEDS = np.array([24, 26, 27, 28, 29, 27, 22, 16, 13, 13, 14, 14,
+                        14, 14, 13, 13, 14, 13, 13, 15, 17, 19, 21, 23])
+
+# (lat, lon, spread in km, share of pickups)
+HOTSPOTS = [
+    (40.7549, -73.9840, 1.2, 0.28),  # Midtown
+    (40.7260, -73.9950, 1.1, 0.16),  # Village / SoHo
+    (40.7077, -74.0110, 0.8, 0.07),  # Financial District
+    (40.7736, -73.9566, 1.2, 0.13),  # Upper East Side
+    (40.7870, -73.9754, 1.1, 0.09),  # Upper West Side
+    (40.7420, -74.0048, 0.8, 0.08),  # Chelsea
+    (40.6413, -73.7781, 1.0, 0.03),  # JFK
+    (40.7769, -73.8740, 0.5, 0.03),  # LaGuardia
+    (40.7081, -73.9571, 1.5, 0.04),  # Williamsburg
+    (40.6892, -73.9857, 1.3, 0.03),  # Downtown Brooklyn
+    (40.7447, -73.9485, 1.4, 0.03),  # Long Island City
+    (40.8116, -73.9465, 1.5, 0.03),  # Harlem
+]
+LOCAL_TRIP_SHARE = 0.45  # trips that end near where they started
+
+PASSENGER_COUNTS = np.array([1, 2, 3, 4, 5, 6])
+PASSENGER_WEIGHTS = np.array([0.71, 0.14, 0.04, 0.02, 0.05, 0.04])
+
+# columns a missing-value defect can empty (the cleaner drops rows missing any of them)
+CRITICAL_COLUMNS = ["pickup_epoch", "dropoff_epoch", "pickup_longitude", "pickup_latitude",
+                    "dropoff_longitude", "dropoff_latitude", "trip_duration"]
+DEFECT_BAD_COORDINATES, DEFECT_BAD_DURATION, DEFECT_DUPLICATE, DEFECT_MISSING = range(4)
+
+KM_PER_DEGREE = 111.2
+
+
+def _day_weights():
+    day_of_week = (np.arange(DAYS) + 4) % 7  # 2016-01-01 was a Friday
+    weights = DAY_OF_WEEK_WEIGHTS[day_of_week]
+    return weights / weights.sum(), day_of_week >= 5
+
+
+def _near(rng, lat, lon, spread_km):
+    """Points scattered around (lat, lon) with a spread given in km"""
+    lat = lat + rng.normal(0, 1, len(lat)) * spread_km / KM_PER_DEGREE
+    lon = lon + rng.normal(0, 1, len(lon)) * spread_km / (KM_PER_DEGREE * np.cos(np.radians(lat)))
+    return (np.clip(lat, settings.NYC_MIN_LAT, settings.NYC_MAX_LAT),
+            np.clip(lon, settings.NYC_MIN_LON, settings.NYC_MAX_LON))
+
+
+def trip_chunk(seed, chunk_index, rows, first_id, dirty_fraction=0.0):
+    """
+    One chunk of trips as {column: array}
+
+    Columns are those of train.csv with the datetimes as epoch seconds
+    (pickup_epoch, dropoff_epoch). chunk["missing"] maps a column to the rows
+    whose value is empty in the CSV.
+    """
+    rng = np.random.default_rng([seed, chunk_index])
+    day_weights, day_is_weekend = _day_weights()
+
+    # when: day by day-of-week weight, hour by the weekday/weekend profile
+    day = rng.choice(DAYS, size=rows, p=day_weights)
+    weekend = day_is_weekend[day]
+    u = rng.random(rows)
+    hour = np.where(weekend,
+                    np.searchsorted(np.cumsum(WEEKEND_HOURS) / WEEKEND_HOURS.sum(), u),
+                    np.searchsorted(np.cumsum(WEEKDAY_HOURS) / WEEKDAY_HOURS.sum(), u))
+    hour = np.minimum(hour, 23)
+    pickup_epoch = START_EPOCH + day * 86400 + hour * 3600 + rng.integers(0, 3600, size=rows)
+
+    # where: pickup around a hotspot, dropoff near the pickup or around another hotspot
+    spots = np.array([spot[:3] for spot in HOTSPOTS])
+    shares = np.array([spot[3] for spot in HOTSPOTS])
+    pickup = spots[rng.choice(len(spots), size=rows, p=shares / shares.sum())]
+    dropoff = spots[rng.choice(len(spots), size=rows, p=shares / shares.sum())]
+    pickup_lat, pickup_lon = _near(rng, pickup[:, 0], pickup[:, 1], pickup[:, 2])
+    local = rng.random(rows) < LOCAL_TRIP_SHARE
+    far_lat, far_lon = _near(rng, dropoff[:, 0], dropoff[:, 1], dropoff[:, 2])
+    near_lat, near_lon = _near(rng, pickup_lat, pickup_lon, np.full(rows, 1.5))
+    dropoff_lat = np.where(local, near_lat, far_lat)
+    dropoff_lon = np.where(local, near_lon, far_lon)
+
+    # how long: road distance at the hour's traffic speed, plus boarding time
+    road_km = 1.3 * haversine_distance(pickup_lat, pickup_lon, dropoff_lat, dropoff_lon) + 0.2
+    speed = HOUR_SPEEDS[hour] * rng.lognormal(0, 0.25, size=rows)
+    duration = (road_km / speed * 3600 + rng.integers(30, 180, size=rows)).astype(np.int64)
+
+    chunk = {
+        "id": np.arange(first_id, first_id + rows, dtype=np.int64),
+        "vendor_id": np.where(rng.random(rows) < 0.53, 2, 1),
+        "pickup_epoch": pickup_epoch,
+        "dropoff_epoch": pickup_epoch + duration,
+        "passenger_count": PASSENGER_COUNTS[rng.choice(len(PASSENGER_COUNTS), size=rows, p=PASSENGER_WEIGHTS)],
+        "pickup_longitude": pickup_lon,
+        "pickup_latitude": pickup_lat,
+        "dropoff_longitude": dropoff_lon,
+        "dropoff_latitude": dropoff_lat,
+        "store_and_fwd_flag": rng.random(rows) < 0.0055,  # True = "Y"
+        "trip_duration": duration,
+        "missing": {},
+    }
+    if dirty_fraction > 0:
+        _add_defects(rng, chunk, rows, dirty_fraction)
+    return chunk
+
+
+def _add_defects(rng, chunk, rows, dirty_fraction):
+    dirty = np.flatnonzero(rng.random(rows) < dirty_fraction)
+    kind = rng.integers(0, 4, size=len(dirty))
+
+    rows_ = dirty[kind == DEFECT_BAD_COORDINATES]
+    half = len(rows_) // 2
+    chunk["pickup_latitude"][rows_[:half]] = 0.0   # unset GPS fix
+    chunk["pickup_longitude"][rows_[:half]] = 0.0
+    chunk["dropoff_longitude"][rows_[half:]] -= rng.uniform(1, 3, size=len(rows_) - half)  # west of NYC
+
+    rows_ = dirty[kind == DEFECT_BAD_DURATION]
+    half = len(rows_) // 2
+    chunk["trip_duration"][rows_[:half]] = rng.integers(1, 30, size=half)
+    chunk["trip_duration"][rows_[half:]] = rng.integers(10801, 86400 * 3, size=len(rows_) - half)
+    chunk["dropoff_epoch"][rows_] = chunk["pickup_epoch"][rows_] + chunk["trip_duration"][rows_]
+
+    rows_ = dirty[kind == DEFECT_MISSING]
+    column = rng.integers(0, len(CRITICAL_COLUMNS), size=len(rows_))
+    for i, name in enumerate(CRITICAL_COLUMNS):
+        mask = np.zeros(rows, dtype=bool)
+        mask[rows_[column == i]] = True
+        chunk["missing"][name] = mask
+
+    # duplicates last, so they copy an earlier row exactly (defects included)
+    rows_ = dirty[(kind == DEFECT_DUPLICATE) & (dirty > 0)]
+    source = (rng.random(len(rows_)) * rows_).astype(np.int64)
+    for name, values in chunk.items():
+        if name != "missing":
+            values[rows_] = values[source]
+    for mask in chunk["missing"].values():
+        mask[rows_] = mask[source]
+
+
+def iter_trip_chunks(rows, seed=42, dirty_fraction=0.0):
+    """Yield trip_chunk()s covering `rows` trips, ids 1..rows"""
+    for chunk_index, start in enumerate(range(0, rows, CHUNK_ROWS)):
+        yield trip_chunk(seed, chunk_index, min(CHUNK_ROWS, rows - start), start + 1, dirty_fraction)
+
+
+# CSV formatting: a chunk is written into an (n x units) uint32 matrix, each
+# unit holding up to 4 ASCII bytes of one row (3 digits, a separator, ...)
+# taken from lookup tables and padded with 0 bytes. Deleting the 0 bytes
+# from the matrix's buffer leaves the CSV text.
+
+def _unit_table(texts):
+    return np.frombuffer(b"".join(text.encode().ljust(4, b"\0") for text in texts), dtype=np.uint32)
+
+_PADDED = _unit_table(f"{i:03d}" for i in range(1000))  # 000..999
+_LEADING = _unit_table(str(i) for i in range(1000))     # 0..999, no leading zeros
+_LAST_DIGITS = {k: _unit_table(f"{i:03d}"[3 - k:] for i in range(1000)) for k in (1, 2, 3)}
+_SEPARATORS = dict(zip("-. ,\nYN", _unit_table("-. ,\nYN")))
+_TIME_OF_DAY = None  # (86400 x 2) units of every HH:MM:SS, built on first use
+
+
+def _digit_units(width):
+    return (width + 2) // 3
+
+
+def _write_digits(out, values, width, pad_zeros=False):
+    """Write non-negative integers (< 2^53) into out (n x _digit_units(width)), zero-padded to width if pad_zeros"""
+    n_groups = out.shape[1]
+    remaining = np.asarray(values, dtype=np.float64)  # float division is exact here and much faster
+    for i in range(n_groups):
+        quotient = np.floor(remaining / 1000)
+        group = (remaining - quotient * 1000).astype(np.intp)
+        column = n_groups - 1 - i
+        if pad_zeros:
+            out[:, column] = (_PADDED if i < n_groups - 1 else _LAST_DIGITS[width - 3 * i])[group]
+        else:
+            unit = np.where(quotient > 0, _PADDED[group], _LEADING[group])
+            if i > 0:
+                unit[(quotient == 0) & (group == 0)] = 0
+            out[:, column] = unit
+        remaining = quotient
+
+
+DECIMAL_UNITS = 5  # sign, up to 3 integer digits, '.', 6 decimals
+
+def _write_decimal(out, values):
+    """Write floats (|x| < 1000) with 6 decimals into out (n x DECIMAL_UNITS)"""
+    scaled = np.rint(np.abs(values) * 1e6)
+    whole = np.floor(scaled / 1e6)
+    out[:, 0] = np.where((values < 0) & (scaled > 0), _SEPARATORS["-"], 0)
+    _write_digits(out[:, 1:2], whole, 3)
+    out[:, 2] = _SEPARATORS["."]
+    _write_digits(out[:, 3:5], scaled - whole * 1e6, 6, pad_zeros=True)
+
+
+DATETIME_UNITS = 6  # 'YYYY-MM-DD' in 3 units, ' ', 'HH:MM:SS' in 2 units
+
+def _write_datetime(out, epochs):
+    """Write epoch seconds as 'YYYY-MM-DD HH:MM:SS' into out (n x DATETIME_UNITS)"""
+    global _TIME_OF_DAY
+    if _TIME_OF_DAY is None:
+        _TIME_OF_DAY = np.frombuffer(b"".join(
+            f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}".encode() for s in range(86400)
+        ), dtype=np.uint32).reshape(86400, 2)
+    days = epochs // 86400
+    first = days.min()
+    dates = np.datetime_as_string(np.arange(first, days.max() + 1).astype("datetime64[D]"))
+    date_table = np.frombuffer(b"".join(date.encode() + b"\0\0" for date in dates), dtype=np.uint32).reshape(-1, 3)
+    out[:, 0:3] = date_table[days - first]
+    out[:, 3] = _SEPARATORS[" "]
+    out[:, 4:6] = _TIME_OF_DAY[epochs % 86400]
+
+
+def format_csv_chunk(chunk, id_width=7):
+    """CSV bytes (no header) of one trip chunk, in train.csv column order"""
+    n = len(chunk["id"])
+    id_units = 1 + _digit_units(id_width)
+
+    def write_id(out, values):
+        out[:, 0] = _unit_table(["id"])[0]
+        _write_digits(out[:, 1:], values, id_width, pad_zeros=True)
+
+    def write_flag(out, values):
+        out[:, 0] = np.where(values, _SEPARATORS["Y"], _SEPARATORS["N"])
+
+    # (chunk column, units, writer)
+    fields = [
+        ("id", id_units, write_id),
+        ("vendor_id", 1, lambda out, values: _write_digits(out, values, 1)),
+        ("pickup_epoch", DATETIME_UNITS, _write_datetime),
+        ("dropoff_epoch", DATETIME_UNITS, _write_datetime),
+        ("passenger_count", 1, lambda out, values: _write_digits(out, values, 1)),
+        ("pickup_longitude", DECIMAL_UNITS, _write_decimal),
+        ("pickup_latitude", DECIMAL_UNITS, _write_decimal),
+        ("dropoff_longitude", DECIMAL_UNITS, _write_decimal),
+        ("dropoff_latitude", DECIMAL_UNITS, _write_decimal),
+        ("store_and_fwd_flag", 1, write_flag),
+        ("trip_duration", 3, lambda out, values: _write_digits(out, values, 7)),
+    ]
+    row_units = sum(units for _, units, _ in fields) + len(fields)
+    buffer = bytearray(n * row_units * 4)
+    matrix = np.frombuffer(buffer, dtype=np.uint32).reshape(n, row_units)
+    offset = 0
+    for name, units, write in fields:
+        write(matrix[:, offset:offset + units], chunk[name])
+        missing = chunk["missing"].get(name)
+        if missing is not None:
+            matrix[missing, offset:offset + units] = 0
+        matrix[:, offset + units] = _SEPARATORS[","]
+        offset += units + 1
+    matrix[:, -1] = _SEPARATORS["\n"]
+    del matrix
+    return bytes(buffer.translate(None, b"\0"))
+
+
+def _csv_block(task):
+    seed, chunk_index, rows, first_id, dirty_fraction, id_width = task
+    return format_csv_chunk(trip_chunk(seed, chunk_index, rows, first_id, dirty_fraction), id_width)
+
+
+def iter_csv_chunks(rows, seed=42, dirty_fraction=0.0, jobs=1):
+    """
+    Yield the CSV bytes of `rows` trips: the header, then one block per chunk
+
+    With jobs > 1 chunks are generated by a process pool; at most 2 * jobs
+    blocks are in flight, so memory stays bounded however slow the consumer.
+    """
+    id_width = max(7, len(str(rows)))
+    tasks = ((seed, chunk_index, min(CHUNK_ROWS, rows - start), start + 1, dirty_fraction, id_width)
+             for chunk_index, start in enumerate(range(0, rows, CHUNK_ROWS)))
+    yield HEADER
+    if jobs <= 1:
+        yield from map(_csv_block, tasks)
+        return
+
+    with multiprocessing.Pool(jobs) as pool:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_csv_block, (task,)))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def write_trips_csv(path, rows, seed=42, dirty_fraction=0.02, jobs=1):
+    """Write `rows` synthetic trips to path, returns the number of bytes written"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    written = 0
+    with open(path, "wb") as f:
+        for block in iter_csv_chunks(rows, seed, dirty_fraction, jobs):
+            f.write(block)
+            written += len(block)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic NYC taxi trips in the train.csv schema")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--output", default="data/raw/train_synthetic.csv")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dirty", type=float, default=0.02, help="fraction of rows with a defect (0-1)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="generator processes (the output does not depend on it)")
+    args = parser.parse_args()
+    if not 0 <= args.dirty <= 1:
+        parser.error("--dirty must be between 0 and 1")
+
+    print(f"Generating {args.rows:,} trips (seed {args.seed}, {args.dirty:.1%} dirty, {args.jobs} jobs) into {args.output}...")
+    start = time.perf_counter()
+    written = write_trips_csv(args.output, args.rows, args.seed, args.dirty, args.jobs)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written / 2**20:,.1f} MB in {elapsed:.1f}s ({written / 2**20 / elapsed:,.0f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
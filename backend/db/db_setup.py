@@ -1,4 +1,7 @@
+import argparse
+import re
 import sqlite3
+import numpy as np
 import pandas as pd
 import os
 import sys
@@ -6,6 +9,30 @@ import sys
 # add the parent directory to path to import core modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from core.config import settings
+from algorithm.spatial_pyramid import build_pickup_pyramid
+from algorithm.time_series import build_minute_series
+from algorithm.quantile_sketch import SKETCH_METRICS, build_group_sketches
+from algorithm.density_raster import build_heatmap_tiles, encode_tile
+from core.approx import STRATUM_COLUMNS, sample_table_name, stratified_sample
+from core.column_store import write_column_store
+from core.database import format_data_version, table_exists, column_exists
+
+# integer epoch column -> text datetime column it is derived from
+EPOCH_COLUMNS = {"pickup_epoch": "pickup_datetime", "dropoff_epoch": "dropoff_datetime"}
+
+def add_epoch_columns(cursor, table):
+    """Add and fill the epoch columns a trips-shaped table lacks; returns the added column names"""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    added = []
+    for column, source in EPOCH_COLUMNS.items():
+        if column in existing:
+            continue
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        cursor.execute(f"UPDATE {table} SET {column} = CAST(strftime('%s', {source}) AS INTEGER)")
+        added.append(f"{table}.{column}")
+    return added
+
 class DatabaseSetup:
     """
     Complete database setup and data loading
@@ -29,9 +56,16 @@ class DatabaseSetup:
             with open(self.schema_path, 'r') as f:
                 schema_sql = f.read()
             
+            # a trips table from before the epoch columns needs them for the schema's indexes
+            if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'trips'").fetchone():
+                add_epoch_columns(cursor, 'trips')
+            
             cursor.executescript(schema_sql)
             conn.commit()
             
+            # write-ahead log, so readers keep reading while trips are ingested (persists in the file)
+            cursor.execute("PRAGMA journal_mode = WAL")
+            
             print("Database schema created successfully")
             
             # verify tables were created
@@ -72,6 +106,10 @@ class DatabaseSetup:
             df = pd.read_csv(self.cleaned_data_path)
             print(f"Loaded {len(df):,} records from cleaned CSV")
             
+            # integer epoch seconds for range filters, the text datetimes stay for display
+            for column, source in EPOCH_COLUMNS.items():
+                df[column] = (pd.to_datetime(df[source]) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+            
             # connect to database
             conn = sqlite3.connect(self.db_path)
             
@@ -79,8 +117,11 @@ class DatabaseSetup:
             print("Inserting data into trips table...")
             df.to_sql('trips', conn, if_exists='replace', index=False)
             
-            # update metadata
+            # replacing the table dropped the schema's indexes, build them on the loaded rows
             cursor = conn.cursor()
+            self.create_trip_indexes(cursor)
+            
+            # update metadata
             cursor.execute(
                 "UPDATE system_metadata SET value = ? WHERE key = 'total_trips'",
                 (str(len(df)),)
@@ -99,6 +140,280 @@ class DatabaseSetup:
             print(f"Error loading data: {e}")
             return False
     
+    def create_trip_indexes(self, cursor):
+        """Create the trips indexes declared in schema.sql (replacing the table with to_sql drops them)"""
+        with open(self.schema_path, 'r') as f:
+            statements = re.findall(r"CREATE INDEX IF NOT EXISTS \w+ ON trips\([^)]*\)", f.read())
+        for statement in statements:
+            cursor.execute(statement)
+        return len(statements)
+    
+    def migrate_epoch_columns(self):
+        """
+        Add pickup_epoch/dropoff_epoch to a database loaded before they existed
+        
+        Fills them from the text datetimes in trips and in the sample tables
+        (which copy every trips column), then builds the trips indexes. Safe to
+        run repeatedly: tables that already have the columns are left alone.
+        """
+        print("Migrating epoch timestamp columns...")
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            tables = ['trips'] + [
+                sample_table_name(rate) for rate in settings.APPROX_SAMPLE_RATES
+                if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (sample_table_name(rate),)).fetchone()
+            ]
+            migrated = []
+            for table in tables:
+                migrated += add_epoch_columns(cursor, table)
+            
+            # the text column is only displayed now, range filters use the epoch index
+            cursor.execute("DROP INDEX IF EXISTS idx_trips_pickup_datetime")
+            self.create_trip_indexes(cursor)
+            cursor.execute("UPDATE system_metadata SET value = '1.1' WHERE key = 'database_version'")
+            
+            conn.commit()
+            conn.close()
+            
+            print(f"Epoch columns added: {', '.join(migrated)}" if migrated else "Epoch columns already present")
+            return True
+            
+        except Exception as e:
+            print(f"Error migrating epoch columns: {e}")
+            return False
+    
+    def build_column_store(self):
+        """Write the memory-mapped column store of the trips for the analytics endpoints"""
+        print("Building column store...")
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            metadata = dict(conn.execute("SELECT key, value FROM system_metadata").fetchall())
+            manifest = write_column_store(conn, settings.COLUMN_STORE_DIR, format_data_version(metadata))
+            conn.close()
+            
+            print(f"Column store built: {manifest['row_count']:,} rows x {len(manifest['columns'])} columns "
+                  f"in {settings.COLUMN_STORE_DIR}")
+            return True
+            
+        except Exception as e:
+            print(f"Error building column store: {e}")
+            return False
+    
+    def build_pickup_pyramid(self):
+        """Precompute pickup counts, centroids and sample points for every pyramid zoom level"""
+        print("Building pickup pyramid...")
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            rows = cursor.execute("""
+                SELECT pickup_latitude, pickup_longitude FROM trips
+                WHERE pickup_latitude IS NOT NULL AND pickup_longitude IS NOT NULL
+                ORDER BY rowid
+            """).fetchall()
+            coords = np.array(rows, dtype=np.float64).reshape(-1, 2)
+            
+            pyramid = build_pickup_pyramid(
+                coords[:, 0], coords[:, 1], settings.NYC_BOUNDS, settings.PYRAMID_MAX_ZOOM,
+                samples_per_cell=settings.PYRAMID_SAMPLES_PER_CELL
+            )
+            
+            # rebuild from scratch so a reload never mixes old and new cells
+            cursor.execute("DELETE FROM pickup_pyramid")
+            cursor.execute("DELETE FROM pickup_pyramid_samples")
+            for zoom, level in pyramid.items():
+                cursor.executemany(
+                    "INSERT INTO pickup_pyramid VALUES (?, ?, ?, ?, ?, ?)",
+                    zip([zoom] * len(level["cell_x"]), level["cell_x"].tolist(), level["cell_y"].tolist(),
+                        level["point_count"].tolist(), level["center_lat"].tolist(), level["center_lon"].tolist())
+                )
+                cursor.executemany(
+                    "INSERT INTO pickup_pyramid_samples VALUES (?, ?, ?, ?, ?)",
+                    zip([zoom] * len(level["sample_cell"]), level["cell_x"][level["sample_cell"]].tolist(),
+                        level["cell_y"][level["sample_cell"]].tolist(),
+                        level["sample_lat"].tolist(), level["sample_lon"].tolist())
+                )
+            
+            conn.commit()
+            conn.close()
+            
+            total_cells = sum(len(level["cell_x"]) for level in pyramid.values())
+            print(f"Pickup pyramid built: {len(pyramid)} zoom levels, {total_cells:,} cells")
+            return True
+            
+        except Exception as e:
+            print(f"Error building pickup pyramid: {e}")
+            return False
+    
+    def build_minute_series(self):
+        """Precompute trip counts and durations per minute of the week"""
+        print("Building minute-of-week series...")
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            rows = cursor.execute("""
+                SELECT pickup_epoch, trip_duration FROM trips
+                WHERE pickup_epoch IS NOT NULL
+            """).fetchall()
+            data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+            counts, totals = build_minute_series(data[:, 0], data[:, 1])
+            counts, totals = counts.reshape(-1), totals.reshape(-1)
+            
+            # only minutes that saw a pickup are stored
+            minutes = np.flatnonzero(counts)
+            cursor.execute("DELETE FROM pickup_minute_series")
+            cursor.executemany(
+                "INSERT INTO pickup_minute_series VALUES (?, ?, ?)",
+                zip(minutes.tolist(), counts[minutes].tolist(), totals[minutes].tolist())
+            )
+            
+            conn.commit()
+            conn.close()
+            
+            print(f"Minute-of-week series built: {len(minutes):,} active minutes")
+            return True
+            
+        except Exception as e:
+            print(f"Error building minute-of-week series: {e}")
+            return False
+    
+    def build_quantile_sketches(self):
+        """Precompute t-digest sketches of duration, distance and speed per (hour, day of week)"""
+        print("Building quantile sketches...")
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            rows = cursor.execute(f"""
+                SELECT pickup_hour, day_of_week, {", ".join(SKETCH_METRICS)} FROM trips
+            """).fetchall()
+            data = np.array(rows, dtype=np.float64).reshape(-1, 2 + len(SKETCH_METRICS))
+            sketches = build_group_sketches(
+                data[:, 0], data[:, 1],
+                {metric: data[:, 2 + i] for i, metric in enumerate(SKETCH_METRICS)}
+            )
+            
+            cursor.execute("DELETE FROM trip_quantile_sketches")
+            cursor.executemany(
+                "INSERT INTO trip_quantile_sketches VALUES (?, ?, ?, ?, ?)",
+                ((hour, day, metric, int(sketch.count), sketch.to_bytes())
+                 for (hour, day, metric), sketch in sketches.items())
+            )
+            
+            conn.commit()
+            conn.close()
+            
+            print(f"Quantile sketches built: {len(sketches):,} sketches")
+            return True
+            
+        except Exception as e:
+            print(f"Error building quantile sketches: {e}")
+            return False
+    
+    def build_heatmap_tiles(self):
+        """Precompute pickup and dropoff density tiles, overall and per pickup hour"""
+        print("Building heatmap tiles...")
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            rows = cursor.execute("""
+                SELECT pickup_hour, pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude
+                FROM trips
+            """).fetchall()
+            data = np.array(rows, dtype=np.float64).reshape(-1, 5)
+            hours = [-1] + (list(range(24)) if settings.HEATMAP_PER_HOUR else [])
+            
+            cursor.execute("DELETE FROM heatmap_tiles")
+            tile_count = 0
+            total_bytes = 0
+            for layer, lat_column in (("pickup", 1), ("dropoff", 3)):
+                for hour in hours:
+                    selected = data if hour < 0 else data[data[:, 0] == hour]
+                    tiles = build_heatmap_tiles(
+                        selected[:, lat_column], selected[:, lat_column + 1], settings.NYC_BOUNDS,
+                        settings.HEATMAP_MAX_ZOOM, settings.HEATMAP_TILE_SIZE
+                    )
+                    records = [
+                        (layer, hour, zoom, x, y, int(raster.sum()), int(raster.max()), encode_tile(raster))
+                        for (zoom, x, y), raster in tiles.items()
+                    ]
+                    cursor.executemany("INSERT INTO heatmap_tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records)
+                    tile_count += len(records)
+                    total_bytes += sum(len(record[-1]) for record in records)
+            
+            # trips ingested after this rowid are merged in later (core/ingest.py)
+            cursor.execute("""
+                INSERT OR REPLACE INTO system_metadata (key, value, description)
+                VALUES ('heatmap_tiles_rowid', (SELECT COALESCE(MAX(rowid), 0) FROM trips), 'Last trips rowid counted in heatmap_tiles')
+            """)
+            conn.commit()
+            conn.close()
+            
+            print(f"Heatmap tiles built: {tile_count:,} tiles, {total_bytes / 1024:,.0f} KB")
+            return True
+            
+        except Exception as e:
+            print(f"Error building heatmap tiles: {e}")
+            return False
+    
+    def build_sample_tables(self):
+        """Build stratified sample tables (one per rate) for approximate queries"""
+        print("Building stratified sample tables...")
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            rows = cursor.execute(f"""
+                SELECT rowid, {", ".join(f"COALESCE({column}, -1)" for column in STRATUM_COLUMNS)} FROM trips
+            """).fetchall()
+            data = np.array(rows, dtype=np.int64).reshape(-1, 1 + len(STRATUM_COLUMNS))
+            # one integer id per (pickup_hour, day_of_week, passenger_count) stratum
+            strata = np.unique(data[:, 1:], axis=0, return_inverse=True)[1].reshape(-1)
+            
+            for rate in settings.APPROX_SAMPLE_RATES:
+                table = sample_table_name(rate)
+                chosen, sizes, samples = stratified_sample(strata, rate)
+                
+                cursor.execute("DROP TABLE IF EXISTS sample_selection")
+                cursor.execute("""
+                    CREATE TEMP TABLE sample_selection (
+                        trip_rowid INTEGER PRIMARY KEY, stratum_size INTEGER, stratum_samples INTEGER
+                    )
+                """)
+                cursor.executemany(
+                    "INSERT INTO sample_selection VALUES (?, ?, ?)",
+                    zip(data[chosen, 0].tolist(), sizes.tolist(), samples.tolist())
+                )
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+                cursor.execute(f"""
+                    CREATE TABLE {table} AS
+                    SELECT t.*, s.stratum_size, s.stratum_samples
+                    FROM sample_selection s JOIN trips t ON t.rowid = s.trip_rowid
+                """)
+                cursor.execute(f"CREATE INDEX idx_{table}_time ON {table}(pickup_hour, day_of_week)")
+                cursor.execute("DROP TABLE sample_selection")
+                print(f"   - {table}: {len(chosen):,} trips ({rate:.1%} rate)")
+            
+            conn.commit()
+            conn.close()
+            return True
+            
+        except Exception as e:
+            print(f"Error building sample tables: {e}")
+            return False
+    
     def verify_database(self):
         """Verify the database was set up correctly"""
         print("Verifying database setup...")
@@ -157,6 +472,25 @@ class DatabaseSetup:
         if success and not self.load_cleaned_data():
             success = False
         
+        if success and settings.COLUMN_STORE_ENABLED and not self.build_column_store():
+            success = False
+        
+        # precompute spatial aggregates
+        if success and not self.build_pickup_pyramid():
+            success = False
+        
+        if success and not self.build_minute_series():
+            success = False
+        
+        if success and not self.build_quantile_sketches():
+            success = False
+        
+        if success and not self.build_heatmap_tiles():
+            success = False
+        
+        if success and not self.build_sample_tables():
+            success = False
+        
         # verify setup
         if success and not self.verify_database():
             success = False
@@ -170,9 +504,29 @@ class DatabaseSetup:
         
         return success
 
+def migrate_epoch_columns_if_needed():
+    """
+    Migrate the configured database when its trips predate the epoch columns
+
+    Run on startup by main.py and serve.py, since every date range filter reads
+    pickup_epoch. Returns True when a migration ran.
+    """
+    if not table_exists("trips") or column_exists("trips", "pickup_epoch"):
+        return False
+    setup = DatabaseSetup()
+    setup.db_path = settings.DATABASE_URL.replace("sqlite:///", "")
+    return setup.migrate_epoch_columns()
+
 def main():
     """Main function to run database setup"""
+    parser = argparse.ArgumentParser(description="Create and load the mobility database")
+    parser.add_argument("--migrate", action="store_true",
+                        help="only add the columns and indexes of the current schema to an existing database")
+    args = parser.parse_args()
+    
     setup = DatabaseSetup()
+    if args.migrate:
+        sys.exit(0 if setup.migrate_epoch_columns() else 1)
     setup.run_setup()
 
 if __name__ == "__main__":
@@ -25,12 +25,18 @@ CREATE TABLE IF NOT EXISTS trips (
     pickup_month INTEGER NOT NULL,
     pickup_year INTEGER NOT NULL,
     
+    -- pickup/dropoff datetimes as integer epoch seconds, for range filters
+    -- (the text columns above are kept for display)
+    pickup_epoch INTEGER,
+    dropoff_epoch INTEGER,
+    
     -- metadata
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
 -- indexes for optimal query performance
-CREATE INDEX IF NOT EXISTS idx_trips_pickup_datetime ON trips(pickup_datetime);
+CREATE INDEX IF NOT EXISTS idx_trips_pickup_epoch ON trips(pickup_epoch);
+CREATE INDEX IF NOT EXISTS idx_trips_id ON trips(id);  -- duplicate checks on ingestion
 CREATE INDEX IF NOT EXISTS idx_trips_pickup_hour ON trips(pickup_hour);
 CREATE INDEX IF NOT EXISTS idx_trips_day_of_week ON trips(day_of_week);
 CREATE INDEX IF NOT EXISTS idx_trips_pickup_month ON trips(pickup_month);
@@ -44,6 +50,61 @@ CREATE INDEX IF NOT EXISTS idx_trips_passenger_count ON trips(passenger_count);
 CREATE INDEX IF NOT EXISTS idx_trips_pickup_location ON trips(pickup_latitude, pickup_longitude);
 CREATE INDEX IF NOT EXISTS idx_trips_dropoff_location ON trips(dropoff_latitude, dropoff_longitude);
 
+-- multi-resolution pickup counts: quadtree over the NYC bounding box, filled by db_setup.py
+CREATE TABLE IF NOT EXISTS pickup_pyramid (
+    zoom INTEGER NOT NULL,
+    cell_x INTEGER NOT NULL,
+    cell_y INTEGER NOT NULL,
+    point_count INTEGER NOT NULL,
+    center_lat REAL NOT NULL,
+    center_lon REAL NOT NULL,
+    PRIMARY KEY (zoom, cell_x, cell_y)
+);
+
+CREATE INDEX IF NOT EXISTS idx_pickup_pyramid_density ON pickup_pyramid(zoom, point_count DESC);
+
+-- reservoir sample of pickup points per pyramid cell
+CREATE TABLE IF NOT EXISTS pickup_pyramid_samples (
+    zoom INTEGER NOT NULL,
+    cell_x INTEGER NOT NULL,
+    cell_y INTEGER NOT NULL,
+    pickup_latitude REAL NOT NULL,
+    pickup_longitude REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_pickup_pyramid_samples_cell ON pickup_pyramid_samples(zoom, cell_x, cell_y);
+
+-- trips and summed duration per minute of the week (0 = Monday 00:00), filled by db_setup.py
+CREATE TABLE IF NOT EXISTS pickup_minute_series (
+    minute_of_week INTEGER PRIMARY KEY,
+    trip_count INTEGER NOT NULL,
+    total_duration REAL NOT NULL
+);
+
+-- t-digest quantile sketch per (pickup_hour, day_of_week, metric), filled by db_setup.py
+CREATE TABLE IF NOT EXISTS trip_quantile_sketches (
+    pickup_hour INTEGER NOT NULL,
+    day_of_week INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    trip_count INTEGER NOT NULL,
+    sketch BLOB NOT NULL,
+    PRIMARY KEY (pickup_hour, day_of_week, metric)
+);
+
+-- gzip-compressed uint32 density raster per (layer, pickup hour, tile), filled by db_setup.py
+-- layer is 'pickup' or 'dropoff'; hour -1 holds the tiles over all hours
+CREATE TABLE IF NOT EXISTS heatmap_tiles (
+    layer TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    zoom INTEGER NOT NULL,
+    tile_x INTEGER NOT NULL,
+    tile_y INTEGER NOT NULL,
+    point_count INTEGER NOT NULL,
+    max_count INTEGER NOT NULL,
+    raster BLOB NOT NULL,
+    PRIMARY KEY (layer, hour, zoom, tile_x, tile_y)
+);
+
 -- analytics views for common queries
 CREATE VIEW IF NOT EXISTS hourly_stats AS
 SELECT 
@@ -106,7 +167,7 @@ CREATE TABLE IF NOT EXISTS system_metadata (
 
 -- snsert initial metadata
 INSERT OR REPLACE INTO system_metadata (key, value, description) VALUES
-('database_version', '1.0', 'Current database schema version'),
+('database_version', '1.1', 'Current database schema version'),
 ('last_data_load', datetime('now'), 'Timestamp of last data load'),
 ('total_trips', '0', 'Total number of trips in database'),
 ('data_source', 'NYC Taxi Trip Dataset', 'Source of the trip data'),
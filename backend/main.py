@@ -1,17 +1,51 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse
 from api.summary import router as summary_router
 from api.clusters import router as clusters_router
 from api.flows import router as flows_router
 from api.temporal import router as temporal_router
 from api.custom import router as custom_router
+from api.heatmap import router as heatmap_router
+from api.trips import router as trips_router
+from api.debug import router as debug_router
+from api.summary import load_quantile_sketches
+from api.custom import load_minute_series
+from api.flows import load_od_matrix
 from core.config import settings
+from core.metrics import render_metrics
+from core.middleware import MetricsMiddleware
+from core.warmup import startup_state, run_warmup, logger
+from db.db_setup import migrate_epoch_columns_if_needed
 import datetime
 
+startup_state.import_seconds = time.perf_counter() - _import_started
+
+@asynccontextmanager
+async def lifespan(app):
+    """Report import time, migrate an older database and warm up in the background; /health/ready flips once done"""
+    logger.info(f"App imported in {startup_state.import_seconds * 1000:.0f} ms")
+    # range filters read pickup_epoch, which databases loaded before it existed lack
+    await asyncio.to_thread(migrate_epoch_columns_if_needed)
+    warmup = None
+    if settings.WARMUP_ENABLED:
+        warmup = asyncio.create_task(run_warmup(app, cache_loaders=(load_quantile_sketches, load_minute_series, load_od_matrix)))
+    else:
+        startup_state.ready = True
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+
 app = FastAPI(
     title="Urban Mobility Data Explorer API",
     description="Backend API for NYC Taxi Trip Analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -21,14 +55,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Tile-Size", "X-Tile-Point-Count", "X-Tile-Max-Count"],
 )
 
+# request metrics (counts, latency histograms, in-flight gauges)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, router=app.router)
+
 # Include routers
 app.include_router(summary_router, prefix=settings.API_V1_STR)
 app.include_router(clusters_router, prefix=settings.API_V1_STR)
 app.include_router(flows_router, prefix=settings.API_V1_STR)
 app.include_router(temporal_router, prefix=settings.API_V1_STR)
 app.include_router(custom_router, prefix=settings.API_V1_STR)
+app.include_router(heatmap_router, prefix=settings.API_V1_STR)
+app.include_router(trips_router, prefix=settings.API_V1_STR)
+app.include_router(debug_router)
 
 @app.get("/")
 async def root():
@@ -36,7 +78,19 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.datetime.now().isoformat()}
+    """Liveness: the process answers; readiness is reported separately"""
+    return {"status": "healthy", "ready": startup_state.ready, "timestamp": datetime.datetime.now().isoformat()}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: 503 until the startup warm-up has finished"""
+    body = {"status": "ready" if startup_state.ready else "warming_up", **startup_state.to_dict()}
+    return JSONResponse(body, status_code=200 if startup_state.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,117 @@
+"""
+Production launcher: N uvicorn worker processes over shared read-only data
+
+Before any worker starts, the parent process makes sure the immutable data
+artifacts are in place and current, so they are built once instead of once
+per worker:
+- a database loaded before the integer epoch columns existed gets them
+  (db_setup.py --migrate) before anything reads it.
+- the memory-mapped column store (db/columns/) is (re)built if missing or
+  stale, then read once so its pages sit in the OS page cache. Every worker
+  maps the same files, so N workers share one copy of the columns.
+- the precomputed tables (pickup pyramid, minute series, quantile sketches,
+  heatmap tiles, sample tables) live in the SQLite file and are shared the
+  same way; missing ones are reported because every worker would otherwise
+  compute its own live fallback.
+- heatmap tiles that lag behind trips ingested through POST /trips:batch
+  (the ingesting process exited before catching up) are caught up.
+
+Per-worker state is limited to small decoded caches (sketch dictionaries,
+the minute series, LRU caches of tiles and merged quantiles).
+
+Usage (from backend/):
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# precomputed tables the API reads when present
+SHARED_TABLES = ("pickup_pyramid", "pickup_minute_series", "trip_quantile_sketches", "heatmap_tiles")
+
+
+def prepare_shared_state():
+    """
+    Build or validate the artifacts every worker maps
+
+    Returns True when the column store is usable (workers then scan columns
+    instead of SQL rows).
+    """
+    # imported here: worker processes re-import this module and must not pay for it
+    from core.config import settings
+    from core.database import get_data_version, table_exists
+    from core.column_store import get_column_store
+    from core.approx import sample_table_name
+
+    # databases loaded before the epoch columns existed are migrated once, before any worker queries them
+    from db.db_setup import migrate_epoch_columns_if_needed
+    migrate_epoch_columns_if_needed()
+
+    # tiles of trips ingested since the last catch-up
+    if table_exists("heatmap_tiles"):
+        from core.ingest import connect, catch_up_heatmap_tiles
+        conn = connect(settings.DATABASE_URL.replace("sqlite:///", ""))
+        caught_up = catch_up_heatmap_tiles(conn)
+        conn.close()
+        if caught_up:
+            print(f"Heatmap tiles caught up with {caught_up:,} ingested trips")
+
+    version = get_data_version()
+    store = get_column_store(version)
+    if store is None and settings.COLUMN_STORE_ENABLED:
+        from db.db_setup import DatabaseSetup
+        print("Column store missing or stale, building it once for all workers...")
+        setup = DatabaseSetup()
+        setup.db_path = settings.DATABASE_URL.replace("sqlite:///", "")
+        setup.build_column_store()
+        store = get_column_store(version)
+
+    if store is not None:
+        start = time.perf_counter()
+        size = store.warm()
+        print(f"Column store: {len(store):,} rows, {size / 2**20:,.1f} MB mapped "
+              f"(page cache warmed in {time.perf_counter() - start:.2f}s)")
+
+    tables = SHARED_TABLES + tuple(sample_table_name(rate) for rate in settings.APPROX_SAMPLE_RATES)
+    missing = [table for table in tables if not table_exists(table)]
+    if missing:
+        print(f"Warning: precomputed tables missing ({', '.join(missing)}); each worker will compute "
+              f"live fallbacks. Run `python db/db_setup.py` to build them once.")
+    return store is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: settings.WORKERS, 0 = one per CPU)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--skip-prepare", action="store_true", help="start workers without checking artifacts")
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    from core.config import settings
+
+    workers = settings.WORKERS if args.workers is None else args.workers
+    workers = workers or os.cpu_count() or 1
+    if not args.skip_prepare:
+        prepare_shared_state()
+
+    import uvicorn
+    print(f"Starting {workers} worker(s)")
+    uvicorn.run(
+        "main:app",
+        host=args.host or settings.HOST,
+        port=args.port or settings.PORT,
+        workers=workers,
+        log_level=settings.LOG_LEVEL.lower(),
+        access_log=False  # access logging is synchronous; request metrics are on /metrics
+    )
+
+
+if __name__ == "__main__":
+    main()
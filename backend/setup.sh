@@ -17,4 +17,5 @@ python db/db_setup.py
 
 echo "Database initialization completed successfully!"
 
-exec uvicorn main:app --host 0.0.0.0 --port 8000
\ No newline at end of file
+# WORKERS=N runs N worker processes sharing the mapped column store
+exec python serve.py --host 0.0.0.0 --port 8000 --workers "${WORKERS:-1}"
\ No newline at end of file